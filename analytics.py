@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+# --- トレーニング分析の指標（推定1RM・期間ボリューム・ACWR・伸び率） ---
+# 記録ストアと同じ形式のDataFrame（training_date, exercise_name, weight, reps, sets。
+# 複数ユーザー分をまとめて扱う場合は user_id 列も）を受け取り、行ごとのPythonループを使わず
+# pandas/NumPyの演算だけで計算する。100万行でも1秒未満で処理できることを
+# scripts/benchmark_analytics.py で確認している。
+import numpy as np
+import pandas as pd
+
+# 種目名 -> 主に鍛える部位（未登録の種目は OTHER_MUSCLE_GROUP）
+MUSCLE_GROUPS = {
+    "ベンチプレス": "胸",
+    "インクラインベンチプレス": "胸",
+    "ダンベルプレス": "胸",
+    "ダンベルフライ": "胸",
+    "腕立て伏せ": "胸",
+    "スクワット": "脚",
+    "レッグプレス": "脚",
+    "ランジ": "脚",
+    "レッグエクステンション": "脚",
+    "レッグカール": "脚",
+    "デッドリフト": "背中",
+    "懸垂": "背中",
+    "ラットプルダウン": "背中",
+    "バーベルロー": "背中",
+    "ショルダープレス": "肩",
+    "サイドレイズ": "肩",
+    "アームカール": "腕",
+    "トライセプスエクステンション": "腕",
+    "腹筋": "体幹",
+    "プランク": "体幹",
+}
+OTHER_MUSCLE_GROUP = "その他"
+
+ACUTE_WINDOW_DAYS = 7
+CHRONIC_WINDOW_DAYS = 28
+E1RM_FORMULAS = ("epley", "brzycki")
+
+
+def estimate_1rm(weight, reps, formula="epley"):
+    """推定1RMを返す。Epley: w×(1+r/30)、Brzycki: w×36/(37−r)（r≥37は推定不可としてNaN）"""
+    weight = np.asarray(weight, dtype=np.float64)
+    reps = np.asarray(reps, dtype=np.float64)
+    if formula == "epley":
+        return weight * (1 + reps / 30.0)
+    if formula == "brzycki":
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(reps < 37, weight * 36.0 / (37.0 - reps), np.nan)
+    raise ValueError(f"未対応の推定式です: {formula}")
+
+
+def _stored(df, column, fallback):
+    """セット単位で記録した行が持つ column の値。値の無い行は fallback で補う"""
+    if column not in df.columns:
+        return fallback
+    stored = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=np.float64)
+    return np.where(np.isnan(stored), fallback, stored)
+
+
+def add_e1rm(df, formula="epley"):
+    e1rm = estimate_1rm(df['weight'].to_numpy(), df['reps'].to_numpy(), formula)
+    if formula == "epley":
+        # セット単位の記録は、保存時に求めたセットごとの推定1RMの最大値を使う（同じEpley式）
+        e1rm = _stored(df, 'e1rm', e1rm)
+    return df.assign(e1rm=e1rm)
+
+
+def add_muscle_group(df, mapping=None):
+    """exercise_name から muscle_group 列（カテゴリ型）を追加する"""
+    mapping = MUSCLE_GROUPS if mapping is None else mapping
+    # 辞書引きは種目名の種類数だけ行い、各行にはカテゴリのコードで展開する
+    names = df['exercise_name'].astype('category')
+    groups = pd.Series(names.cat.categories, dtype=object).map(mapping).fillna(OTHER_MUSCLE_GROUP)
+    categories, group_codes = np.unique(np.append(groups.to_numpy(dtype=str), OTHER_MUSCLE_GROUP),
+                                        return_inverse=True)
+    codes = names.cat.codes.to_numpy()
+    codes = np.where(codes >= 0, group_codes[codes], group_codes[-1])  # 種目名なしは「その他」
+    return df.assign(muscle_group=pd.Categorical.from_codes(codes, categories=categories))
+
+
+def _group_keys(df, by):
+    return (['user_id'] if 'user_id' in df.columns else []) + [by]
+
+
+def _day_numbers(dates):
+    return pd.to_datetime(dates).to_numpy().astype('datetime64[D]').astype(np.int64)
+
+
+def _volume(df):
+    # セット単位の記録は Σ重量×回数、それ以外は全セット同じとして 重量×回数×セット数
+    return _stored(df, 'volume', df['weight'].to_numpy(dtype=np.float64) * df['reps'].to_numpy(dtype=np.float64)
+                   * df['sets'].to_numpy(dtype=np.float64))
+
+
+def _daily_reduce(df, keys, values, reducer):
+    """(keys, 日付) ごとに values を reducer（np.add / np.maximum）で集約する。
+
+    groupby を使わず、グループと日を1つの整数キーに詰めてソートし reduceat でまとめる。
+    戻り値は (グループ・日付順の集計結果のDataFrame, グループ番号, 日番号, 集計値)。"""
+    group_ids = np.zeros(len(df), dtype=np.int64)
+    for key in keys:
+        codes, uniques = pd.factorize(df[key], sort=True)
+        group_ids = group_ids * (len(uniques) + 1) + (codes + 1)
+    days = _day_numbers(df['training_date'])
+    if len(df) == 0:
+        return df[keys].assign(training_date=pd.Series(dtype='datetime64[ns]')), group_ids, days, values
+    span = int(days.max() - days.min()) + 1
+    composite = group_ids * span + (days - days.min())
+    order = np.argsort(composite)  # 同じキーの行は合算するだけなので安定ソートは不要
+    composite = composite[order]
+    starts = np.flatnonzero(np.r_[True, composite[1:] != composite[:-1]])
+    reduced = reducer.reduceat(values[order], starts)
+    first_rows = order[starts]
+    daily = df[keys].iloc[first_rows].reset_index(drop=True)
+    daily['training_date'] = days[first_rows].astype('datetime64[D]').astype('datetime64[ns]')
+    sorted_groups = group_ids[first_rows]
+    dense_groups = np.cumsum(np.r_[False, sorted_groups[1:] != sorted_groups[:-1]])
+    return daily, dense_groups, days[first_rows], reduced
+
+
+def daily_totals(df, by="exercise_name"):
+    """(ユーザー, by, 日付) ごとのボリューム合計を、グループ・日付順に並べて返す"""
+    if by == "muscle_group" and 'muscle_group' not in df.columns:
+        df = add_muscle_group(df)
+    daily, _, _, totals = _daily_reduce(df, _group_keys(df, by), _volume(df), np.add)
+    return daily.assign(volume=totals)
+
+
+def _window_sums(group_codes, days, values, window):
+    """グループ・日付順に並んだ行について、同じグループの直近 window 日（当日を含む）の合計を返す"""
+    # (グループ, 日) を1つの整数に詰め、二分探索で窓の先頭行を求める
+    offset = days - days.min() + window
+    span = int(offset.max()) + 1
+    position = group_codes.astype(np.int64) * span + offset
+    start = np.searchsorted(position, position - window + 1, side='left')
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    return cumulative[1:] - cumulative[start]
+
+
+def rolling_volume(df, by="exercise_name", windows=(ACUTE_WINDOW_DAYS, CHRONIC_WINDOW_DAYS)):
+    """記録のある日ごとに、直近7日・28日などのボリューム合計（volume_7d, volume_28d）を返す"""
+    if by == "muscle_group" and 'muscle_group' not in df.columns:
+        df = add_muscle_group(df)
+    daily, groups, days, totals = _daily_reduce(df, _group_keys(df, by), _volume(df), np.add)
+    if len(daily) == 0:
+        return daily.assign(volume=totals, **{f"volume_{w}d": totals for w in windows})
+    return daily.assign(volume=totals, **{f"volume_{w}d": _window_sums(groups, days, totals, w) for w in windows})
+
+
+def acute_chronic_ratio(df, by="exercise_name", acute_days=ACUTE_WINDOW_DAYS, chronic_days=CHRONIC_WINDOW_DAYS):
+    """急性:慢性負荷比（ACWR）。直近 acute_days 日の合計 ÷ 直近 chronic_days 日の acute_days 日あたり平均"""
+    rolled = rolling_volume(df, by, windows=(acute_days, chronic_days))
+    acute = rolled[f"volume_{acute_days}d"].to_numpy()
+    chronic = rolled[f"volume_{chronic_days}d"].to_numpy() * acute_days / chronic_days
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(chronic > 0, acute / chronic, np.nan)
+    return rolled.assign(acwr=ratio)
+
+
+def progression_slopes(df, metric="e1rm", by="exercise_name", formula="epley"):
+    """日ごとの最大値に最小二乗法で直線を当てはめ、グループごとの伸び率（1週間あたり）を返す
+
+    列: slope_per_week（metricの単位/週）, r2（決定係数）, days（記録日数）, first_date, last_date"""
+    if metric == "e1rm":
+        df = add_e1rm(df, formula)
+    elif metric == "volume":
+        df = df.assign(volume=_volume(df))
+    if by == "muscle_group" and 'muscle_group' not in df.columns:
+        df = add_muscle_group(df)
+    keys = _group_keys(df, by)
+    values = pd.to_numeric(df[metric], errors='coerce').to_numpy(dtype=np.float64)
+    valid = ~np.isnan(values)
+    daily, codes, days, y = _daily_reduce(df[valid], keys, values[valid], np.maximum)
+    n_groups = int(codes.max()) + 1 if len(codes) else 0
+    x = days.astype(np.float64)
+
+    # グループごとの平均からの偏差で積和を求める（日数が大きくても桁落ちしにくい）
+    counts = np.bincount(codes, minlength=n_groups).astype(np.float64)
+    mean_x = np.bincount(codes, x, n_groups) / np.maximum(counts, 1)
+    mean_y = np.bincount(codes, y, n_groups) / np.maximum(counts, 1)
+    dx = x - mean_x[codes]
+    dy = y - mean_y[codes]
+    sxx = np.bincount(codes, dx * dx, n_groups)
+    sxy = np.bincount(codes, dx * dy, n_groups)
+    syy = np.bincount(codes, dy * dy, n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+        r2 = np.where((sxx > 0) & (syy > 0), sxy * sxy / (sxx * syy), np.nan)
+
+    # 日付順に並んでいるため、各グループの先頭行が最初の記録日、末尾行が最後の記録日になる
+    first = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) if len(codes) else codes
+    last = np.r_[first[1:] - 1, len(codes) - 1] if len(codes) else codes
+    result = daily.iloc[first][keys].reset_index(drop=True)
+    return result.assign(slope_per_week=slope * 7, r2=r2, days=counts.astype(np.int64),
+                         first_date=daily['training_date'].to_numpy()[first],
+                         last_date=daily['training_date'].to_numpy()[last])
@@ -1,17 +1,50 @@
 # -*- coding: utf-8 -*-
-import streamlit as st
-import pandas as pd
-import plotly.express as px
+# 起動時間の計測（STARTUP_PROFILE=1 のときのみ有効）
+from profiling import STARTUP_PROFILE_ENABLED, lazy_import, report, start_run, timed, timed_import
+# Supabase / YouTube 呼び出しの計測（QUERY_METRICS=1 のときのみ有効）
+from instrumentation import QUERY_METRICS_ENABLED, instrument, query_report, set_page, start_queries
+
+start_run()
+start_queries()
+with timed_import("streamlit"):
+    import streamlit as st
+with timed_import("pandas"):
+    import pandas as pd
 from datetime import datetime, timedelta
 import os
-from dotenv import load_dotenv
-import json
+with timed_import("dotenv"):
+    from dotenv import load_dotenv
 
 # --- YouTube API関連のインポートを追加 ---
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
+# (googleapiclient は動画検索を実行したときに初めて読み込む)
+with timed_import("youtube_search"):
+    from youtube_search import YouTubeAPIError, YouTubeSearch, format_duration, format_view_count
 # --- ここまで追加 ---
 
+with timed_import("アプリのモジュール"):
+    from bulk_import import (CHUNK_SIZE_OPTIONS, DEFAULT_CHUNK_SIZE, MAX_WEIGHT, ImportRowError,
+                             estimate_row_count, import_records, iter_file_rows)
+    from analytics import acute_chronic_ratio, progression_slopes
+    from charts import AGGREGATION_LEVELS, add_volume, prepare_series
+    from concurrent_queries import ConcurrentQueries
+    from exercise_catalog import get_exercise_catalog
+    from exercise_names import clean_name, name_index
+    from export import EXPORT_FORMATS, export_records
+    from figure_cache import get_figure_cache
+    from feedback import summarize_history
+    from overview import (OVERVIEW_LEVELS, WEEKDAY_LABELS, calendar_matrix, daily_summary, exercise_trends,
+                          top_exercises, weekly_volume)
+    from leaderboard import (LEADERBOARD_METRICS, CohortError, fetch_my_cohorts, get_leaderboard_cache,
+                             join_cohort, leave_cohort, mark_self, recent_weeks)
+    from pagination import DEFAULT_PAGE_SIZE, PAGE_SIZE_OPTIONS, fetch_records_page
+    from personal_records import apply_personal_records, fetch_personal_records
+    from query_compat import is_missing_relation
+    from record_store import add_saved_records, get_record_store
+    from synthetic import compact_history, generate_history
+    from workout_sessions import (SET_COLUMNS, new_session_id, save_workout_session, summarize_sets,
+                                  validate_sets)
+    from write_queue import WriteBehindQueue
+
 # アプリのタイトルとテーマ設定（最初のStreamlitコマンドとして配置）
 st.set_page_config(
     page_title="筋トレレビューアプリ",
@@ -29,82 +62,137 @@ if "user_email" not in st.session_state:
 if "is_guest" not in st.session_state:
     st.session_state.is_guest = False
 
-# --- Supabaseクライアントの初期化と接続テスト ---
-supabase = None
-db_connected = False
-supabase_error_message = ""
-try:
-    from supabase import create_client
-    load_dotenv() # ローカルでの.envファイル読み込み用
+# --- Supabaseクライアントの初期化（プロセスごとに1回） ---
+@st.cache_resource(show_spinner=False)
+def init_supabase():
+    """(クライアント, エラーメッセージ) を返す。スクリプトの再実行ごとには作り直さない"""
+    try:
+        if LOCAL_DB_PATH:
+            # Supabaseの代わりにローカルのSQLiteファイルに保存する（オフライン利用・計測用）
+            with timed("ローカルDBの初期化"):
+                from local_backend import SQLiteClient
 
-    supabase_url = os.environ.get('url') or os.environ.get('SUPABASE_URL')
-    supabase_key = os.environ.get('key') or os.environ.get('SUPABASE_KEY')
+                return SQLiteClient(LOCAL_DB_PATH), ""
+        with timed("Supabaseクライアント作成"):
+            from supabase import create_client
 
-    # 環境変数がない場合はStreamlit secretsを使用 (Cloudデプロイ用)
-    if not supabase_url or not supabase_key:
-        try:
-            supabase_url = st.secrets["supabase"]["url"]
-            supabase_key = st.secrets["supabase"]["key"]
-        except Exception as e:
-            # secretsがない場合のエラーは初期段階では許容するかもしれない
-            pass # st.error(f"シークレット読み込みエラー: {str(e)}")
+            supabase_url = os.environ.get('url') or os.environ.get('SUPABASE_URL')
+            supabase_key = os.environ.get('key') or os.environ.get('SUPABASE_KEY')
 
-    if supabase_url and supabase_key:
-        try:
-            supabase = create_client(supabase_url, supabase_key)
-            # 簡単な接続テスト
-            response = supabase.table('training_records').select('id').limit(1).execute()
-            db_connected = True # ここまで来たらOKとする
-        except Exception as conn_error:
-            supabase_error_message = f"データベースへの接続/テーブルアクセスに失敗しました: {str(conn_error)}"
-            db_connected = False
-    else:
-        supabase_error_message = "Supabase URL または Key が設定されていません。"
-        db_connected = False
+            # 環境変数がない場合はStreamlit secretsを使用 (Cloudデプロイ用)
+            if not supabase_url or not supabase_key:
+                try:
+                    supabase_url = st.secrets["supabase"]["url"]
+                    supabase_key = st.secrets["supabase"]["key"]
+                except Exception as e:
+                    # secretsがない場合のエラーは初期段階では許容するかもしれない
+                    pass # st.error(f"シークレット読み込みエラー: {str(e)}")
+
+            if supabase_url and supabase_key:
+                return create_client(supabase_url, supabase_key), ""
+            return None, "Supabase URL または Key が設定されていません。"
+    except ImportError:
+        return None, "Supabaseライブラリが見つかりません。'pip install supabase-py' を実行してください。"
+    except Exception as e:
+        return None, f"Supabase初期化中に予期せぬエラーが発生しました: {str(e)}"
+
+
+# 接続テストは起動時やログイン画面では行わず、DBを使うページで最初に db_connected() を呼んだときに実行する。
+# 成功した結果だけをプロセス内で DB_PROBE_TTL_SECONDS 共有する（失敗は共有せず、次の実行で再度試す）。
+DB_PROBE_TTL_SECONDS = 300
+
+@st.cache_resource(ttl=DB_PROBE_TTL_SECONDS, show_spinner=False)
+def probe_database(_client):
+    # 失敗時は例外を送出する（cache_resource は例外をキャッシュしないため、一時的な失敗が残らない）
+    with timed("DB接続テスト"):
+        _client.table('training_records').select('id').limit(1).execute()
+    return True
+
+def check_db_connection():
+    """(接続できたか, エラーメッセージ) を返す"""
+    if supabase is None:
+        return False, supabase_error_message
+    try:
+        return probe_database(supabase), ""
+    except Exception as conn_error:
+        return False, f"データベースへの接続/テーブルアクセスに失敗しました: {str(conn_error)}"
+
+_db_status = None  # この実行での接続テストの結果（未実行なら None）
+
+def db_connected():
+    """DBを使えるか（接続テストはこの実行で最初に呼ばれたときだけ行う）"""
+    global _db_status
+    if _db_status is None:
+        _db_status = check_db_connection()
+    return _db_status[0]
+
+load_dotenv() # ローカルでの.envファイル読み込み用
+# LOCAL_DB_PATH を設定すると、Supabaseに接続せずローカルのSQLiteファイルを使う（認証なしの1ユーザー）
+LOCAL_DB_PATH = os.environ.get("LOCAL_DB_PATH")
+supabase, supabase_error_message = init_supabase()
+supabase = instrument(supabase, "supabase")
+
+# --- 記録保存の書き込みキュー（プロセスごとに1つ） ---
+@st.cache_resource(show_spinner=False)
+def get_write_queue(_client):
+    # 送信スレッドとSQLiteジャーナルは全セッションで共有する（前回のプロセスで未送信の行も送信する）
+    return WriteBehindQueue(_client)
 
-except ImportError:
-    supabase_error_message = "Supabaseライブラリが見つかりません。'pip install supabase-py' を実行してください。"
-    db_connected = False
-except Exception as e:
-    supabase_error_message = f"Supabase初期化中に予期せぬエラーが発生しました: {str(e)}"
-    db_connected = False
 
 # --- YouTube APIキーの読み込み ---
 YOUTUBE_API_KEY = os.environ.get("YOUTUBE_API_KEY")
 # --- ここまで追加 ---
 
+# グラフ表示モード -> (列名, タイトル, 縦軸ラベル)
+GRAPH_MODES = {
+    "重量の推移": ('weight', "重量推移", "重量 (kg)"),
+    "回数の推移": ('reps', "回数推移", "回数 (reps)"),
+    "ボリューム(重量×回数×セット)の推移": ('volume', "トレーニングボリューム推移", "ボリューム (kg×reps×sets)"),
+    "推定1RM(Epley式)の推移": ('e1rm', "推定1RM推移", "推定1RM (kg)"),
+}
+
+# 概要ページの表示（1回の実行で作る図は選択中の1枚だけ）
+OVERVIEW_VIEWS = ["カレンダー", "種目ごとの推移", "週ごとのボリューム"]
+
+# リスト表示の列設定（Stylerで全セルを整形せず、表示時に書式を適用する）
+LIST_DISPLAY_COLUMNS = ['training_date', 'exercise_name', 'weight', 'reps', 'sets', 'notes']
+LIST_COLUMN_CONFIG = {
+    'training_date': st.column_config.DateColumn("日付", format="YYYY-MM-DD"),
+    'exercise_name': st.column_config.TextColumn("種目"),
+    'weight': st.column_config.NumberColumn("重量", format="%.1f kg"),
+    'reps': st.column_config.NumberColumn("回数", format="%d 回"),
+    'sets': st.column_config.NumberColumn("セット数", format="%d セット"),
+    'notes': st.column_config.TextColumn("メモ"),
+}
+
+
+def get_list_pager(start_date, end_date, exercise, page_size):
+    # 絞り込み条件が変わったら1ページ目に戻す（cursorsは各ページ先頭のキー）
+    pager_key = (str(start_date), str(end_date), exercise, page_size)
+    pager = st.session_state.get("list_pager")
+    if not pager or pager["key"] != pager_key:
+        pager = {"key": pager_key, "cursors": [None], "count": None}
+        st.session_state.list_pager = pager
+    return pager
+
 
 # --- サンプルデータ生成関数 ---
-def create_sample_data():
-    # (省略 - 前回のコードと同じ)
-    import pandas as pd
-    from datetime import datetime, timedelta
-    import random
-
-    exercises = ["ベンチプレス", "スクワット", "デッドリフト", "懸垂", "腕立て伏せ"]
-    data = []
-    today = datetime.now().date()
-    for i in range(30):
-        date = today - timedelta(days=i)
-        for exercise in exercises[:random.randint(1, 3)]:
-            if random.random() < 0.7:
-                weight_base = {"ベンチプレス": 60, "スクワット": 80, "デッドリフト": 100, "懸垂": 0, "腕立て伏せ": 0}
-                reps_base = {"ベンチプレス": 8, "スクワット": 8, "デッドリフト": 6, "懸垂": 10, "腕立て伏せ": 15}
-                progress_factor = max(0, (30 - i) / 30 * 0.2)
-                data.append({
-                    "id": f"sample-{i}-{exercise}",
-                    "training_date": date,
-                    "exercise_name": exercise,
-                    "weight": round(weight_base[exercise] * (1 + progress_factor) + random.uniform(-2, 2), 1),
-                    "reps": int(reps_base[exercise] + random.randint(-2, 2)),
-                    "sets": random.randint(3, 5),
-                    "notes": "サンプルデータ"
-                })
-    df = pd.DataFrame(data)
-    # weightが数値型であることを確認
-    df['weight'] = pd.to_numeric(df['weight'], errors='coerce')
-    df = df.dropna(subset=['weight']) # 数値でない行を削除
-    return df
+SAMPLE_EXERCISES = ["ベンチプレス", "スクワット", "デッドリフト", "懸垂", "腕立て伏せ"]
+SAMPLE_DAYS = 30
+SAMPLE_SEED = 0
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_guest_dataset(end_date, seed=SAMPLE_SEED):
+    # ゲスト用の30日分のサンプル。日付・シードごとにプロセスで1回だけ生成し、全ゲストで共有する
+    # （共有オブジェクトのため、各ページでは列の代入などの変更をしないこと）
+    return compact_history(generate_history(days=SAMPLE_DAYS, exercises=SAMPLE_EXERCISES, seed=seed,
+                                            end_date=end_date, with_ids=False))
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def get_guest_daily_summary(end_date):
+    # 概要ページ用の (記録日, 種目) ごとの集計表（サンプルと同じく全ゲストで共有する）
+    return daily_summary(get_guest_dataset(end_date))
 
 
 # --- 認証関連関数 ---
@@ -150,6 +238,8 @@ def sign_out():
         st.session_state.user_email = None
         st.session_state.is_guest = False
         # 他のセッション状態もクリアするならここ
+        st.session_state.pop("record_store", None)
+        st.session_state.pop("list_pager", None)
         return True
     except Exception as e:
         st.error(f"ログアウトエラー: {str(e)}")
@@ -163,51 +253,132 @@ def guest_login():
     st.session_state.user_email = "ゲスト"
     return True
 
+def local_login():
+    # ローカルモードは認証せず、固定のユーザーIDで記録する
+    from local_backend import LOCAL_USER_EMAIL, LOCAL_USER_ID
+
+    st.session_state.authenticated = True
+    st.session_state.is_guest = False
+    st.session_state.user_id = LOCAL_USER_ID
+    st.session_state.user_email = LOCAL_USER_EMAIL
+    return True
+
 # --- YouTube検索関数 ---
+@st.cache_resource
+def get_youtube_search():
+    # discoveryクライアントと検索結果キャッシュはプロセス内で共有する
+    return YouTubeSearch(YOUTUBE_API_KEY, client_wrapper=lambda client: instrument(client, "youtube"))
+
 def search_youtube_videos(query, max_results=3):
     if not YOUTUBE_API_KEY:
         st.warning("YouTube APIキーが設定されていないため、動画検索は利用できません。")
         return []
     try:
-        youtube = build('youtube', 'v3', developerKey=YOUTUBE_API_KEY)
-        search_response = youtube.search().list(
-            q=f"{query} フォーム やり方 解説", # より具体的な検索クエリ
-            part='snippet',
-            maxResults=max_results,
-            type='video',
-            videoEmbeddable='true', # 埋め込み可能な動画を優先
-            order='relevance' # 関連性の高い順
-        ).execute()
-
-        videos = []
-        for search_result in search_response.get('items', []):
-            # サムネイルURLが存在するか確認
-            thumbnail_url = search_result['snippet']['thumbnails'].get('default', {}).get('url')
-            if thumbnail_url: # サムネイルがあるものだけ追加（任意）
-                videos.append({
-                    'title': search_result['snippet']['title'],
-                    'videoId': search_result['id']['videoId'],
-                    'thumbnail': thumbnail_url
-                })
+        videos, source = get_youtube_search().search(query, max_results)
+        if source == 'stale':
+            st.caption("YouTube APIの利用上限に達したため、以前の検索結果を表示しています。")
         return videos
-    except HttpError as e:
+    except YouTubeAPIError as e:
         # APIクォータ超過などのエラーをより分かりやすく表示
-        error_details = json.loads(e.content.decode('utf-8')).get('error', {}).get('errors', [{}])[0]
-        reason = error_details.get('reason', '不明な理由')
-        message = error_details.get('message', str(e))
-        st.error(f"YouTube APIエラー ({reason}): {message}")
+        st.error(f"YouTube APIエラー ({e.reason}): {e.message}")
         return []
     except Exception as e:
         st.error(f"YouTube検索中に予期せぬエラーが発生しました: {str(e)}")
         return []
+
+# よく記録する種目のフォーム動画を先読みする件数
+PREFETCH_VIDEO_EXERCISES = 5
+
+def prefetch_form_videos(user_id):
+    """記録の多い種目の動画検索をバックグラウンドで先読みする（セッションごとに1回）"""
+    if not YOUTUBE_API_KEY or st.session_state.get("videos_prefetched"):
+        return
+    # 他のページで同期済みの記録ストアを使う（このために記録は取得しない。未同期なら次回に回す）
+    frame = get_record_store(supabase, user_id, sync=False).frame
+    if frame.empty:
+        return
+    st.session_state.videos_prefetched = True
+    frequent = frame['exercise_name'].value_counts().index[:PREFETCH_VIDEO_EXERCISES]
+    get_youtube_search().prefetch_async([str(name) for name in frequent])
 # --- ここまで追加 ---
 
 
+# --- 種目名の正規化 ---
+def known_exercises():
+    """ログインユーザーの既存の種目名（入力の表記ゆれをそれらに寄せる。ゲストは標準種目のみ）"""
+    if st.session_state.is_guest or not st.session_state.user_id or supabase is None:
+        return []
+    try:
+        return get_exercise_catalog().get(supabase, st.session_state.user_id)
+    except Exception:
+        return []
+
+
+# --- 成長フィードバックの表示 ---
+def show_feedback(records, baselines):
+    # 記録ごとに前回比と自己ベスト更新を表示する（baselines は summarize_history の戻り値）
+    for record in records:
+        exercise = record.get('exercise_name', 'N/A')
+        weight = pd.to_numeric(record.get('weight'), errors='coerce')
+        reps = pd.to_numeric(record.get('reps'), errors='coerce')
+
+        if pd.isna(weight) or pd.isna(reps): continue # 数値でないデータはスキップ
+
+        baseline = baselines.get(exercise, {})
+        has_previous = baseline.get('prev_date') is not None
+        has_best_weight = baseline.get('best_weight') is not None
+        has_best_reps = baseline.get('best_reps') is not None
+
+        with st.container(border=True): # 枠線を追加
+            st.subheader(f"🔍 {exercise}")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.write("**重量**")
+                if has_previous:
+                    prev_weight = baseline.get('prev_weight')
+                    if prev_weight is not None:
+                        weight_diff = weight - prev_weight
+                        if weight_diff > 0: st.success(f"🎉 +{weight_diff:.1f}kg ({prev_weight:.1f}→{weight:.1f}kg)")
+                        elif weight_diff < 0: st.info(f"📉 {weight_diff:.1f}kg ({prev_weight:.1f}→{weight:.1f}kg)")
+                        else: st.write(f"📊 維持 {weight:.1f}kg")
+                if has_best_weight:
+                    best_weight = baseline['best_weight']
+                    if weight > best_weight:
+                        st.balloons()
+                        st.success(f"🏆 **自己ベスト更新！** ({best_weight:.1f}→{weight:.1f}kg)")
+                elif not has_previous:
+                     st.info(f"🚀 初記録: {weight:.1f}kg")
+
+            with col2:
+                st.write("**回数**")
+                if has_previous:
+                    prev_reps = baseline.get('prev_reps')
+                    if prev_reps is not None:
+                        reps_diff = reps - prev_reps
+                        if reps_diff > 0: st.success(f"💪 +{int(reps_diff)}回 ({int(prev_reps)}→{int(reps)}回)")
+                        elif reps_diff < 0: st.info(f"📉 {int(reps_diff)}回 ({int(prev_reps)}→{int(reps)}回)")
+                        else: st.write(f"📊 維持 {int(reps)}回")
+                if has_best_reps:
+                    best_reps = baseline['best_reps']
+                    if reps > best_reps:
+                         st.balloons()
+                         st.success(f"🏆 **自己ベスト更新！** ({int(best_reps)}→{int(reps)}回)")
+                elif not has_previous:
+                     st.info(f"🚀 初記録: {int(reps)}回")
+            # st.divider() # dividerは不要かも
+
+
 st.title("💪 筋トレレビューアプリ")
 
 # --- ログイン/サインアップ処理 ---
 if not st.session_state.authenticated:
     # (省略 - 前回のコードと同じ)
+    if LOCAL_DB_PATH and supabase is not None:
+        st.info(f"ローカルモード: 記録は {LOCAL_DB_PATH} に保存されます（ログインは不要です）。")
+        if st.button("ローカルのデータベースで開始"):
+            local_login()
+            st.rerun()
+        st.stop()
     st.info("続行するにはログインまたはサインアップしてください。")
     tab1, tab2 = st.tabs(["ログイン", "新規登録"])
     with tab1:
@@ -258,8 +429,8 @@ if not st.session_state.authenticated:
         st.success("ゲストモードでログインしました。記録の保存や過去データの閲覧はできません。")
         st.rerun()
 
-    # DB接続エラーがあれば表示
-    if not db_connected and supabase_error_message:
+    # DBクライアントの初期化エラーがあれば表示（接続テストはログイン後のページで行う）
+    if supabase is None and supabase_error_message:
         st.error(f"データベース初期接続エラー: {supabase_error_message}")
 
     st.stop() # 認証されていない場合はここで処理を停止
@@ -275,19 +446,16 @@ with st.sidebar:
                 st.success("ログアウトしました。")
                 st.rerun() # ログアウト後に画面を更新
 
-    # DB接続状態表示
-    if db_connected:
-        st.success("✅ データベース接続: OK")
-    else:
-        st.error("❌ データベース接続: エラー")
-        if supabase_error_message:
-             st.caption(f"エラー詳細: {supabase_error_message}")
+    # DB接続状態表示（ページの処理で接続テストを行った後、スクリプトの最後に表示する）
+    db_status_placeholder = st.empty()
 
     st.divider()
     selected_function = st.radio(
         "機能選択",
-        ["トレーニング記録の入力", "過去の記録 (リスト表示)", "過去の記録 (グラフ表示)", "成長フィードバック"]
+        ["トレーニング記録の入力", "過去の記録 (リスト表示)", "過去の記録 (グラフ表示)", "記録の概要 (全種目)", "成長フィードバック",
+         "ランキング"]
     )
+    set_page(selected_function)
     st.divider()
     with st.expander("アプリについて"):
         # (省略 - 前回のコードと同じ)
@@ -331,37 +499,70 @@ if selected_function == "トレーニング記録の入力":
 
     # --- YouTube動画検索UIを追加 ---
     current_exercise = st.session_state.get("exercise_input", "") # text_inputの値を取得
+    if not st.session_state.is_guest and st.session_state.user_id:
+        prefetch_form_videos(st.session_state.user_id)
     if current_exercise and not st.session_state.is_guest: # 種名があり、ゲストでない場合
-        if st.button(f"「{current_exercise}」のフォーム動画を探す", key=f"search_{current_exercise}"):
+        # 検索済み・先読み済みの種目は、キャッシュの期限内ならボタンを押さなくても結果を表示する（クォータを使わない）
+        # 期限切れの種目は検索ボタンを表示し、押されたときに取り直す
+        videos = get_youtube_search().cached(current_exercise)
+        if videos is None and st.button(f"「{current_exercise}」のフォーム動画を探す",
+                                         key=f"search_{current_exercise}"):
             with st.spinner("動画を検索中..."):
                 videos = search_youtube_videos(current_exercise)
-                if videos:
-                    st.write("---")
-                    st.subheader("💡 参考フォーム動画")
-                    # --- 表示方法を改善 ---
-                    num_videos = len(videos)
-                    cols = st.columns(num_videos) # 結果の数だけ列を作成
-                    for i, video in enumerate(videos):
-                        with cols[i]:
-                            st.image(video['thumbnail'], use_column_width=True)
-                            st.caption(video['title']) # 画像の下にタイトル
-                            # 動画埋め込み（複数埋め込むと重い場合があるので注意）
-                            with st.expander("動画を再生"): # Expanderに入れる
-                                st.video(f"https://www.youtube.com/watch?v={video['videoId']}")
-                            st.link_button("YouTubeで見る", f"https://www.youtube.com/watch?v={video['videoId']}")
-                    st.write("---")
-                    # --- ここまで改善 ---
-                else:
-                    st.info("参考動画が見つかりませんでした。検索語句を変えてみてください。")
+            if not videos:
+                st.info("参考動画が見つかりませんでした。検索語句を変えてみてください。")
+        if videos:
+            st.write("---")
+            st.subheader("💡 参考フォーム動画")
+            cols = st.columns(len(videos)) # 結果の数だけ列を作成
+            for i, video in enumerate(videos):
+                with cols[i]:
+                    st.image(video['thumbnail'], use_column_width=True)
+                    st.caption(video['title']) # 画像の下にタイトル
+                    details = [video.get('channel'), format_duration(video.get('duration')),
+                               format_view_count(video.get('viewCount'))]
+                    if any(details):
+                        st.caption(" · ".join(detail for detail in details if detail))
+                    # 動画の埋め込みは再生を選んだものだけ読み込む
+                    if st.toggle("動画を再生", key=f"play_{video['videoId']}"):
+                        st.video(f"https://www.youtube.com/watch?v={video['videoId']}")
+                    st.link_button("YouTubeで見る", f"https://www.youtube.com/watch?v={video['videoId']}")
+            quota = get_youtube_search().cache.quota_today()
+            st.caption(f"YouTube API使用量（本日）: 消費 {quota['spent']} ユニット / キャッシュで節約 {quota['saved']} ユニット")
+            st.write("---")
     # --- ここまで追加 ---
 
+    def save_form_record(data):
+        # フォームの1件を保存する（種目名は確定済みのもの）
+        if st.session_state.is_guest:
+            st.warning("ゲストモードではデータを保存できません。登録してログインすると、トレーニング記録を保存できます。")
+            st.info("ゲストモードでの記録をシミュレートしました（保存されません）。")
+        elif st.session_state.user_id: # user_idがあるか確認
+            data = {**data, "user_id": st.session_state.user_id}
+            # ローカルのジャーナルに書いてすぐに戻る（送信はバックグラウンドで行い、失敗時は再送する）
+            saved_row = get_write_queue(supabase).enqueue(data)
+            # 新しい種目ならカタログに追加し、セッションの記録ストアにも反映（全履歴の再取得はしない）
+            get_exercise_catalog().add(st.session_state.user_id, data["exercise_name"])
+            add_saved_records(st.session_state.user_id, [saved_row])
+            st.success("トレーニング記録を保存しました！")
+        else:
+             st.error("ログインユーザー情報が見つかりません。再度ログインしてください。") # user_idがない場合
+
     # フォーム送信時の処理
     if submit_button:
         # (省略 - 前回のコードと同じ、ゲストチェックとuser_id挿入は含む)
-        if not exercise_name:
+        st.session_state.pop("pending_form_record", None)
+        st.session_state.pop("pending_form_choice", None)
+        if not clean_name(exercise_name):
             st.error("種目名を入力してください。")
-        elif db_connected:
+        elif db_connected():
             try:
+                # 表記ゆれ（「ベンチ プレス」「bench press」など）は正規の種目名・既存の種目名に寄せて保存する
+                names = name_index(known_exercises())
+                entered_name = clean_name(exercise_name)
+                exercise_name = names.canonicalize(entered_name)
+                if exercise_name != entered_name:
+                    st.info(f"種目名「{entered_name}」を「{exercise_name}」として記録します。")
                 data = {
                     "training_date": str(training_date), # 文字列で保存
                     "exercise_name": exercise_name,
@@ -370,31 +571,170 @@ if selected_function == "トレーニング記録の入力":
                     "sets": int(sets),
                     "notes": notes
                 }
-                if st.session_state.is_guest:
-                    st.warning("ゲストモードではデータを保存できません。登録してログインすると、トレーニング記録を保存できます。")
-                    # st.session_state.last_saved_record = data # ゲスト用の一時保存は不要かも
-                    st.info("ゲストモードでの記録をシミュレートしました（保存されません）。")
-                elif st.session_state.user_id: # user_idがあるか確認
-                    data["user_id"] = st.session_state.user_id
-                    response = supabase.table('training_records').insert(data).execute()
-                    if response.data and len(response.data) > 0:
-                        st.success("トレーニング記録が正常に保存されました！")
-                    else:
-                         error_detail = getattr(response, 'error', None)
-                         st.error(f"データの保存に失敗しました。{f'エラー: {error_detail}' if error_detail else ''}")
+                similar = names.similar_names(exercise_name)
+                if similar:
+                    # 新しい種目名で似た種目がある場合は、どちらで記録するかを選んでもらってから保存する
+                    st.session_state.pending_form_record = {"data": data, "similar": similar}
                 else:
-                     st.error("ログインユーザー情報が見つかりません。再度ログインしてください。") # user_idがない場合
+                    save_form_record(data)
             except Exception as e:
                 st.error(f"データ保存中にエラーが発生しました: {str(e)}")
         else:
             st.error("データベースに接続できません。設定を確認してください。")
 
+    def choose_pending_name(name):
+        # 確認待ちの記録の種目名を選ぶ（None は記録しない）。保存は次の実行の先頭で行う
+        st.session_state.pending_form_choice = name
+
+    pending_record = st.session_state.get("pending_form_record")
+    if pending_record and "pending_form_choice" in st.session_state:
+        chosen_name = st.session_state.pop("pending_form_choice")
+        st.session_state.pop("pending_form_record", None)
+        if chosen_name is not None:
+            try:
+                save_form_record({**pending_record["data"], "exercise_name": chosen_name})
+            except Exception as e:
+                st.error(f"データ保存中にエラーが発生しました: {str(e)}")
+    elif pending_record:
+        new_name = pending_record["data"]["exercise_name"]
+        st.warning(f"「{new_name}」は新しい種目名です。似た種目名: {'、'.join(pending_record['similar'])}。"
+                   "どの種目として記録しますか？")
+        choice_cols = st.columns(len(pending_record["similar"]) + 2)
+        for col, name in zip(choice_cols, [*pending_record["similar"], new_name]):
+            with col:
+                label = f"「{name}」として記録" if name != new_name else f"「{name}」を新しい種目として記録"
+                st.button(label, key=f"pending_name_{name}", on_click=choose_pending_name, args=(name,))
+        with choice_cols[-1]:
+            st.button("記録しない", key="pending_name_cancel", on_click=choose_pending_name, args=(None,))
+
+    # 送信待ちの記録（通信状態が悪い場合など）
+    if supabase is not None and not st.session_state.is_guest and st.session_state.user_id:
+        pending_writes = get_write_queue(supabase).pending(st.session_state.user_id)
+        if pending_writes:
+            failed_writes = [row for row in pending_writes if row['last_error']]
+            if failed_writes:
+                st.warning(f"未送信の記録が {len(pending_writes)} 件あります。自動で再送します"
+                           f"（最後のエラー: {failed_writes[-1]['last_error']}）")
+                st.button("今すぐ再送", on_click=get_write_queue(supabase).retry_now,
+                          args=(st.session_state.user_id,))
+            else:
+                st.caption(f"送信中の記録: {len(pending_writes)} 件")
+
+    # --- セット単位でまとめて記録 ---
+    with st.expander("ワークアウトをまとめて記録（セットごとに重量・回数を入力）"):
+        st.caption("1行に1セットを入力します。同じ種目の行は1つの記録にまとめ（重量は最大値、ボリュームと推定1RMはセットごとの値から計算）、"
+                   "1回の通信で保存します。")
+        if "workout_session_id" not in st.session_state:
+            # 保存に成功するまで同じIDで再送する（応答が失われても二重に登録されない）
+            st.session_state.workout_session_id = new_session_id()
+            st.session_state.workout_editor_version = 0
+        if "workout_saved_message" in st.session_state:
+            st.success(st.session_state.pop("workout_saved_message"))
+        today = datetime.now().date()
+        session_date = st.date_input("トレーニング日", value=today, max_value=today, key="workout_session_date")
+        set_rows = st.data_editor(
+            pd.DataFrame({'exercise_name': [None] * 3, 'weight': [None] * 3, 'reps': [None] * 3}, columns=SET_COLUMNS),
+            column_config={
+                'exercise_name': st.column_config.TextColumn("種目"),
+                'weight': st.column_config.NumberColumn("重量 (kg)", min_value=0.0, max_value=MAX_WEIGHT, step=0.5, format="%.1f"),
+                'reps': st.column_config.NumberColumn("回数", min_value=1, step=1, format="%d"),
+            },
+            num_rows="dynamic", use_container_width=True, hide_index=True,
+            # 保存後は表を空に戻すため、キーを変えて作り直す
+            key=f"workout_sets_{st.session_state.workout_editor_version}",
+        )
+        session_notes = st.text_input("メモ (任意)", placeholder="調子や感想など", key="workout_session_notes")
+
+        entered_rows = set_rows.to_dict('records')
+        workout_sets = None
+        try:
+            # 種目名が入力されたときだけ既存の種目名を参照する（空の表の表示では問い合わせない）
+            workout_names = known_exercises() if set_rows['exercise_name'].notna().any() else []
+            workout_sets = validate_sets(entered_rows, session_date, today, workout_names)
+        except ImportRowError as e:
+            if any(pd.notna(value) and str(value).strip() for row in entered_rows for value in row.values()):
+                st.warning(str(e))
+        if workout_sets:
+            # 新しい種目名に似た既存の種目名があれば、保存前に表で直せるように表示する
+            workout_index = name_index(workout_names)
+            for new_name in sorted({row['exercise_name'] for row in workout_sets}):
+                similar = workout_index.similar_names(new_name)
+                if similar:
+                    st.caption(f"「{new_name}」は新しい種目として記録されます。似た種目名: {'、'.join(similar)}")
+            st.dataframe(summarize_sets(workout_sets), hide_index=True, use_container_width=True, column_config={
+                'exercise_name': st.column_config.TextColumn("種目"),
+                'sets': st.column_config.NumberColumn("セット数", format="%d セット"),
+                'weight': st.column_config.NumberColumn("最大重量", format="%.1f kg"),
+                'volume': st.column_config.NumberColumn("ボリューム", format="%.1f"),
+                'e1rm': st.column_config.NumberColumn("推定1RM", format="%.1f kg"),
+            })
+
+        if st.button("ワークアウトを保存", disabled=not workout_sets):
+            if st.session_state.is_guest:
+                st.warning("ゲストモードではデータを保存できません。登録してログインすると、トレーニング記録を保存できます。")
+            elif not db_connected():
+                st.error("データベースに接続できません。設定を確認してください。")
+            elif st.session_state.user_id:
+                try:
+                    saved_rows = save_workout_session(supabase, st.session_state.user_id, session_date, workout_sets,
+                                                      session_notes, st.session_state.workout_session_id)
+                except Exception as e:
+                    st.error(f"ワークアウトの保存中にエラーが発生しました"
+                             f"（migrations/0006_workout_sessions.sql が未適用の可能性があります）: {str(e)}")
+                else:
+                    for exercise in {row['exercise_name'] for row in saved_rows}:
+                        get_exercise_catalog().add(st.session_state.user_id, exercise)
+                    add_saved_records(st.session_state.user_id, saved_rows)
+                    st.session_state.workout_session_id = new_session_id()
+                    st.session_state.workout_editor_version += 1
+                    st.session_state.workout_saved_message = \
+                        f"{len(workout_sets)}セット（{len(saved_rows)}種目）のワークアウトを保存しました！"
+                    st.rerun()
+            else:
+                st.error("ログインユーザー情報が見つかりません。再度ログインしてください。")
+
+    # --- CSV/JSONからの一括インポート ---
+    with st.expander("CSV/JSONファイルから一括インポート"):
+        st.caption("列: training_date（日付）, exercise_name（種目名）, weight（重量）, reps（回数）, sets（セット数）, notes（メモ・任意）。"
+                   "同じファイルを再度インポートしても、登録済みの行は重複して登録されません。")
+        uploaded_file = st.file_uploader("インポートするファイル", type=["csv", "json", "jsonl", "ndjson"])
+        chunk_size = st.selectbox("一度に登録する件数", CHUNK_SIZE_OPTIONS,
+                                  index=CHUNK_SIZE_OPTIONS.index(DEFAULT_CHUNK_SIZE)
+                                  if DEFAULT_CHUNK_SIZE in CHUNK_SIZE_OPTIONS else 0)
+        if st.button("インポート", disabled=uploaded_file is None):
+            if st.session_state.is_guest:
+                st.warning("ゲストモードではデータをインポートできません。")
+            elif not db_connected():
+                st.error("データベースに接続できません。設定を確認してください。")
+            elif st.session_state.user_id:
+                stqdm = lazy_import("stqdm").stqdm
+                progress = stqdm(total=estimate_row_count(uploaded_file), desc="インポート中", unit="行")
+                try:
+                    summary = import_records(supabase, st.session_state.user_id, iter_file_rows(uploaded_file),
+                                             chunk_size=chunk_size, on_progress=progress.update,
+                                             known_names=known_exercises())
+                except Exception as e:
+                    st.error(f"インポート中にエラーが発生しました（それまでの行は登録済みです）: {str(e)}")
+                else:
+                    # 登録した種目をカタログに追加し、記録ストアは差分同期で取り込む
+                    for exercise in summary["exercises"]:
+                        get_exercise_catalog().add(st.session_state.user_id, exercise)
+                    get_record_store(supabase, st.session_state.user_id).sync(supabase, force=True)
+                    st.success(f"{summary['read']}行を読み込み、{summary['inserted']}件を登録しました"
+                               f"（登録済みのためスキップ: {summary['duplicates']}件 / エラー: {summary['invalid']}件）。")
+                    if summary["errors"]:
+                        st.warning("\n".join(f"- {error}" for error in summary["errors"]))
+                finally:
+                    progress.close()
+            else:
+                st.error("ログインユーザー情報が見つかりません。再度ログインしてください。")
+
 
 # --- 過去の記録 (リスト表示) 機能 ---
 elif selected_function == "過去の記録 (リスト表示)":
     # (省略 - 前回のコードと同じ、ゲストチェックとuser_idフィルタは含む)
     st.header("過去のトレーニング記録")
-    if db_connected:
+    if db_connected():
         try:
             col1, col2 = st.columns(2)
             with col1:
@@ -406,72 +746,122 @@ elif selected_function == "過去の記録 (リスト表示)":
                 with col_end:
                     end_date = st.date_input("終了日", value=end_date_default, min_value=start_date) # min_value追加
 
-            with col2:
-                try:
-                    # ログインユーザーの種目リストのみ取得
-                    query = supabase.table('training_records').select('exercise_name')
-                    if not st.session_state.is_guest and st.session_state.user_id:
-                        query = query.eq('user_id', st.session_state.user_id)
-                    response_exercises = query.execute()
-
-                    if response_exercises.data:
-                        all_exercises = list(set([record['exercise_name'] for record in response_exercises.data if record.get('exercise_name')]))
-                    else:
+            # ログインユーザーは種目リストと記録の1ページを同時に取得する
+            # （絞り込み条件はウィジェットの現在値。描画後に条件が変わっていれば取り直す）
+            with ConcurrentQueries() as list_queries:
+                if not st.session_state.is_guest and st.session_state.user_id:
+                    prefetch_exercise = st.session_state.get("list_exercise", "すべての種目")
+                    prefetch_page_size = st.session_state.get("list_page_size", DEFAULT_PAGE_SIZE)
+                    pager = get_list_pager(start_date, end_date, prefetch_exercise, prefetch_page_size)
+                    list_queries.submit("exercises", get_exercise_catalog().get, supabase, st.session_state.user_id)
+                    list_queries.submit(
+                        "records", fetch_records_page, supabase, st.session_state.user_id, start_date, end_date,
+                        None if prefetch_exercise == "すべての種目" else prefetch_exercise,
+                        page_size=prefetch_page_size, cursor=pager["cursors"][-1],
+                        with_count=pager["count"] is None  # 総件数は条件ごとに1回だけ数える
+                    )
+
+                with col2:
+                    try:
+                        # ログインユーザーの種目リストのみ取得（キャッシュ済みカタログ）
+                        if st.session_state.is_guest:
+                            all_exercises = list(SAMPLE_EXERCISES)
+                        elif st.session_state.user_id:
+                            all_exercises = list_queries.result("exercises")
+                        else:
+                            all_exercises = []
+                    except Exception as ex_e:
+                        st.warning(f"種目リストの取得に失敗しました: {ex_e}")
                         all_exercises = []
-                except Exception as ex_e:
-                    st.warning(f"種目リストの取得に失敗しました: {ex_e}")
-                    all_exercises = []
-                selected_exercise = st.selectbox("種目で絞り込み", options=["すべての種目"] + sorted(all_exercises))
+                    selected_exercise = st.selectbox(
+                        "種目で絞り込み", options=["すべての種目"] + sorted(all_exercises), key="list_exercise"
+                    )
 
-            if st.session_state.is_guest:
-                st.info("ゲストモードではサンプルデータが表示されます。")
-                sample_df_list = create_sample_data()
-                # 日付と種目でフィルタ
-                sample_df_list['training_date'] = pd.to_datetime(sample_df_list['training_date']).dt.date
-                sample_df_list = sample_df_list[
-                    (sample_df_list['training_date'] >= start_date) &
-                    (sample_df_list['training_date'] <= end_date)
-                ]
-                if selected_exercise != "すべての種目":
-                    sample_df_list = sample_df_list[sample_df_list['exercise_name'] == selected_exercise]
-
-                if not sample_df_list.empty:
-                     display_columns_guest = ['training_date', 'exercise_name', 'weight', 'reps', 'sets', 'notes']
-                     display_columns_guest = [col for col in display_columns_guest if col in sample_df_list.columns]
-                     st.dataframe(
-                         sample_df_list[display_columns_guest].style.format({
-                             'weight': '{:.1f} kg', 'reps': '{} 回', 'sets': '{} セット'
-                         }), use_container_width=True
-                     )
-                     st.info(f"サンプルデータ {len(sample_df_list)} 件")
-                else:
-                     st.info("条件に合うサンプルデータがありません。")
-
-            elif st.session_state.user_id: # ログインユーザー
-                query = supabase.table('training_records').select('*')
-                query = query.eq('user_id', st.session_state.user_id)
-                query = query.gte('training_date', str(start_date)).lte('training_date', str(end_date))
-                if selected_exercise != "すべての種目":
-                    query = query.eq('exercise_name', selected_exercise)
-                response = query.order('training_date', desc=True).execute()
-
-                if response.data and len(response.data) > 0:
-                    df = pd.DataFrame(response.data)
-                    if 'notes' not in df.columns: df['notes'] = ""
-                    else: df['notes'] = df['notes'].fillna("")
-                    df['training_date'] = pd.to_datetime(df['training_date']).dt.date
-                    display_columns = ['training_date', 'exercise_name', 'weight', 'reps', 'sets', 'notes']
-                    display_columns = [col for col in display_columns if col in df.columns]
-                    st.dataframe(
-                        df[display_columns].style.format({
-                            'weight': '{:.1f} kg', 'reps': '{} 回', 'sets': '{} セット'
-                        }), use_container_width=True
+                if st.session_state.is_guest:
+                    st.info("ゲストモードではサンプルデータが表示されます。")
+                    sample_df_list = get_guest_dataset(datetime.now().date())
+                    # 日付と種目でフィルタ（共有データは変更せず、マスクで絞り込む）
+                    mask = sample_df_list['training_date'].between(pd.Timestamp(start_date), pd.Timestamp(end_date))
+                    if selected_exercise != "すべての種目":
+                        mask &= sample_df_list['exercise_name'] == selected_exercise
+                    sample_df_list = sample_df_list[mask]
+
+                    if not sample_df_list.empty:
+                         display_columns_guest = [col for col in LIST_DISPLAY_COLUMNS if col in sample_df_list.columns]
+                         st.dataframe(
+                             sample_df_list[display_columns_guest], column_config=LIST_COLUMN_CONFIG,
+                             use_container_width=True, hide_index=True
+                         )
+                         st.info(f"サンプルデータ {len(sample_df_list)} 件")
+                    else:
+                         st.info("条件に合うサンプルデータがありません。")
+
+                elif st.session_state.user_id: # ログインユーザー
+                    page_size = st.selectbox(
+                        "1ページの表示件数", options=PAGE_SIZE_OPTIONS,
+                        index=PAGE_SIZE_OPTIONS.index(DEFAULT_PAGE_SIZE), key="list_page_size"
                     )
-                    st.info(f"全 {len(df)} 件のレコードが見つかりました。")
+                    if (selected_exercise, page_size) == (prefetch_exercise, prefetch_page_size):
+                        rows, next_cursor, count = list_queries.result("records")
+                    else:
+                        # 選択中の種目が一覧から消えた場合など、先行取得と条件が異なるときだけ取り直す
+                        pager = get_list_pager(start_date, end_date, selected_exercise, page_size)
+                        rows, next_cursor, count = fetch_records_page(
+                            supabase, st.session_state.user_id, start_date, end_date,
+                            None if selected_exercise == "すべての種目" else selected_exercise,
+                            page_size=page_size, cursor=pager["cursors"][-1],
+                            with_count=pager["count"] is None
+                        )
+                    if count is not None:
+                        pager["count"] = count
+
+                    if rows:
+                        df = pd.DataFrame(rows)
+                        df['notes'] = df['notes'].fillna("")
+                        df['training_date'] = pd.to_datetime(df['training_date']).dt.date
+                        display_columns = [col for col in LIST_DISPLAY_COLUMNS if col in df.columns]
+                        st.dataframe(
+                            df[display_columns], column_config=LIST_COLUMN_CONFIG,
+                            use_container_width=True, hide_index=True
+                        )
+                        page_index = len(pager["cursors"]) - 1
+                        total = pager["count"] if pager["count"] is not None else len(rows)
+                        first = page_index * page_size + 1
+                        last = first + len(rows) - 1
+                        st.info(f"全 {total} 件中 {first}〜{last} 件目を表示しています。")
+
+                        nav_prev, nav_page, nav_next = st.columns([1, 2, 1])
+                        with nav_prev:
+                            st.button("◀ 前へ", disabled=page_index == 0, on_click=pager["cursors"].pop)
+                        with nav_page:
+                            st.caption(f"{page_index + 1} / {max(1, -(-total // page_size))} ページ")
+                        with nav_next:
+                            st.button(
+                                "次へ ▶", disabled=next_cursor is None or last >= total,
+                                on_click=pager["cursors"].append, args=(next_cursor,)
+                            )
+                    else:
+                        st.info("条件に一致するレコードがありません。")
+
+                    # --- 全履歴のエクスポート（絞り込み条件に関係なく全件） ---
+                    with st.expander("全履歴をエクスポート"):
+                        export_format = st.radio("形式", list(EXPORT_FORMATS), horizontal=True)
+                        if st.button("エクスポート用ファイルを作成"):
+                            stqdm = lazy_import("stqdm").stqdm
+                            progress = stqdm(desc="書き出し中", unit="件")
+                            try:
+                                export_file = export_records(supabase, st.session_state.user_id, export_format,
+                                                             on_progress=progress.update)
+                            finally:
+                                progress.close()
+                            file_format = EXPORT_FORMATS[export_format]
+                            st.download_button(
+                                "ダウンロード", data=export_file,
+                                file_name=f"training_records_{datetime.now():%Y%m%d}.{file_format['extension']}",
+                                mime=file_format["mime"],
+                            )
                 else:
-                    st.info("条件に一致するレコードがありません。")
-            else:
-                 st.warning("ユーザー情報が見つかりません。")
+                     st.warning("ユーザー情報が見つかりません。")
         except Exception as e:
             st.error(f"データの取得中にエラーが発生しました: {str(e)}")
     else:
@@ -482,101 +872,126 @@ elif selected_function == "過去の記録 (リスト表示)":
 elif selected_function == "過去の記録 (グラフ表示)":
     # (省略 - 前回のコードと同じ構成、ゲストチェックとuser_idフィルタは含む)
     st.header("トレーニング記録の推移")
-    if db_connected:
+    if db_connected():
         try:
-            # 種目選択
-            try:
-                query = supabase.table('training_records').select('exercise_name')
+            # ログインユーザーは種目リストと記録ストアの差分同期を同時に行う
+            with ConcurrentQueries() as graph_queries:
                 if not st.session_state.is_guest and st.session_state.user_id:
-                    query = query.eq('user_id', st.session_state.user_id)
-                response_exercises = query.execute()
-                if response_exercises.data:
-                    all_exercises = list(set([record['exercise_name'] for record in response_exercises.data if record.get('exercise_name')]))
-                else:
-                    all_exercises = []
-            except Exception as ex_e:
-                st.warning(f"種目リストの取得に失敗しました: {ex_e}")
-                all_exercises = []
+                    store = get_record_store(supabase, st.session_state.user_id, sync=False)
+                    graph_queries.submit("exercises", get_exercise_catalog().get, supabase, st.session_state.user_id)
+                    graph_queries.submit("sync", store.sync, supabase, timeout=store.sync_timeout)
 
-            if not all_exercises and not st.session_state.is_guest:
-                 st.info("まだトレーニング記録がありません。「トレーニング記録の入力」から記録を追加してください。")
-            else:
-                if st.session_state.is_guest:
-                     all_exercises = ["ベンチプレス", "スクワット", "デッドリフト", "懸垂", "腕立て伏せ"] # ゲスト用サンプル種目
-                selected_exercise = st.selectbox("種目を選択", options=sorted(all_exercises))
+                # 種目選択
+                try:
+                    if st.session_state.is_guest:
+                        all_exercises = list(SAMPLE_EXERCISES)
+                    elif st.session_state.user_id:
+                        all_exercises = graph_queries.result("exercises")
+                    else:
+                        all_exercises = []
+                except Exception as ex_e:
+                    st.warning(f"種目リストの取得に失敗しました: {ex_e}")
+                    all_exercises = []
 
-                # データ取得
-                df = None
-                if st.session_state.is_guest:
-                    st.info("ゲストモードではサンプルデータが表示されます。")
-                    sample_df_graph = create_sample_data()
-                    df = sample_df_graph[sample_df_graph['exercise_name'] == selected_exercise].copy() # .copy()推奨
-                    if not df.empty:
-                        df['training_date'] = pd.to_datetime(df['training_date']) # 日付型に変換
-                elif st.session_state.user_id:
-                    response = supabase.table('training_records')\
-                        .select('*')\
-                        .eq('user_id', st.session_state.user_id)\
-                        .eq('exercise_name', selected_exercise)\
-                        .order('training_date', desc=False)\
-                        .execute()
-                    if response.data and len(response.data) > 0:
-                         df = pd.DataFrame(response.data)
-                         df['training_date'] = pd.to_datetime(df['training_date'])
-
-                if df is not None and not df.empty:
-                    # データ型の確認と変換
-                    df['weight'] = pd.to_numeric(df['weight'], errors='coerce')
-                    df['reps'] = pd.to_numeric(df['reps'], errors='coerce')
-                    df['sets'] = pd.to_numeric(df['sets'], errors='coerce')
-                    df = df.dropna(subset=['weight', 'reps', 'sets']) # 不正データを削除
-
-                    if not df.empty: # データが残っているか確認
-                        graph_mode = st.radio("グラフ表示モード", ["重量の推移", "回数の推移", "ボリューム(重量×回数×セット)の推移"])
-
-                        try:
-                            if graph_mode == "重量の推移":
-                                fig = px.line(df, x='training_date', y='weight', markers=True, title=f"{selected_exercise}の重量推移")
-                                fig.update_layout(xaxis_title="日付", yaxis_title="重量 (kg)", yaxis=dict(rangemode='tozero'))
-                                st.plotly_chart(fig, use_container_width=True)
-                            elif graph_mode == "回数の推移":
-                                fig = px.line(df, x='training_date', y='reps', markers=True, title=f"{selected_exercise}の回数推移")
-                                fig.update_layout(xaxis_title="日付", yaxis_title="回数 (reps)", yaxis=dict(rangemode='tozero'))
-                                st.plotly_chart(fig, use_container_width=True)
-                            elif graph_mode == "ボリューム(重量×回数×セット)の推移":
-                                df['volume'] = df['weight'] * df['reps'] * df['sets']
-                                fig = px.line(df, x='training_date', y='volume', markers=True, title=f"{selected_exercise}のトレーニングボリューム推移")
-                                fig.update_layout(xaxis_title="日付", yaxis_title="ボリューム (kg×reps×sets)", yaxis=dict(rangemode='tozero'))
+                if not all_exercises and not st.session_state.is_guest:
+                     st.info("まだトレーニング記録がありません。「トレーニング記録の入力」から記録を追加してください。")
+                else:
+                    selected_exercise = st.selectbox("種目を選択", options=sorted(all_exercises))
+
+                    # データ取得
+                    df = None
+                    if st.session_state.is_guest:
+                        st.info("ゲストモードではサンプルデータが表示されます。")
+                        sample_df_graph = get_guest_dataset(datetime.now().date())
+                        df = sample_df_graph[sample_df_graph['exercise_name'] == selected_exercise].copy() # .copy()推奨
+                        # データ型の確認と変換
+                        df['weight'] = pd.to_numeric(df['weight'], errors='coerce')
+                        df['reps'] = pd.to_numeric(df['reps'], errors='coerce')
+                        df['sets'] = pd.to_numeric(df['sets'], errors='coerce')
+                        df = add_volume(df.dropna(subset=['weight', 'reps', 'sets'])) # 不正データを削除
+
+                        def derive(key, func):
+                            return func(df)
+                        # サンプルデータは日付ごとに決まる
+                        figure_owner, data_version = "guest", f"sample:{datetime.now().date()}"
+                    elif st.session_state.user_id:
+                        graph_queries.result("sync")
+                        # 派生列付きの系列と集計結果は記録ストアに保持する（新しい記録が届くまで再計算しない）
+                        df = store.series(selected_exercise)
+
+                        def derive(key, func):
+                            return store.derived(selected_exercise, key, func)
+                        figure_owner, data_version = st.session_state.user_id, store.data_version(selected_exercise)
+
+                    if df is not None:
+                        if not df.empty: # データが残っているか確認
+                            graph_col, level_col = st.columns([2, 1])
+                            with graph_col:
+                                graph_mode = st.radio("グラフ表示モード", list(GRAPH_MODES))
+                            with level_col:
+                                aggregation_level = st.selectbox("集計単位", list(AGGREGATION_LEVELS))
+
+                            try:
+                                # 集計・間引き済みの系列だけを描画する（重量・回数は期間内の最大、ボリュームは合計）
+                                metric, title, y_label = GRAPH_MODES[graph_mode]
+
+                                def build_figure():
+                                    px = lazy_import("plotly.express") # グラフ表示ページでのみ読み込む
+                                    series = derive(("series", metric, aggregation_level),
+                                                    lambda data: prepare_series(data, metric, aggregation_level))
+                                    fig = px.line(series, x='training_date', y=metric, markers=True,
+                                                  title=f"{selected_exercise}の{title}（{aggregation_level}）")
+                                    fig.update_layout(xaxis_title="日付", yaxis_title=y_label,
+                                                      yaxis=dict(rangemode='tozero'))
+                                    return fig
+
+                                # データと表示条件が同じなら、作成済みの図をそのまま使う
+                                fig = get_figure_cache().get_or_build(
+                                    (figure_owner, selected_exercise, graph_mode, aggregation_level, data_version),
+                                    build_figure)
                                 st.plotly_chart(fig, use_container_width=True)
-                        except Exception as plot_e:
-                            st.error(f"グラフ描画エラー: {plot_e}")
-
-                        # 統計情報
-                        st.subheader("統計情報")
-                        col1, col2, col3 = st.columns(3)
-                        with col1:
-                            max_weight = df['weight'].max()
-                            st.metric("自己ベスト重量", f"{max_weight:.1f} kg" if pd.notna(max_weight) else "N/A")
-                        with col2:
-                            max_reps = df['reps'].max()
-                            st.metric("自己ベスト回数", f"{int(max_reps)} 回" if pd.notna(max_reps) else "N/A")
-                        with col3:
-                            if 'volume' not in df.columns: df['volume'] = df['weight'] * df['reps'] * df['sets']
-                            max_volume = df['volume'].max()
-                            st.metric("最大ボリューム", f"{max_volume:.1f}" if pd.notna(max_volume) else "N/A")
-
-                        # データテーブル表示
-                        with st.expander("詳細データを表示"):
-                            display_cols_detail_graph = ['training_date', 'weight', 'reps', 'sets', 'notes']
-                            display_cols_detail_graph = [col for col in display_cols_detail_graph if col in df.columns]
-                            st.dataframe(
-                                df.sort_values('training_date', ascending=False)[display_cols_detail_graph],
-                                use_container_width=True
-                            )
+                            except Exception as plot_e:
+                                st.error(f"グラフ描画エラー: {plot_e}")
+
+                            # 統計情報
+                            st.subheader("統計情報")
+                            col1, col2, col3 = st.columns(3)
+                            with col1:
+                                max_weight = df['weight'].max()
+                                st.metric("自己ベスト重量", f"{max_weight:.1f} kg" if pd.notna(max_weight) else "N/A")
+                            with col2:
+                                max_reps = df['reps'].max()
+                                st.metric("自己ベスト回数", f"{int(max_reps)} 回" if pd.notna(max_reps) else "N/A")
+                            with col3:
+                                max_volume = df['volume'].max()
+                                st.metric("最大ボリューム", f"{max_volume:.1f}" if pd.notna(max_volume) else "N/A")
+
+                            col4, col5 = st.columns(2)
+                            with col4:
+                                slopes = derive("slopes", lambda data: progression_slopes(data, metric='e1rm'))
+                                slope = slopes['slope_per_week'].iloc[0] if not slopes.empty else None
+                                st.metric("推定1RMの伸び (1週間あたり)",
+                                          f"{slope:+.2f} kg" if slope is not None and pd.notna(slope) else "N/A",
+                                          help="記録日ごとの推定1RM（Epley式）の最大値に直線を当てはめた傾き")
+                            with col5:
+                                ratios = derive("acwr", acute_chronic_ratio)
+                                acwr = ratios['acwr'].iloc[-1] if not ratios.empty else None
+                                st.metric("急性:慢性負荷比 (ACWR)",
+                                          f"{acwr:.2f}" if acwr is not None and pd.notna(acwr) else "N/A",
+                                          help="直近7日のボリューム ÷ 直近28日の1週間あたり平均ボリューム（最後の記録日時点）")
+
+                            # データテーブル表示
+                            with st.expander("詳細データを表示"):
+                                display_cols_detail_graph = ['training_date', 'weight', 'reps', 'sets', 'notes']
+                                display_cols_detail_graph = [col for col in display_cols_detail_graph if col in df.columns]
+                                st.dataframe(
+                                    df.sort_values('training_date', ascending=False)[display_cols_detail_graph],
+                                    use_container_width=True
+                                )
+                        else:
+                             st.info(f"{selected_exercise}の有効な記録がありません。")
                     else:
-                         st.info(f"{selected_exercise}の有効な記録がありません。")
-                else:
-                    st.info(f"{selected_exercise}の記録がありません。")
+                        st.info(f"{selected_exercise}の記録がありません。")
 
         except Exception as e:
             st.error(f"グラフ表示機能で予期せぬエラーが発生しました: {str(e)}")
@@ -584,117 +999,298 @@ elif selected_function == "過去の記録 (グラフ表示)":
         st.error("データベースに接続できません。設定を確認してください。")
 
 
+# --- 全種目の概要（カレンダー・種目ごとの推移・週ごとのボリューム） ---
+elif selected_function == "記録の概要 (全種目)":
+    st.header("トレーニングの概要")
+    if db_connected():
+        try:
+            daily = None
+            if st.session_state.is_guest:
+                st.info("ゲストモードではサンプルデータが表示されます。")
+                today = datetime.now().date()
+                daily = get_guest_daily_summary(today)
+                figure_owner, data_version = "guest", f"sample:{today}"
+            elif st.session_state.user_id:
+                # (記録日, 種目) ごとの集計表は全履歴から1回だけ作り、記録が変わるまで記録ストアに保持する
+                store = get_record_store(supabase, st.session_state.user_id)
+                daily = store.derived_all("daily_summary", daily_summary)
+                figure_owner, data_version = st.session_state.user_id, store.data_version()
+
+            if daily is None or daily.empty:
+                st.info("まだトレーニング記録がありません。「トレーニング記録の入力」から記録を追加してください。")
+            else:
+                end_date = daily['training_date'].max()
+                exercises = top_exercises(daily)
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("トレーニング日数", f"{daily['training_date'].nunique()} 日")
+                with col2:
+                    st.metric("種目数", f"{daily['exercise_name'].nunique()} 種目")
+                with col3:
+                    st.metric("最終トレーニング日", f"{end_date:%Y-%m-%d}")
+
+                view = st.radio("表示", OVERVIEW_VIEWS, horizontal=True)
+                options = ()
+                if view == "種目ごとの推移":
+                    mode_col, level_col = st.columns([2, 1])
+                    with mode_col:
+                        graph_mode = st.radio("グラフ表示モード", list(GRAPH_MODES))
+                    with level_col:
+                        aggregation_level = st.selectbox("集計単位", OVERVIEW_LEVELS, index=1)
+                    options = (graph_mode, aggregation_level)
+
+                def build_figure():
+                    if view == "カレンダー":
+                        go = lazy_import("plotly.graph_objects")
+                        matrix, week_starts = calendar_matrix(daily, end_date)
+                        fig = go.Figure(go.Heatmap(
+                            z=matrix, x=week_starts, y=WEEKDAY_LABELS, colorscale="Greens", xgap=2, ygap=2,
+                            hovertemplate="%{x|%Y-%m-%d} の週 (%{y})<br>ボリューム: %{z:,.0f}<extra></extra>"))
+                        fig.update_layout(title="1日ごとのボリューム（直近1年）", height=260,
+                                          yaxis=dict(autorange="reversed"), margin=dict(t=50, b=20))
+                        return fig
+                    px = lazy_import("plotly.express")
+                    if view == "種目ごとの推移":
+                        metric, title, y_label = GRAPH_MODES[graph_mode]
+                        trends = exercise_trends(daily, metric, aggregation_level, exercises)
+                        rows = -(-len(exercises) // 3)
+                        fig = px.line(trends, x='training_date', y=metric, facet_col='exercise_name',
+                                      facet_col_wrap=3, facet_row_spacing=min(0.08, 0.5 / rows),
+                                      markers=True, height=220 * rows + 80,
+                                      title=f"種目ごとの{title}（{aggregation_level}）",
+                                      labels={'training_date': "日付", metric: y_label})
+                        # 種目ごとに値の大きさが違うため、縦軸は種目ごとに合わせる
+                        fig.update_yaxes(matches=None, rangemode='tozero', showticklabels=True)
+                        fig.for_each_annotation(lambda a: a.update(text=a.text.split("=", 1)[-1]))
+                        return fig
+                    volume = weekly_volume(daily, end_date, exercises)
+                    fig = px.bar(volume, x='week', y='volume', color='exercise_name',
+                                 title="週ごとのボリューム（種目別）",
+                                 labels={'week': "週の開始日", 'volume': "ボリューム (kg×reps×sets)",
+                                         'exercise_name': "種目"})
+                    fig.update_layout(barmode='stack')
+                    return fig
+
+                try:
+                    fig = get_figure_cache().get_or_build(
+                        (figure_owner, "記録の概要", view, *options, data_version), build_figure)
+                    st.plotly_chart(fig, use_container_width=True)
+                except Exception as plot_e:
+                    st.error(f"グラフ描画エラー: {plot_e}")
+        except Exception as e:
+            st.error(f"概要の表示で予期せぬエラーが発生しました: {str(e)}")
+    else:
+        st.error("データベースに接続できません。設定を確認してください。")
+
+
 # --- 成長フィードバック機能 ---
 elif selected_function == "成長フィードバック":
     # (省略 - 前回のコードと同じ、ゲストチェックとuser_idフィルタは含む)
     st.header("成長フィードバック 💪")
-    if db_connected:
+    if db_connected():
         try:
             if st.button("今日のトレーニング結果を見る"):
                 today = datetime.now().date()
 
                 if st.session_state.is_guest:
-                    st.info("ゲストモードではサンプルフィードバックが表示されます。")
-                    st.success("🎉 ベンチプレス 重量 +2.5kg (60kg -> 62.5kg)")
-                    st.success("💪 スクワット 回数 +2回 (8回 -> 10回)")
+                    # 共有のサンプルデータの最新トレーニング日を「今日」として集計する
+                    sample_df = get_guest_dataset(today)
+                    sample_day = sample_df['training_date'].max()
+                    st.info(f"ゲストモードではサンプルデータの最新トレーニング日"
+                            f"（{sample_day:%Y-%m-%d}）のフィードバックが表示されます。")
+                    day_df = sample_df[sample_df['training_date'] == sample_day]
+                    day_exercises = day_df['exercise_name'].unique()
+                    history_df = sample_df[sample_df['exercise_name'].isin(day_exercises)
+                                           & (sample_df['training_date'] != sample_day)]
+                    show_feedback(day_df.to_dict('records'), summarize_history(history_df, sample_day.date()))
                 elif st.session_state.user_id:
-                    today_response = supabase.table('training_records')\
-                        .select('*')\
-                        .eq('user_id', st.session_state.user_id)\
-                        .eq('training_date', today.isoformat())\
-                        .execute()
-
-                    if today_response.data and len(today_response.data) > 0:
-                        today_records = today_response.data
-                        st.success(f"今日は{len(today_records)}種目のトレーニングを記録しました！")
-
-                        for record in today_records:
-                            exercise = record.get('exercise_name', 'N/A')
-                            weight = pd.to_numeric(record.get('weight'), errors='coerce')
-                            reps = pd.to_numeric(record.get('reps'), errors='coerce')
-
-                            if pd.isna(weight) or pd.isna(reps): continue # 数値でないデータはスキップ
-
-                            # 前回記録
-                            previous_response = supabase.table('training_records')\
-                                .select('*')\
-                                .eq('user_id', st.session_state.user_id)\
-                                .eq('exercise_name', exercise)\
-                                .lt('training_date', today.isoformat())\
-                                .order('training_date', desc=True)\
-                                .limit(1).execute()
-                            # 自己ベスト
-                            best_weight_response = supabase.table('training_records')\
-                                .select('weight').eq('user_id', st.session_state.user_id)\
-                                .eq('exercise_name', exercise).neq('training_date', today.isoformat())\
-                                .order('weight', desc=True, nulls_last=True).limit(1).execute()
-                            best_reps_response = supabase.table('training_records')\
-                                .select('reps').eq('user_id', st.session_state.user_id)\
-                                .eq('exercise_name', exercise).neq('training_date', today.isoformat())\
-                                .order('reps', desc=True, nulls_last=True).limit(1).execute()
-
-                            has_previous = previous_response.data and len(previous_response.data) > 0
-                            has_best_weight = best_weight_response.data and len(best_weight_response.data) > 0
-                            has_best_reps = best_reps_response.data and len(best_reps_response.data) > 0
-
-                            with st.container(border=True): # 枠線を追加
-                                st.subheader(f"🔍 {exercise}")
-                                col1, col2 = st.columns(2)
-                                with col1:
-                                    st.write("**重量**")
-                                    if has_previous:
-                                        prev_weight = pd.to_numeric(previous_response.data[0].get('weight'), errors='coerce')
-                                        if pd.notna(prev_weight):
-                                            weight_diff = weight - prev_weight
-                                            if weight_diff > 0: st.success(f"🎉 +{weight_diff:.1f}kg ({prev_weight:.1f}→{weight:.1f}kg)")
-                                            elif weight_diff < 0: st.info(f"📉 {weight_diff:.1f}kg ({prev_weight:.1f}→{weight:.1f}kg)")
-                                            else: st.write(f"📊 維持 {weight:.1f}kg")
-                                    if has_best_weight:
-                                        best_weight = pd.to_numeric(best_weight_response.data[0].get('weight'), errors='coerce')
-                                        if pd.notna(best_weight) and weight > best_weight:
-                                            st.balloons()
-                                            st.success(f"🏆 **自己ベスト更新！** ({best_weight:.1f}→{weight:.1f}kg)")
-                                    elif not has_previous:
-                                         st.info(f"🚀 初記録: {weight:.1f}kg")
-
-                                with col2:
-                                    st.write("**回数**")
-                                    if has_previous:
-                                        prev_reps = pd.to_numeric(previous_response.data[0].get('reps'), errors='coerce')
-                                        if pd.notna(prev_reps):
-                                            reps_diff = reps - prev_reps
-                                            if reps_diff > 0: st.success(f"💪 +{int(reps_diff)}回 ({int(prev_reps)}→{int(reps)}回)")
-                                            elif reps_diff < 0: st.info(f"📉 {int(reps_diff)}回 ({int(prev_reps)}→{int(reps)}回)")
-                                            else: st.write(f"📊 維持 {int(reps)}回")
-                                    if has_best_reps:
-                                        best_reps = pd.to_numeric(best_reps_response.data[0].get('reps'), errors='coerce')
-                                        if pd.notna(best_reps) and reps > best_reps:
-                                             st.balloons()
-                                             st.success(f"🏆 **自己ベスト更新！** ({int(best_reps)}→{int(reps)}回)")
-                                    elif not has_previous:
-                                         st.info(f"🚀 初記録: {int(reps)}回")
-                                # st.divider() # dividerは不要かも
+                    # 記録ストアの差分同期と自己ベストの取得は互いに独立なので同時に行う
+                    # （自己ベストは今日の種目が分かる前に、ユーザーの全種目分を主キー範囲で取得する）
+                    store = get_record_store(supabase, st.session_state.user_id, sync=False)
+                    with ConcurrentQueries() as feedback_queries:
+                        feedback_queries.submit("sync", store.sync, supabase, timeout=store.sync_timeout)
+                        feedback_queries.submit("personal_records", fetch_personal_records,
+                                                supabase, st.session_state.user_id)
+                        feedback_queries.result("sync")
+                        today_df = store.on_date(today)
+
+                        if not today_df.empty:
+                            today_records = today_df.to_dict('records')
+                            st.success(f"今日は{len(today_records)}種目のトレーニングを記録しました！")
+
+                            # 全種目の前回記録を記録ストア上でまとめて集計
+                            today_exercises = today_df['exercise_name'].unique()
+                            baselines = summarize_history(store.history_for(today_exercises, today), today)
+                            # 自己ベストは personal_records の主キー参照で置き換える
+                            # （テーブル未作成の環境では記録ストア上の集計値をそのまま使う）
+                            personal_records = {}
+                            try:
+                                personal_records = feedback_queries.result("personal_records")
+                            except Exception as pr_e:
+                                if not is_missing_relation(pr_e):
+                                    st.warning(f"自己ベストの取得エラー（記録から集計した自己ベストを表示します）: {pr_e}")
+                            apply_personal_records(baselines, {
+                                name: personal_records[name] for name in today_exercises if name in personal_records
+                            }, today)
+
+                            show_feedback(today_records, baselines)
 
-                    else:
-                        st.warning("今日のトレーニング記録が見つかりません。「トレーニング記録の入力」から今日のトレーニングを記録してください。")
+                        else:
+                            st.warning("今日のトレーニング記録が見つかりません。「トレーニング記録の入力」から今日のトレーニングを記録してください。")
                 else:
                      st.warning("ユーザー情報が見つかりません。")
 
             # 最新トレーニング日表示
             try:
                  if not st.session_state.is_guest and st.session_state.user_id:
-                     latest_response = supabase.table('training_records')\
-                         .select('training_date').eq('user_id', st.session_state.user_id)\
-                         .order('training_date', desc=True).limit(1).execute()
-                     if latest_response.data and len(latest_response.data) > 0:
-                         latest_date_str = latest_response.data[0].get('training_date')
-                         if latest_date_str:
-                             latest_date = datetime.fromisoformat(latest_date_str).date()
-                             st.caption(f"最新の記録日: {latest_date.strftime('%Y-%m-%d')}") # captionに変更
+                     # 差分同期はボタン押下時に済んでいるため、ここでは同期しない（問い合わせなし）
+                     latest_date = get_record_store(supabase, st.session_state.user_id, sync=False).latest_date()
+                     if latest_date:
+                         st.caption(f"最新の記録日: {latest_date.strftime('%Y-%m-%d')}") # captionに変更
             except Exception as latest_e:
                  st.warning(f"最新記録日の取得エラー: {latest_e}")
 
         except Exception as e:
             st.error(f"フィードバック表示機能で予期せぬエラーが発生しました: {str(e)}")
     else:
-        st.error("データベースに接続できません。設定を確認してください。")
\ No newline at end of file
+        st.error("データベースに接続できません。設定を確認してください。")
+
+
+# --- ランキング（参加コードごとのユーザー間比較）機能 ---
+elif selected_function == "ランキング":
+    st.header("ランキング 🏆")
+    if st.session_state.is_guest or LOCAL_DB_PATH:
+        st.info("ランキングはログインしたユーザー同士で、同じ参加コードを入力した人と記録を比べる機能です"
+                "（ゲストモード・ローカルモードでは利用できません）。")
+    elif db_connected() and st.session_state.user_id:
+        try:
+            user_id = st.session_state.user_id
+            # 参加中の参加コードと種目リストは互いに独立なので同時に取得する
+            with ConcurrentQueries() as ranking_queries:
+                ranking_queries.submit("cohorts", fetch_my_cohorts, supabase, user_id)
+                ranking_queries.submit("exercises", get_exercise_catalog().get, supabase, user_id)
+                # 取得に失敗した場合（テーブル未作成など）は下の例外処理で表示する
+                cohorts = ranking_queries.result("cohorts")
+
+                with st.expander("参加コードへの参加・退出", expanded=not cohorts):
+                    with st.form("join_cohort_form"):
+                        cohort_code = st.text_input("参加コード", placeholder="例: gym-shibuya",
+                                                    help="同じコードを入力したユーザー同士でランキングを比べます。")
+                        display_name = st.text_input("表示名", placeholder="ランキングに表示される名前")
+                        if st.form_submit_button("参加する"):
+                            try:
+                                joined = join_cohort(supabase, user_id, cohort_code, display_name)
+                                get_leaderboard_cache().invalidate(joined)
+                                st.success(f"参加コード「{joined}」に参加しました。")
+                                st.rerun()
+                            except CohortError as join_e:
+                                st.error(str(join_e))
+                            except Exception as join_e:
+                                st.error(f"参加に失敗しました: {join_e}")
+                    if cohorts:
+                        leaving = st.selectbox("退出する参加コード", options=list(cohorts))
+                        if st.button("退出する"):
+                            try:
+                                leave_cohort(supabase, user_id, leaving)
+                                get_leaderboard_cache().invalidate(leaving)
+                                st.rerun()
+                            except Exception as leave_e:
+                                st.error(f"退出に失敗しました: {leave_e}")
+
+                try:
+                    ranking_exercises = ranking_queries.result("exercises")
+                except Exception as ex_e:
+                    st.warning(f"種目リストの取得に失敗しました: {ex_e}")
+                    ranking_exercises = []
+
+                if not cohorts:
+                    st.info("参加コードを入力して参加すると、同じコードの参加者とのランキングが表示されます。")
+                elif not ranking_exercises:
+                    st.info("まだトレーニング記録がありません。「トレーニング記録の入力」から記録を追加してください。")
+                else:
+                    col1, col2, col3, col4 = st.columns(4)
+                    with col1:
+                        cohort = st.selectbox("参加コード", options=list(cohorts))
+                    with col2:
+                        ranking_exercise = st.selectbox("種目", options=ranking_exercises)
+                    with col3:
+                        metric_label = st.selectbox("指標", list(LEADERBOARD_METRICS))
+                        metric = LEADERBOARD_METRICS[metric_label]
+                    with col4:
+                        weeks = {f"{d:%Y-%m-%d} の週": d for d in recent_weeks(datetime.now().date())}
+                        week = weeks[st.selectbox("週", list(weeks))]
+
+                    # 上位N件（参加者で共有）と自分の順位を同時に取得する
+                    cache = get_leaderboard_cache()
+                    with ConcurrentQueries() as board_queries:
+                        board_queries.submit("leaderboard", cache.leaderboard, supabase, cohort, ranking_exercise, week, metric)
+                        board_queries.submit("position", cache.position, supabase, cohort, ranking_exercise, week, metric,
+                                             user_id)
+                        position = board_queries.result("position")
+                        rows = mark_self(board_queries.result("leaderboard"), position, cohorts[cohort])
+
+                        if position.get("rank") is not None:
+                            st.metric(f"あなたの順位（{metric_label}: {float(position['value']):g}）",
+                                      f"{position['members']}人中 {position['rank']}位")
+                        else:
+                            st.info("この週の記録がないため、順位はありません。")
+
+                        if rows:
+                            board_df = pd.DataFrame(rows)
+                            board_df['display_name'] = board_df['display_name'].where(~board_df['is_self'],
+                                                                                      board_df['display_name'] + "（あなた）")
+                            board_df['value'] = pd.to_numeric(board_df['value'])
+                            st.dataframe(
+                                board_df[['rank', 'display_name', 'value', 'training_days']].rename(columns={
+                                    'rank': '順位', 'display_name': '表示名', 'value': metric_label,
+                                    'training_days': 'トレーニング日数',
+                                }),
+                                hide_index=True, use_container_width=True,
+                            )
+                        else:
+                            st.info("この週にこの種目を記録した参加者はいません。")
+                        st.caption("ランキングは定期的に集計されるため、保存した記録が反映されるまで時間がかかることがあります。")
+        except Exception as e:
+            st.error(f"ランキングの表示中にエラーが発生しました（migrations/0007_weekly_rollups.sql が"
+                     f"適用されているか確認してください）: {str(e)}")
+    elif not db_connected():
+        st.error("データベースに接続できません。設定を確認してください。")
+    else:
+        st.warning("ユーザー情報が見つかりません。")
+
+# --- DB接続状態（このページで接続テストを行った場合、またはクライアントの初期化に失敗した場合） ---
+if _db_status is not None or supabase is None:
+    db_ok, db_error_message = _db_status if _db_status is not None else (False, supabase_error_message)
+    with db_status_placeholder.container():
+        if db_ok:
+            st.success("✅ データベース接続: OK")
+        else:
+            st.error("❌ データベース接続: エラー")
+            if db_error_message:
+                 st.caption(f"エラー詳細: {db_error_message}")
+
+# --- 起動時間の計測結果（STARTUP_PROFILE=1 のときのみ） ---
+if STARTUP_PROFILE_ENABLED:
+    profile_rows, profile_total = report()
+    with st.sidebar.expander("起動時間の計測"):
+        st.caption(f"今回のスクリプト実行: {profile_total * 1000:.1f} ms")
+        st.dataframe(pd.DataFrame(profile_rows), hide_index=True, use_container_width=True)
+
+
+# --- Supabase / YouTube 呼び出しの計測結果（QUERY_METRICS=1 のときのみ） ---
+if QUERY_METRICS_ENABLED:
+    query_rows, query_summary = query_report()
+    with st.sidebar.expander("問い合わせの計測"):
+        st.caption(f"{query_summary['page']}: {query_summary['calls']} 回 / {query_summary['rows']} 行 / "
+                   f"{query_summary['bytes'] / 1024:.1f} KB / {query_summary['ms']:.1f} ms")
+        figure_stats = get_figure_cache().stats()
+        st.caption(f"グラフのキャッシュ: ヒット {figure_stats['hits']} / ミス {figure_stats['misses']} / "
+                   f"破棄 {figure_stats['evictions']}（{figure_stats['entries']} 件 / "
+                   f"{figure_stats['bytes'] / 1024:.0f} KB）")
+        if query_rows:
+            # 同じ形状の問い合わせが複数回あればN+1の疑いがあるため、回数の多い順に並べる
+            st.dataframe(
+                pd.DataFrame(query_rows).drop(columns=['page'])
+                .sort_values(['same_shape', 'ms'], ascending=False, kind='stable'),
+                hide_index=True, use_container_width=True,
+            )
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+# --- CSV/JSONからのトレーニング記録の一括インポート ---
+# アップロードされたファイルを1行ずつ読み、入力フォームと同じ規則で検証した行を
+# chunk_size 件ずつまとめて upsert する（ファイル全体をDataFrameなどに展開しない）。
+# 各行には自然キー import_key を付け、(user_id, import_key) の一意制約と
+# ignore_duplicates により、同じファイルを再インポートしても重複しないようにする。
+# 種目名は exercise_names で正規の表記に寄せてから登録する（import_key はファイルの表記から作る）。
+import codecs
+import csv
+import hashlib
+import io
+import json
+import os
+import unicodedata
+from datetime import date, datetime
+
+from exercise_names import name_index
+
+DEFAULT_CHUNK_SIZE = int(os.environ.get("IMPORT_CHUNK_SIZE", "500"))
+CHUNK_SIZE_OPTIONS = [100, 500, 1000, 2000]
+MAX_WEIGHT = 999.99  # training_records.weight は DECIMAL(5,2)
+JSON_READ_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 100
+
+# 列名の別名（他のトラッカーの書き出し形式や日本語の見出しを受け付ける）
+COLUMN_ALIASES = {
+    "training_date": ("training_date", "date", "日付", "トレーニング日"),
+    "exercise_name": ("exercise_name", "exercise", "種目", "種目名"),
+    "weight": ("weight", "weight_kg", "重量", "重量 (kg)"),
+    "reps": ("reps", "回数", "回数 (reps)"),
+    "sets": ("sets", "セット数", "セット数 (sets)"),
+    "notes": ("notes", "note", "memo", "メモ"),
+}
+_ALIAS_LOOKUP = {alias.lower(): column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+
+class ImportRowError(ValueError):
+    """検証に失敗した行（line は元ファイルの行番号、JSONでは要素の番号）"""
+
+    def __init__(self, line, message):
+        super().__init__(f"{line}行目: {message}")
+        self.line = line
+        self.message = message
+
+
+# --- ファイルの逐次読み込み ---
+def iter_csv_rows(binary_file):
+    """(行番号, 列名を正規化した辞書) を1行ずつ返す（UTF-8/BOM付きUTF-8）"""
+    text = io.TextIOWrapper(binary_file, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, _canonical_keys(row)
+    finally:
+        text.detach()  # アップロードされたファイル自体は閉じない
+
+
+def iter_json_rows(binary_file):
+    """JSON配列またはJSON Lines（1行1オブジェクト）を1要素ずつ返す"""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    position = 0
+    number = 0
+    eof = False
+    while True:
+        # 空白と配列の括弧・区切りを読み飛ばす
+        while position < len(buffer) and (buffer[position].isspace() or buffer[position] in ",[]"):
+            position += 1
+        try:
+            value, end = decoder.raw_decode(buffer, position)
+        except ValueError:
+            # 要素が読み込み済みの範囲で完結していなければ続きを読む
+            if eof:
+                if position < len(buffer):
+                    raise ImportRowError(number + 1, "JSONとして読み込めません。")
+                return
+            chunk = binary_file.read(JSON_READ_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + text_decoder.decode(chunk, final=eof)
+            position = 0
+            continue
+        number += 1
+        position = end
+        if not isinstance(value, dict):
+            raise ImportRowError(number, "各要素は列名をキーとするオブジェクトにしてください。")
+        yield number, _canonical_keys(value)
+
+
+def iter_file_rows(uploaded_file):
+    """拡張子に応じてCSVまたはJSONとして読み込む"""
+    uploaded_file.seek(0)
+    name = (getattr(uploaded_file, "name", "") or "").lower()
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return iter_json_rows(uploaded_file)
+    return iter_csv_rows(uploaded_file)
+
+
+def estimate_row_count(uploaded_file):
+    """進捗表示用の行数の目安（CSVは改行数から見出し行を除いた数、JSONは不明としてNone）"""
+    name = (getattr(uploaded_file, "name", "") or "").lower()
+    if name.endswith((".json", ".jsonl", ".ndjson")):
+        return None
+    lines = 0
+    for block in iter(lambda: uploaded_file.read(JSON_READ_SIZE), b""):
+        lines += block.count(b"\n")
+    uploaded_file.seek(0)
+    return max(lines - 1, 0) or None
+
+
+def _canonical_keys(row):
+    record = {}
+    for key, value in row.items():
+        column = _ALIAS_LOOKUP.get(str(key or "").strip().lower())
+        if column and column not in record:
+            record[column] = value
+    return record
+
+
+# --- 検証（入力フォームと同じ規則） ---
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    text = str(value or "").strip()
+    for fmt in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d"):
+        try:
+            return datetime.strptime(text[:10], fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"日付を解釈できません: {text!r}")
+
+
+def _parse_int(value, label):
+    try:
+        number = float(str(value).strip())
+    except ValueError:
+        raise ValueError(f"{label}が数値ではありません: {value!r}") from None
+    if not number.is_integer():
+        raise ValueError(f"{label}は整数で入力してください: {value!r}")
+    return int(number)
+
+
+def validate_row(line, row, today):
+    """インポート用の行を検証し、training_records に挿入する辞書を返す"""
+    try:
+        training_date = _parse_date(row.get("training_date"))
+        if training_date > today:
+            raise ValueError("未来の日付は登録できません。")
+        exercise_name = unicodedata.normalize("NFKC", str(row.get("exercise_name") or "")).strip()
+        if not exercise_name:
+            raise ValueError("種目名がありません。")
+        try:
+            weight = round(float(str(row.get("weight")).strip()), 2)
+        except ValueError:
+            raise ValueError(f"重量が数値ではありません: {row.get('weight')!r}") from None
+        if not 0 <= weight <= MAX_WEIGHT:
+            raise ValueError(f"重量は0〜{MAX_WEIGHT}kgで入力してください。")
+        reps = _parse_int(row.get("reps"), "回数")
+        sets = _parse_int(row.get("sets"), "セット数")
+        if reps < 1 or sets < 1:
+            raise ValueError("回数・セット数は1以上で入力してください。")
+    except ValueError as e:
+        raise ImportRowError(line, str(e)) from None
+    notes = row.get("notes")
+    return {
+        "training_date": training_date.isoformat(),
+        "exercise_name": exercise_name,
+        "weight": weight,
+        "reps": reps,
+        "sets": sets,
+        "notes": "" if notes is None else str(notes),
+    }
+
+
+def natural_key(record, occurrence):
+    """記録内容とファイル内での出現回数から import_key を作る
+    （同じ内容の行が1ファイルに複数あっても、2件目以降を別の記録として扱う）"""
+    source = "\x1f".join([record["training_date"], record["exercise_name"], f"{record['weight']:.2f}",
+                          str(record["reps"]), str(record["sets"]), record["notes"], str(occurrence)])
+    return hashlib.sha1(source.encode("utf-8")).hexdigest()
+
+
+# --- 一括登録 ---
+def import_records(client, user_id, rows, chunk_size=DEFAULT_CHUNK_SIZE, today=None, on_progress=None,
+                   known_names=()):
+    """(行番号, 行) の反復から記録をチャンク単位で登録する。
+
+    集計結果の辞書（read / inserted / duplicates / invalid / errors / exercises）を返す。
+    errors には検証エラーを先頭から MAX_REPORTED_ERRORS 件まで、exercises には新たに登録された
+    種目名を残す。on_progress には処理した行数が渡される。known_names はユーザーの既存の種目名
+    （表記ゆれをそれらに寄せる）。"""
+    today = today or date.today()
+    names = name_index(known_names)
+    summary = {"read": 0, "inserted": 0, "duplicates": 0, "invalid": 0, "errors": [], "exercises": set()}
+    occurrences = {}  # 記録内容のハッシュ -> 出現回数（行の内容自体は保持しない）
+    chunk = []
+
+    def flush():
+        response = client.table("training_records")\
+            .upsert(chunk, ignore_duplicates=True, on_conflict="user_id,import_key")\
+            .execute()
+        saved = response.data or []
+        summary["inserted"] += len(saved)
+        summary["duplicates"] += len(chunk) - len(saved)
+        summary["exercises"].update(row["exercise_name"] for row in saved)
+        chunk.clear()
+
+    for line, row in rows:
+        summary["read"] += 1
+        try:
+            record = validate_row(line, row, today)
+        except ImportRowError as e:
+            summary["invalid"] += 1
+            if len(summary["errors"]) < MAX_REPORTED_ERRORS:
+                summary["errors"].append(e)
+        else:
+            content_key = natural_key(record, 0)
+            occurrence = occurrences.get(content_key, 0)
+            occurrences[content_key] = occurrence + 1
+            record["import_key"] = content_key if occurrence == 0 else natural_key(record, occurrence)
+            # import_key はファイルの表記のまま作る（正規化の規則が変わっても再インポートで重複しない）
+            record["exercise_name"] = names.canonicalize(record["exercise_name"])
+            record["user_id"] = user_id
+            chunk.append(record)
+            if len(chunk) >= chunk_size:
+                flush()
+        if on_progress:
+            on_progress(1)
+    if chunk:
+        flush()
+    return summary
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# --- グラフ表示用の系列集計・間引き ---
+# 描画前に記録を日/週/月単位へ集計し、さらに点数が上限を超える場合は
+# LTTB (Largest-Triangle-Three-Buckets) で間引いてブラウザへ送るデータ量を抑える。
+import numpy as np
+import pandas as pd
+
+from analytics import add_e1rm
+
+# ブラウザへ送る最大点数
+MAX_CHART_POINTS = 500
+
+# 集計単位 -> pandasの頻度文字列（Noneは記録ごと＝集計なし）
+AGGREGATION_LEVELS = {
+    "トレーニング日ごと": "D",
+    "週ごと": "W-MON",
+    "月ごと": "MS",
+    "記録ごと": None,
+}
+
+# 指標ごとの集計方法（重量・回数・推定1RMは最大値、ボリュームは合計）
+METRIC_AGGREGATIONS = {"weight": "max", "reps": "max", "volume": "sum", "e1rm": "max"}
+
+
+def add_volume(df):
+    # セット単位で記録した行は保存済みの volume（Σ重量×回数）を使い、それ以外は重量×回数×セット数
+    volume = df['weight'] * df['reps'] * df['sets']
+    if 'volume' in df.columns:
+        volume = pd.to_numeric(df['volume'], errors='coerce').fillna(volume)
+    return df.assign(volume=volume)
+
+
+def aggregate_series(df, metric, level):
+    """training_date と metric の2列に集計した系列を返す"""
+    series = df[['training_date', metric]].dropna()
+    freq = AGGREGATION_LEVELS.get(level)
+    if freq is None:
+        return series.sort_values('training_date', kind='stable').reset_index(drop=True)
+    grouped = series.groupby(pd.Grouper(key='training_date', freq=freq, label='left', closed='left'))
+    # 記録の無い期間（空のビン）は描画しない
+    return grouped[metric].agg(METRIC_AGGREGATIONS[metric]).where(grouped[metric].count() > 0)\
+        .dropna().reset_index()
+
+
+def lttb_indices(x, y, threshold):
+    """LTTBで残す点のインデックスを返す（先頭・末尾・最大値の点は必ず残す）"""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # 先頭と末尾を除いた点を threshold-2 個のバケットに分割
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        avg_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+        # 直前に選んだ点・次バケットの平均点と作る三角形の面積が最大の点を選ぶ
+        areas = np.abs((x[prev] - avg_x) * (y[start:end] - y[prev])
+                       - (x[prev] - x[start:end]) * (avg_y - y[prev]))
+        prev = start + int(np.argmax(areas))
+        selected[i + 1] = prev
+    peak = int(np.nanargmax(y))
+    if peak not in selected:
+        selected = np.sort(np.append(selected, peak))
+    return selected
+
+
+def downsample_series(series, metric, max_points=MAX_CHART_POINTS):
+    """系列が max_points を超える場合のみLTTBで間引く"""
+    if len(series) <= max_points:
+        return series
+    x = series['training_date'].to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    return series.iloc[lttb_indices(x, series[metric].to_numpy(), max_points)].reset_index(drop=True)
+
+
+def prepare_series(df, metric, level, max_points=MAX_CHART_POINTS):
+    """集計→間引きの順に、描画用の系列を作る"""
+    if metric == 'volume':
+        df = add_volume(df)
+    elif metric == 'e1rm':
+        df = add_e1rm(df)
+    return downsample_series(aggregate_series(df, metric, level), metric, max_points)
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# --- 1回の再実行内で互いに独立した読み取りを同時に実行する ---
+# 同期版のSupabaseクライアント（httpx.Client はスレッドセーフ）をプロセス共有のスレッドプールで呼び出す。
+# ページは独立した読み取りをまとめて submit() し、result() で1件ずつ受け取る。
+# 待ち時間は合計ではなく最も遅い1件分になる。
+# 各タスクには期限があり、期限を過ぎたものは結果を待たずに QueryTimeoutError とする
+# （開始前のタスクは取り消す。実行中のHTTPリクエストは中断できないため、結果を破棄するだけ）。
+# 期限に math.inf を渡したタスクは完了まで待つ（件数に比例して時間のかかる初回の全件取得など）。
+# タスク内では st.* を呼ばないこと（スクリプト実行のスレッド以外からは使えない）。
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+
+from instrumentation import bind_context, current_context
+
+QUERY_WORKERS = int(os.environ.get("QUERY_WORKERS", "8"))
+QUERY_TIMEOUT_SECONDS = float(os.environ.get("QUERY_TIMEOUT_SECONDS", "10"))
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    # 全セッションで1つのプールを共有する（初回の利用時に作成）
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=QUERY_WORKERS, thread_name_prefix="query")
+        return _executor
+
+
+class QueryTimeoutError(TimeoutError):
+    def __init__(self, name, timeout):
+        super().__init__(f"{name} の取得が {timeout:g} 秒以内に完了しませんでした")
+        self.name = name
+        self.timeout = timeout
+
+
+class ConcurrentQueries:
+    """with ブロックを抜けると、受け取らなかった未完了のタスクを取り消す"""
+
+    def __init__(self, timeout=QUERY_TIMEOUT_SECONDS, executor=None):
+        self.timeout = timeout
+        self.executor = executor or get_executor()
+        self._tasks = {}  # 名前 -> (Future, 期限, タイムアウト秒)
+
+    def submit(self, name, func, *args, timeout=None, **kwargs):
+        """func(*args, **kwargs) の実行を開始する。timeout は省略時はバッチ全体の既定値"""
+        timeout = self.timeout if timeout is None else timeout
+        context = current_context()
+
+        def run():
+            # 問い合わせの計測が呼び出し元の再実行の記録に入るよう、計測の状態を引き継ぐ
+            bind_context(context)
+            return func(*args, **kwargs)
+        self._tasks[name] = (self.executor.submit(run), time.monotonic() + timeout, timeout)
+        return self
+
+    def result(self, name):
+        """タスクの戻り値を返す（タスク内の例外や QueryTimeoutError はここで送出する）"""
+        future, deadline, timeout = self._tasks[name]
+        remaining = deadline - time.monotonic()
+        try:
+            return future.result(timeout=None if math.isinf(remaining) else max(0.0, remaining))
+        except FuturesTimeoutError:
+            future.cancel()
+            raise QueryTimeoutError(name, timeout) from None
+
+    def cancel(self):
+        for future, _, _ in self._tasks.values():
+            future.cancel()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cancel()
+        return False
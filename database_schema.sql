@@ -1,3 +1,17 @@
+-- 新規セットアップ用の現在のスキーマ一式。
+-- 既存のデータベースを更新する場合は migrations/ を番号順に適用する（scripts/migrate.py）。
+
+-- ワークアウトセッション: 1回のトレーニング（詳細は migrations/0006）
+CREATE TABLE workout_sessions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL,
+    training_date DATE NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX idx_workout_sessions_user_date ON workout_sessions (user_id, training_date DESC);
+
 -- トレーニング記録テーブル
 CREATE TABLE training_records (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -8,6 +22,10 @@ CREATE TABLE training_records (
     reps INTEGER NOT NULL,
     sets INTEGER NOT NULL,
     notes TEXT,
+    import_key TEXT,  -- 一括インポート時の自然キー（画面から保存した記録はNULL）
+    session_id UUID REFERENCES workout_sessions (id) ON DELETE CASCADE,
+    volume DECIMAL(12,2),  -- セット単位で記録した場合の Σ重量×回数（NULLなら weight × reps × sets）
+    e1rm DECIMAL(7,2),  -- セット単位で記録した場合のセットごとの推定1RMの最大値
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
@@ -20,6 +38,466 @@ CREATE TABLE training_records (
 --     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 -- );
 
--- インデックスの作成
-CREATE INDEX idx_training_records_date ON training_records(training_date);
-CREATE INDEX idx_training_records_exercise ON training_records(exercise_name);  
\ No newline at end of file
+-- インデックスの作成（app.py の問い合わせ形状に合わせた複合インデックス。詳細は migrations/0003）
+CREATE INDEX idx_training_records_user_exercise_date ON training_records (user_id, exercise_name, training_date DESC);
+CREATE INDEX idx_training_records_user_date ON training_records (user_id, training_date DESC, id DESC);
+CREATE INDEX idx_training_records_user_exercise_weight ON training_records (user_id, exercise_name, weight DESC) INCLUDE (training_date);
+CREATE INDEX idx_training_records_user_exercise_reps ON training_records (user_id, exercise_name, reps DESC) INCLUDE (training_date);
+CREATE INDEX idx_training_records_user_updated ON training_records (user_id, updated_at, id); 
+-- 一括インポートの再実行で重複しないよう、インポート元の自然キーをユーザー単位で一意にする
+CREATE UNIQUE INDEX idx_training_records_user_import_key ON training_records (user_id, import_key);
+CREATE INDEX idx_training_records_session ON training_records (session_id);
+
+-- セット: セッション内の1セット。record_id は種目ごとの集計行（training_records）
+CREATE TABLE workout_sets (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    session_id UUID NOT NULL REFERENCES workout_sessions (id) ON DELETE CASCADE,
+    record_id UUID NOT NULL REFERENCES training_records (id) ON DELETE CASCADE,  -- 種目ごとの集計行
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    set_number INTEGER NOT NULL,
+    weight DECIMAL(5,2) NOT NULL,
+    reps INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (record_id, set_number)
+);
+CREATE INDEX idx_workout_sets_session ON workout_sets (session_id);
+CREATE INDEX idx_workout_sets_user_exercise ON workout_sets (user_id, exercise_name);
+
+-- 成長フィードバック用: 種目ごとの前回記録と自己ベスト（当日分を除く）を一括取得
+CREATE OR REPLACE FUNCTION feedback_baselines(p_user_id UUID, p_exercises TEXT[], p_today DATE)
+RETURNS TABLE (
+    exercise_name TEXT,
+    prev_date DATE,
+    prev_weight DECIMAL(5,2),
+    prev_reps INTEGER,
+    best_weight DECIMAL(5,2),
+    best_reps INTEGER
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.name, prev.training_date, prev.weight, prev.reps, best.best_weight, best.best_reps
+    FROM unnest(p_exercises) AS e(name)
+    LEFT JOIN LATERAL (
+        SELECT r.training_date, r.weight, r.reps
+        FROM training_records r
+        WHERE r.user_id = p_user_id AND r.exercise_name = e.name AND r.training_date < p_today
+        ORDER BY r.training_date DESC
+        LIMIT 1
+    ) prev ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT MAX(r.weight) AS best_weight, MAX(r.reps) AS best_reps
+        FROM training_records r
+        WHERE r.user_id = p_user_id AND r.exercise_name = e.name AND r.training_date <> p_today
+    ) best ON TRUE;
+$$;
+
+-- セッションを1回の呼び出しで保存する（セッション・種目ごとの集計行・セットを1トランザクションで挿入）
+-- p_sets は [{"exercise_name": ..., "weight": ..., "reps": ...}, ...]（配列の順がセットの順）。
+-- p_session_id はクライアントで生成したUUIDで、同じIDで再送した場合は保存済みの集計行を返す。
+CREATE OR REPLACE FUNCTION save_workout_session(
+    p_session_id UUID, p_user_id UUID, p_training_date DATE, p_notes TEXT, p_sets JSONB
+)
+RETURNS SETOF training_records
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO workout_sessions (id, user_id, training_date, notes)
+    VALUES (p_session_id, p_user_id, p_training_date, p_notes)
+    ON CONFLICT (id) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT * FROM training_records WHERE session_id = p_session_id AND user_id = p_user_id;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    WITH entered AS (
+        SELECT s.exercise_name, s.weight, s.reps, s.position
+        FROM ROWS FROM (jsonb_to_recordset(p_sets) AS (exercise_name TEXT, weight DECIMAL(5,2), reps INTEGER))
+             WITH ORDINALITY AS s(exercise_name, weight, reps, position)
+    ), inserted AS (
+        INSERT INTO training_records (user_id, training_date, exercise_name, weight, reps, sets, notes,
+                                      session_id, volume, e1rm)
+        SELECT p_user_id, p_training_date, i.exercise_name,
+               MAX(i.weight), (ARRAY_AGG(i.reps ORDER BY i.weight DESC, i.reps DESC))[1], COUNT(*), p_notes,
+               p_session_id, SUM(i.weight * i.reps), MAX(ROUND(i.weight * (1 + i.reps / 30.0), 2))
+        FROM entered i
+        GROUP BY i.exercise_name
+        RETURNING *
+    ), inserted_sets AS (
+        INSERT INTO workout_sets (session_id, record_id, user_id, exercise_name, set_number, weight, reps)
+        SELECT p_session_id, r.id, p_user_id, i.exercise_name,
+               ROW_NUMBER() OVER (PARTITION BY i.exercise_name ORDER BY i.position), i.weight, i.reps
+        FROM entered i
+        JOIN inserted r ON r.exercise_name = i.exercise_name
+    )
+    SELECT * FROM inserted;
+END;
+$$;
+
+-- 種目カタログ: ユーザーごとの重複なし種目名（種目選択リスト用）
+CREATE VIEW user_exercise_catalog WITH (security_invoker = true) AS
+    SELECT DISTINCT user_id, exercise_name FROM training_records;
+
+-- 自己ベスト: training_records への書き込み時にトリガーで更新する（成長フィードバック用）
+-- 推定1RMはEpley式 weight × (1 + reps / 30)。
+CREATE TABLE personal_records (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    best_weight DECIMAL(5,2),
+    best_weight_date DATE,
+    prev_best_weight DECIMAL(5,2),
+    best_reps INTEGER,
+    best_reps_date DATE,
+    prev_best_reps INTEGER,
+    best_volume DECIMAL(12,2),
+    best_volume_date DATE,
+    prev_best_volume DECIMAL(12,2),
+    best_e1rm DECIMAL(7,2),
+    best_e1rm_date DATE,
+    prev_best_e1rm DECIMAL(7,2),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, exercise_name)
+);
+
+-- 指定ユーザー（NULLなら全ユーザー）・種目（NULLなら全種目）の自己ベストを履歴から再計算する
+CREATE OR REPLACE FUNCTION refresh_personal_records(p_user_id UUID DEFAULT NULL, p_exercise_name TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    DELETE FROM personal_records pr
+    WHERE (p_user_id IS NULL OR pr.user_id = p_user_id)
+      AND (p_exercise_name IS NULL OR pr.exercise_name = p_exercise_name);
+
+    INSERT INTO personal_records (
+        user_id, exercise_name,
+        best_weight, best_weight_date, prev_best_weight,
+        best_reps, best_reps_date, prev_best_reps,
+        best_volume, best_volume_date, prev_best_volume,
+        best_e1rm, best_e1rm_date, prev_best_e1rm
+    )
+    WITH daily AS (
+        SELECT r.user_id, r.exercise_name, r.training_date,
+               MAX(r.weight) AS weight,
+               MAX(r.reps) AS reps,
+               MAX(COALESCE(r.volume, r.weight * r.reps * r.sets)) AS volume,
+               MAX(COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2))) AS e1rm
+        FROM training_records r
+        WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+          AND (p_exercise_name IS NULL OR r.exercise_name = p_exercise_name)
+        GROUP BY r.user_id, r.exercise_name, r.training_date
+    ), running AS (
+        -- 各日について「その日より前の最高値」を求める
+        SELECT d.*,
+               MAX(d.weight) OVER earlier AS weight_before,
+               MAX(d.reps) OVER earlier AS reps_before,
+               MAX(d.volume) OVER earlier AS volume_before,
+               MAX(d.e1rm) OVER earlier AS e1rm_before
+        FROM daily d
+        WINDOW earlier AS (PARTITION BY d.user_id, d.exercise_name ORDER BY d.training_date
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+    )
+    SELECT user_id, exercise_name,
+           MAX(weight), (ARRAY_AGG(training_date ORDER BY weight DESC, training_date))[1],
+           (ARRAY_AGG(weight_before ORDER BY weight DESC, training_date))[1],
+           MAX(reps), (ARRAY_AGG(training_date ORDER BY reps DESC, training_date))[1],
+           (ARRAY_AGG(reps_before ORDER BY reps DESC, training_date))[1],
+           MAX(volume), (ARRAY_AGG(training_date ORDER BY volume DESC, training_date))[1],
+           (ARRAY_AGG(volume_before ORDER BY volume DESC, training_date))[1],
+           MAX(e1rm), (ARRAY_AGG(training_date ORDER BY e1rm DESC, training_date))[1],
+           (ARRAY_AGG(e1rm_before ORDER BY e1rm DESC, training_date))[1]
+    FROM running
+    GROUP BY user_id, exercise_name;
+
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+-- 1件の記録を自己ベストに反映する
+-- 通常（記録日が各最高値の記録日以降）は行単位の比較だけで更新し、
+-- 過去日付の追加のように「その日より前の最高値」が変わり得る場合のみ該当種目を再計算する。
+CREATE OR REPLACE FUNCTION apply_personal_record(r training_records)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    pr personal_records%ROWTYPE;
+    new_volume DECIMAL := COALESCE(r.volume, r.weight * r.reps * r.sets);
+    new_e1rm DECIMAL := COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2));  -- 保存時の精度で比較する
+BEGIN
+    SELECT * INTO pr FROM personal_records
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO personal_records (
+            user_id, exercise_name,
+            best_weight, best_weight_date, best_reps, best_reps_date,
+            best_volume, best_volume_date, best_e1rm, best_e1rm_date
+        ) VALUES (
+            r.user_id, r.exercise_name,
+            r.weight, r.training_date, r.reps, r.training_date,
+            new_volume, r.training_date, new_e1rm, r.training_date
+        )
+        ON CONFLICT (user_id, exercise_name) DO NOTHING;
+        IF NOT FOUND THEN
+            -- 同時に別の記録が最初の行を作成した場合
+            PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        END IF;
+        RETURN;
+    END IF;
+
+    IF r.training_date < GREATEST(pr.best_weight_date, pr.best_reps_date, pr.best_volume_date, pr.best_e1rm_date) THEN
+        PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        RETURN;
+    END IF;
+
+    UPDATE personal_records SET
+        prev_best_weight = CASE WHEN r.weight > best_weight AND r.training_date > best_weight_date
+                                THEN best_weight ELSE prev_best_weight END,
+        best_weight_date = CASE WHEN r.weight > best_weight THEN r.training_date ELSE best_weight_date END,
+        best_weight = GREATEST(best_weight, r.weight),
+        prev_best_reps = CASE WHEN r.reps > best_reps AND r.training_date > best_reps_date
+                              THEN best_reps ELSE prev_best_reps END,
+        best_reps_date = CASE WHEN r.reps > best_reps THEN r.training_date ELSE best_reps_date END,
+        best_reps = GREATEST(best_reps, r.reps),
+        prev_best_volume = CASE WHEN new_volume > best_volume AND r.training_date > best_volume_date
+                                THEN best_volume ELSE prev_best_volume END,
+        best_volume_date = CASE WHEN new_volume > best_volume THEN r.training_date ELSE best_volume_date END,
+        best_volume = GREATEST(best_volume, new_volume),
+        prev_best_e1rm = CASE WHEN new_e1rm > best_e1rm AND r.training_date > best_e1rm_date
+                              THEN best_e1rm ELSE prev_best_e1rm END,
+        best_e1rm_date = CASE WHEN new_e1rm > best_e1rm THEN r.training_date ELSE best_e1rm_date END,
+        best_e1rm = GREATEST(best_e1rm, new_e1rm),
+        updated_at = NOW()
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name;
+END;
+$$;
+
+-- 挿入文ごとに自己ベストを更新する
+-- 1種目1件（画面からの保存）は行単位の比較で更新し、一括インポートのように
+-- 同じ種目の行がまとめて追加された場合は種目ごとに1回だけ再計算する。
+CREATE OR REPLACE FUNCTION personal_records_after_insert_rows()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    target RECORD;
+BEGIN
+    FOR target IN
+        SELECT n.user_id, n.exercise_name, COUNT(*) AS row_count
+        FROM new_records n
+        GROUP BY n.user_id, n.exercise_name
+    LOOP
+        IF target.row_count = 1 THEN
+            PERFORM apply_personal_record(n::training_records) FROM new_records n
+            WHERE n.user_id = target.user_id AND n.exercise_name = target.exercise_name;
+        ELSE
+            PERFORM refresh_personal_records(target.user_id, target.exercise_name);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+-- 記録の修正・削除時は影響する種目を再計算する
+CREATE OR REPLACE FUNCTION personal_records_after_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM refresh_personal_records(OLD.user_id, OLD.exercise_name);
+    IF TG_OP = 'UPDATE' AND (NEW.user_id, NEW.exercise_name) IS DISTINCT FROM (OLD.user_id, OLD.exercise_name) THEN
+        PERFORM refresh_personal_records(NEW.user_id, NEW.exercise_name);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_personal_records_insert ON training_records;
+CREATE TRIGGER trg_personal_records_insert
+    AFTER INSERT ON training_records
+    REFERENCING NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION personal_records_after_insert_rows();
+
+DROP TRIGGER IF EXISTS trg_personal_records_change ON training_records;
+CREATE TRIGGER trg_personal_records_change
+    AFTER UPDATE OF user_id, exercise_name, training_date, weight, reps, sets, volume, e1rm OR DELETE ON training_records
+    FOR EACH ROW EXECUTE FUNCTION personal_records_after_change();
+
+-- 週次ロールアップ: ランキング・コホート比較用（詳細は migrations/0007）
+-- 書き込み時は集計し直す週を rollup_dirty_weeks に記録し、refresh_weekly_rollups() を定期実行して反映する。
+CREATE TABLE weekly_exercise_rollups (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    week_start DATE NOT NULL,
+    best_e1rm DECIMAL(7,2) NOT NULL,
+    total_volume DECIMAL(14,2) NOT NULL,
+    training_days INTEGER NOT NULL,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, exercise_name, week_start)
+);
+-- 上位N件の読み取り用（種目・週ごとに値の降順で並ぶ）。走査が LIMIT で止まるのは、この順に読みながら
+-- cohort_members を1行ずつ引く計画（その週の行に占める参加者の割合が高い参加コード）のときだけ。
+-- 参加者の少ない参加コードでは、種目・週の範囲の行をすべて読んで参加者と結合し、並べ替えてから LIMIT を適用する
+-- （読む行数はその種目・週の行数までで、履歴の長さには依存しない）。
+CREATE INDEX idx_weekly_rollups_e1rm ON weekly_exercise_rollups (exercise_name, week_start, best_e1rm DESC);
+CREATE INDEX idx_weekly_rollups_volume ON weekly_exercise_rollups (exercise_name, week_start, total_volume DESC);
+
+-- 集計し直す必要のある (ユーザー, 種目, 週)
+CREATE TABLE rollup_dirty_weeks (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    week_start DATE NOT NULL,
+    PRIMARY KEY (user_id, exercise_name, week_start)
+);
+
+CREATE TABLE cohort_members (
+    cohort TEXT NOT NULL,  -- 参加コード（同じコードを入力したユーザー同士で比較する）
+    user_id UUID NOT NULL,
+    display_name TEXT NOT NULL,  -- ランキングに表示する名前
+    joined_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (cohort, user_id)
+);
+CREATE INDEX idx_cohort_members_user ON cohort_members (user_id);
+
+-- 書き込みのあった週を記録する（文単位。変更前後の週の両方を対象にする）
+CREATE OR REPLACE FUNCTION mark_rollup_weeks_dirty()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_weeks (user_id, exercise_name, week_start)
+        SELECT DISTINCT n.user_id, n.exercise_name, date_trunc('week', n.training_date)::date FROM new_records n
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO rollup_dirty_weeks (user_id, exercise_name, week_start)
+        SELECT DISTINCT o.user_id, o.exercise_name, date_trunc('week', o.training_date)::date FROM old_records o
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_insert ON training_records;
+CREATE TRIGGER trg_rollup_weeks_insert
+    AFTER INSERT ON training_records
+    REFERENCING NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_update ON training_records;
+CREATE TRIGGER trg_rollup_weeks_update
+    AFTER UPDATE ON training_records
+    REFERENCING OLD TABLE AS old_records NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_delete ON training_records;
+CREATE TRIGGER trg_rollup_weeks_delete
+    AFTER DELETE ON training_records
+    REFERENCING OLD TABLE AS old_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+-- 記録のあった週だけを集計し直し、処理した (ユーザー, 種目, 週) の数を返す
+-- 実行中に追加された記録は rollup_dirty_weeks に残り、次回の実行で反映される。
+CREATE OR REPLACE FUNCTION refresh_weekly_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS refresh_rollup_keys (
+        user_id UUID, exercise_name TEXT, week_start DATE
+    ) ON COMMIT DROP;
+    TRUNCATE refresh_rollup_keys;
+
+    WITH taken AS (
+        DELETE FROM rollup_dirty_weeks RETURNING user_id, exercise_name, week_start
+    )
+    INSERT INTO refresh_rollup_keys SELECT * FROM taken;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    DELETE FROM weekly_exercise_rollups w
+    USING refresh_rollup_keys k
+    WHERE w.user_id = k.user_id AND w.exercise_name = k.exercise_name AND w.week_start = k.week_start;
+
+    -- 推定1RM・ボリュームはセット単位の値があればそれを使う（personal_records と同じ計算）
+    INSERT INTO weekly_exercise_rollups (user_id, exercise_name, week_start, best_e1rm, total_volume, training_days)
+    SELECT k.user_id, k.exercise_name, k.week_start,
+           MAX(COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2))),
+           SUM(COALESCE(r.volume, r.weight * r.reps * r.sets)),
+           COUNT(DISTINCT r.training_date)
+    FROM refresh_rollup_keys k
+    JOIN training_records r
+      ON r.user_id = k.user_id AND r.exercise_name = k.exercise_name
+     AND r.training_date >= k.week_start AND r.training_date < k.week_start + 7
+    GROUP BY k.user_id, k.exercise_name, k.week_start;
+
+    RETURN affected;
+END;
+$$;
+
+-- 参加コード・種目・週ごとの上位 p_limit 件（最大100件）。p_metric は 'e1rm' または 'volume'
+-- is_self は p_user_id の行か（他の参加者のユーザーIDは返さない）
+CREATE OR REPLACE FUNCTION cohort_leaderboard(
+    p_cohort TEXT, p_exercise TEXT, p_week_start DATE, p_metric TEXT DEFAULT 'e1rm',
+    p_user_id UUID DEFAULT NULL, p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (rank BIGINT, display_name TEXT, value DECIMAL, training_days INTEGER, is_self BOOLEAN)
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+    IF p_metric = 'volume' THEN
+        RETURN QUERY
+        SELECT RANK() OVER (ORDER BY w.total_volume DESC), m.display_name, w.total_volume, w.training_days,
+               COALESCE(w.user_id = p_user_id, FALSE)
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+        ORDER BY w.total_volume DESC
+        LIMIT LEAST(p_limit, 100);
+    ELSE
+        RETURN QUERY
+        SELECT RANK() OVER (ORDER BY w.best_e1rm DESC), m.display_name, w.best_e1rm, w.training_days,
+               COALESCE(w.user_id = p_user_id, FALSE)
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+        ORDER BY w.best_e1rm DESC
+        LIMIT LEAST(p_limit, 100);
+    END IF;
+END;
+$$;
+
+-- p_user_id の順位（自分より値の大きい参加者の数 + 1）と、その週にこの種目の記録がある参加者の数。
+-- その週の記録が無ければ value / rank は NULL。ランキングと同じ種目・週で絞った行を1回走査して数える。
+CREATE OR REPLACE FUNCTION cohort_position(
+    p_cohort TEXT, p_exercise TEXT, p_week_start DATE, p_metric TEXT, p_user_id UUID
+)
+RETURNS TABLE (rank BIGINT, members BIGINT, value DECIMAL)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    own DECIMAL;
+BEGIN
+    SELECT CASE WHEN p_metric = 'volume' THEN w.total_volume ELSE w.best_e1rm END INTO own
+    FROM weekly_exercise_rollups w
+    WHERE w.user_id = p_user_id AND w.exercise_name = p_exercise AND w.week_start = p_week_start;
+
+    RETURN QUERY
+    SELECT CASE WHEN own IS NULL THEN NULL ELSE COUNT(*) FILTER (WHERE scoped.value > own) + 1 END,
+           COUNT(*), own
+    FROM (
+        SELECT CASE WHEN p_metric = 'volume' THEN w.total_volume ELSE w.best_e1rm END AS value
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+    ) scoped;
+END;
+$$;
@@ -0,0 +1,110 @@
+-- ローカルのSQLiteバックエンド（local_backend.py）用のスキーマ。
+-- database_schema.sql と同じテーブル・列・インデックスをSQLiteの型で定義する。
+-- UUIDとタイムスタンプは文字列（ISO 8601）で保持する。
+-- personal_records はトリガーで保守する代わりに、履歴から都度集計するビューにする。
+PRAGMA journal_mode = WAL;
+
+CREATE TABLE IF NOT EXISTS workout_sessions (
+    id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    training_date TEXT NOT NULL,
+    notes TEXT,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date ON workout_sessions (user_id, training_date DESC);
+
+CREATE TABLE IF NOT EXISTS training_records (
+    -- uuid_generate_v4() の代わりにランダムなUUID（v4）を生成する
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4)) || '-' || hex(randomblob(2)) || '-4' ||
+        substr(hex(randomblob(2)), 2) || '-' || substr('89ab', 1 + abs(random()) % 4, 1) ||
+        substr(hex(randomblob(2)), 2) || '-' || hex(randomblob(6)))),
+    user_id TEXT NOT NULL,
+    training_date TEXT NOT NULL,
+    exercise_name TEXT NOT NULL,
+    weight REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    sets INTEGER NOT NULL,
+    notes TEXT,
+    import_key TEXT,
+    session_id TEXT REFERENCES workout_sessions (id) ON DELETE CASCADE,
+    volume REAL,
+    e1rm REAL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- INCLUDE 列はSQLiteに無いため、キーの末尾に含める
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_date ON training_records (user_id, exercise_name, training_date DESC);
+CREATE INDEX IF NOT EXISTS idx_training_records_user_date ON training_records (user_id, training_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_weight ON training_records (user_id, exercise_name, weight DESC, training_date);
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_reps ON training_records (user_id, exercise_name, reps DESC, training_date);
+CREATE INDEX IF NOT EXISTS idx_training_records_user_updated ON training_records (user_id, updated_at, id);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_training_records_user_import_key ON training_records (user_id, import_key);
+CREATE INDEX IF NOT EXISTS idx_training_records_session ON training_records (session_id);
+
+CREATE TABLE IF NOT EXISTS workout_sets (
+    id TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL REFERENCES workout_sessions (id) ON DELETE CASCADE,
+    record_id TEXT NOT NULL REFERENCES training_records (id) ON DELETE CASCADE,
+    user_id TEXT NOT NULL,
+    exercise_name TEXT NOT NULL,
+    set_number INTEGER NOT NULL,
+    weight REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    created_at TEXT DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    UNIQUE (record_id, set_number)
+);
+CREATE INDEX IF NOT EXISTS idx_workout_sets_session ON workout_sets (session_id);
+CREATE INDEX IF NOT EXISTS idx_workout_sets_user_exercise ON workout_sets (user_id, exercise_name);
+
+CREATE VIEW IF NOT EXISTS user_exercise_catalog AS
+    SELECT DISTINCT user_id, exercise_name FROM training_records;
+
+-- refresh_personal_records と同じ集計（最高値の日付が複数あれば最も古い日、prev_best_* はその日より前の最高値）
+CREATE VIEW IF NOT EXISTS personal_records AS
+    WITH daily AS (
+        SELECT user_id, exercise_name, training_date,
+               MAX(weight) AS weight,
+               MAX(reps) AS reps,
+               MAX(COALESCE(volume, weight * reps * sets)) AS volume,
+               MAX(COALESCE(e1rm, ROUND(weight * (1 + reps / 30.0), 2))) AS e1rm
+        FROM training_records
+        GROUP BY user_id, exercise_name, training_date
+    ), running AS (
+        SELECT d.*,
+               MAX(weight) OVER earlier AS weight_before,
+               MAX(reps) OVER earlier AS reps_before,
+               MAX(volume) OVER earlier AS volume_before,
+               MAX(e1rm) OVER earlier AS e1rm_before
+        FROM daily d
+        WINDOW earlier AS (PARTITION BY user_id, exercise_name ORDER BY training_date
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+    ), ranked AS (
+        SELECT user_id, exercise_name,
+               FIRST_VALUE(weight) OVER by_weight AS best_weight,
+               FIRST_VALUE(training_date) OVER by_weight AS best_weight_date,
+               FIRST_VALUE(weight_before) OVER by_weight AS prev_best_weight,
+               FIRST_VALUE(reps) OVER by_reps AS best_reps,
+               FIRST_VALUE(training_date) OVER by_reps AS best_reps_date,
+               FIRST_VALUE(reps_before) OVER by_reps AS prev_best_reps,
+               FIRST_VALUE(volume) OVER by_volume AS best_volume,
+               FIRST_VALUE(training_date) OVER by_volume AS best_volume_date,
+               FIRST_VALUE(volume_before) OVER by_volume AS prev_best_volume,
+               FIRST_VALUE(e1rm) OVER by_e1rm AS best_e1rm,
+               FIRST_VALUE(training_date) OVER by_e1rm AS best_e1rm_date,
+               FIRST_VALUE(e1rm_before) OVER by_e1rm AS prev_best_e1rm,
+               ROW_NUMBER() OVER (PARTITION BY user_id, exercise_name) AS position
+        FROM running
+        WINDOW by_weight AS (PARTITION BY user_id, exercise_name ORDER BY weight DESC, training_date),
+               by_reps AS (PARTITION BY user_id, exercise_name ORDER BY reps DESC, training_date),
+               by_volume AS (PARTITION BY user_id, exercise_name ORDER BY volume DESC, training_date),
+               by_e1rm AS (PARTITION BY user_id, exercise_name ORDER BY e1rm DESC, training_date)
+    )
+    SELECT user_id, exercise_name,
+           best_weight, best_weight_date, prev_best_weight,
+           best_reps, best_reps_date, prev_best_reps,
+           best_volume, best_volume_date, prev_best_volume,
+           best_e1rm, best_e1rm_date, prev_best_e1rm
+    FROM ranked
+    WHERE position = 1;
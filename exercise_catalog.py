@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# --- ユーザーごとの種目カタログ（重複なしの種目名一覧） ---
+# 種目選択のselectboxのために毎回全履歴の exercise_name を転送しないよう、
+# プロセス内でユーザー単位にキャッシュし、記録の保存時に差分で更新する。
+import threading
+import time
+
+import streamlit as st
+
+from query_compat import is_missing_relation, order_by, page_range
+from record_store import FETCH_PAGE_SIZE
+
+# キャッシュの有効期間（秒）。他端末からの追加もこの間隔で反映される
+CATALOG_TTL_SECONDS = 600
+
+
+def _fetch_all_pages(make_query, *columns):
+    """order_by(columns) で並べ、PostgRESTの上限件数ごとに全ページを取得する"""
+    rows = []
+    offset = 0
+    while True:
+        page = page_range(order_by(make_query(), *columns), offset, FETCH_PAGE_SIZE).execute().data or []
+        rows.extend(page)
+        if len(page) < FETCH_PAGE_SIZE:
+            return rows
+        offset += FETCH_PAGE_SIZE
+
+
+def fetch_distinct_exercises(client, user_id):
+    """DBから種目名の集合を取得する（DISTINCTビューが無ければ記録テーブルを走査）"""
+    try:
+        rows = _fetch_all_pages(
+            lambda: client.table('user_exercise_catalog').select('exercise_name').eq('user_id', user_id),
+            'exercise_name')
+    except Exception as e:
+        # ビュー未作成の環境だけ記録テーブルの走査にフォールバックする（通信・認証のエラーなどはそのまま送出）
+        # 記録の行数分を転送するため、長い履歴では遅い（migrations の user_exercise_catalog ビューの適用を推奨）
+        if not is_missing_relation(e):
+            raise
+        rows = _fetch_all_pages(
+            lambda: client.table('training_records').select('exercise_name').eq('user_id', user_id),
+            'exercise_name', 'id')
+    return {row['exercise_name'] for row in rows if row.get('exercise_name')}
+
+
+class ExerciseCatalog:
+    def __init__(self, ttl_seconds=CATALOG_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries = {}  # user_id -> (読み込み時刻, 種目名の集合)
+        self._lock = threading.Lock()
+
+    def get(self, client, user_id):
+        """種目名のソート済みリストを返す。期限切れ・未読み込みの場合のみDBに問い合わせる"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                return sorted(entry[1])
+        exercises = fetch_distinct_exercises(client, user_id)
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), exercises)
+        return sorted(exercises)
+
+    def add(self, user_id, exercise_name):
+        """保存した記録の種目名をキャッシュに追加する（新しい種目の場合のみ変化する）"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and exercise_name and exercise_name not in entry[1]:
+                entry[1].add(exercise_name)
+
+    def invalidate(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+@st.cache_resource
+def get_exercise_catalog():
+    # 全セッションで共有する（キャッシュはユーザーIDごとに分かれている）
+    return ExerciseCatalog()
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+# --- 種目名の正規化（表記ゆれの吸収と候補の提示） ---
+# 種目名は自由入力のため、「ベンチプレス」「ベンチ プレス」「bench press」が別の種目として
+# 保存されると、グラフ・自己ベスト・ランキングの系列が分かれてしまう。
+# 保存時は、表記の折りたたみ（NFKC・大文字小文字・ひらがな/カタカナ・空白や記号の除去）が
+# 標準種目の名前・別名、またはユーザーの既存の種目名と一致した場合だけその種目名に寄せ、
+# それ以外は入力をNFKC正規化した名前（新しい種目）のまま保存する。
+# 「デクラインベンチプレス」と「インクラインベンチプレス」のように文字の似た別の種目があるため、
+# 文字3-gramの類似度は候補の提示（suggest）にだけ使い、保存前に利用者に確認する。
+# 候補の検索は3-gramの転置索引で行い、数十〜数百件の種目名に対して1ミリ秒未満で返す。
+import threading
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+# 正規の種目名 -> 別名（英語名・略称・よくある表記）
+CANONICAL_EXERCISES = {
+    "ベンチプレス": ("bench press", "bench", "ベンチ", "bp"),
+    "インクラインベンチプレス": ("incline bench press", "インクラインベンチ"),
+    "ダンベルプレス": ("dumbbell press", "dumbbell bench press", "ダンベルベンチプレス"),
+    "スクワット": ("squat", "back squat", "バックスクワット", "スクワッド"),
+    "フロントスクワット": ("front squat",),
+    "ブルガリアンスクワット": ("bulgarian split squat", "bulgarian squat", "ブルガリアンスプリットスクワット"),
+    "デッドリフト": ("deadlift", "deadlifts", "デッド"),
+    "ルーマニアンデッドリフト": ("romanian deadlift", "rdl"),
+    "懸垂": ("pull up", "pullup", "chin up", "chinup", "チンニング", "チンアップ", "プルアップ", "けんすい"),
+    "腕立て伏せ": ("push up", "pushup", "プッシュアップ", "腕立て", "うでたてふせ"),
+    "ショルダープレス": ("shoulder press", "overhead press", "ohp", "オーバーヘッドプレス"),
+    "バーベルロー": ("barbell row", "bent over row", "ベントオーバーロー"),
+    "ラットプルダウン": ("lat pulldown", "lat pull down"),
+    "レッグプレス": ("leg press",),
+    "レッグカール": ("leg curl",),
+    "レッグエクステンション": ("leg extension",),
+    "アームカール": ("arm curl", "biceps curl", "bicep curl", "バイセップスカール"),
+    "ダンベルカール": ("dumbbell curl",),
+    "トライセプスエクステンション": ("triceps extension", "tricep extension"),
+    "サイドレイズ": ("side raise", "lateral raise", "ラテラルレイズ"),
+    "ディップス": ("dips", "dip"),
+    "カーフレイズ": ("calf raise",),
+    "ヒップスラスト": ("hip thrust",),
+    "ランジ": ("lunge", "lunges"),
+    "プランク": ("plank",),
+    "クランチ": ("crunch", "crunches"),
+    "腹筋": ("sit up", "situp", "シットアップ"),
+}
+
+# 候補として提示する類似度（Dice係数）の下限
+SUGGEST_MIN_SCORE = 0.3
+# 折りたたみで取り除く区切り文字（NFKC後）
+_SEPARATORS = set(" \t　・･-‐‑‒–—―_.,/()[]")
+
+
+def clean_name(name):
+    """保存する表記（NFKC正規化して前後の空白を除いたもの）"""
+    return unicodedata.normalize("NFKC", str(name or "")).strip()
+
+
+def fold(name):
+    """表記ゆれを比較するためのキー（画面には表示しない）"""
+    text = clean_name(name).casefold()
+    # ひらがなはカタカナに寄せる（「べんち」と「ベンチ」を同じにする）
+    return "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text if c not in _SEPARATORS)
+
+
+def trigrams(key):
+    padded = f"\x02{key}\x03"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ExerciseNameIndex:
+    """折りたたんだキー -> 正規の種目名 と、3-gram -> キー の転置索引
+
+    parent を渡すと、その索引に自分の種目名を重ねたものとして検索する（parent は変更しない）。"""
+
+    def __init__(self, canonical=CANONICAL_EXERCISES, names=(), parent=None):
+        self._parent = parent
+        self._canonical = {}  # キー -> 正規の種目名
+        self._grams = {}  # キー -> 3-gramの集合
+        self._postings = {}  # 3-gram -> キーの集合
+        for name, aliases in canonical.items():
+            for alias in (name, *aliases):
+                self._add(fold(alias), name)
+        self.add_names(names)
+
+    def _add(self, key, name):
+        if not key or self._get(key) is not None:
+            return
+        self._canonical[key] = name
+        grams = trigrams(key)
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def add_names(self, names):
+        """ユーザーの既存の種目名を加える（標準種目と同じ表記のものは標準種目に寄せたまま）"""
+        for name in names:
+            self._add(fold(name), clean_name(name))
+        return self
+
+    def with_names(self, names):
+        """既存の種目名を重ねた索引を返す（標準種目の索引を複製しないため、種目名の数に比例する時間で作れる）"""
+        return ExerciseNameIndex(canonical={}, names=names, parent=self)
+
+    def _get(self, key):
+        if self._parent is not None:
+            name = self._parent._get(key)
+            if name is not None:
+                return name
+        return self._canonical.get(key)
+
+    def lookup(self, name):
+        """表記の折りたたみが一致する種目名（無ければ None）"""
+        return self._get(fold(name))
+
+    def _scores(self, key):
+        """キー -> 類似度（3-gramのDice係数）"""
+        grams = trigrams(key)
+        shared = Counter(k for gram in grams for k in self._postings.get(gram, ()))
+        scores = {k: 2 * count / (len(grams) + len(self._grams[k])) for k, count in shared.items()}
+        if self._parent is not None:
+            scores.update(self._parent._scores(key))
+        return scores
+
+    def suggest(self, text, limit=5, min_score=SUGGEST_MIN_SCORE):
+        """入力中の文字列に近い種目名を (種目名, 類似度) のリストで返す（前方一致を優先）"""
+        key = fold(text)
+        if not key:
+            return []
+        best = {}
+        for candidate, score in self._scores(key).items():
+            if candidate.startswith(key):
+                score = max(score, 0.5 + 0.5 * len(key) / len(candidate))
+            if score >= min_score:
+                name = self._get(candidate)
+                best[name] = max(best.get(name, 0), score)
+        return sorted(best.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def canonicalize(self, name):
+        """保存する種目名を返す（表記の折りたたみが標準種目・既存の種目名と一致しなければ入力を正規化したもの）
+
+        類似度だけで別の種目名に寄せることはしない（似た種目名は suggest() で提示する）。"""
+        cleaned = clean_name(name)
+        exact = self.lookup(cleaned) if fold(cleaned) else None
+        return cleaned if exact is None else exact
+
+    def similar_names(self, name, limit=5):
+        """新しい種目名のときだけ、似た既存の種目名のリストを返す（保存前の確認用）"""
+        if self.lookup(name) is not None:
+            return []
+        return [candidate for candidate, _ in self.suggest(name, limit) if candidate != clean_name(name)]
+
+
+_default_index = None
+_default_lock = threading.Lock()
+
+
+def default_index():
+    # 標準種目だけの索引はプロセスで1つ作って共有する（読み取りのみ）
+    global _default_index
+    with _default_lock:
+        if _default_index is None:
+            _default_index = ExerciseNameIndex()
+        return _default_index
+
+
+@lru_cache(maxsize=256)
+def _index_with(known_names):
+    # 種目カタログは同じ並びのリストを返すため、ユーザーごとの索引を作り直さずに使い回せる
+    return default_index().with_names(known_names)
+
+
+def name_index(known_names=()):
+    """標準種目にユーザーの既存の種目名（known_names）を重ねた索引"""
+    return _index_with(tuple(known_names)) if known_names else default_index()
+
+
+def canonicalize(name, known_names=()):
+    """種目名を正規の表記にする。known_names にはユーザーの既存の種目名を渡す"""
+    return name_index(known_names).canonicalize(name)
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+# --- 全履歴のエクスポート（CSV / Parquet） ---
+# training_records を (training_date, id) の昇順のキーセットページングで
+# EXPORT_CHUNK_SIZE 件ずつ取得し、チャンクごとに一時ファイルへ書き出す。
+# 全件をDataFrameにまとめないため、履歴の件数に関係なく使用メモリは1チャンク分で一定。
+# （ParquetはチャンクごとにRow Groupを1つ書く）
+import tempfile
+
+import pandas as pd
+
+from query_compat import or_filter, order_by, page_range
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_COLUMNS = ['training_date', 'exercise_name', 'weight', 'reps', 'sets', 'notes',
+                  'id', 'created_at', 'updated_at']
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "Parquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+
+def iter_record_chunks(client, user_id, chunk_size=EXPORT_CHUNK_SIZE):
+    """ユーザーの全記録を古い順に chunk_size 件ずつ返す"""
+    cursor = None
+    while True:
+        query = client.table('training_records')\
+            .select(','.join(EXPORT_COLUMNS))\
+            .eq('user_id', user_id)
+        if cursor:
+            cursor_date, cursor_id = cursor
+            query = or_filter(
+                query,
+                f"training_date.gt.{cursor_date},and(training_date.eq.{cursor_date},id.gt.{cursor_id})"
+            )
+        response = page_range(order_by(query, 'training_date', 'id'), 0, chunk_size).execute()
+        rows = response.data or []
+        if rows:
+            yield rows
+        if len(rows) < chunk_size:
+            return
+        cursor = (rows[-1]['training_date'], rows[-1]['id'])
+
+
+def _chunk_frame(rows):
+    df = pd.DataFrame(rows).reindex(columns=EXPORT_COLUMNS)
+    df['training_date'] = pd.to_datetime(df['training_date']).dt.date
+    df['weight'] = pd.to_numeric(df['weight'], errors='coerce').astype('float64')
+    df['reps'] = pd.to_numeric(df['reps'], errors='coerce').astype('Int32')
+    df['sets'] = pd.to_numeric(df['sets'], errors='coerce').astype('Int32')
+    df['notes'] = df['notes'].fillna("")
+    df['created_at'] = pd.to_datetime(df['created_at'], utc=True, format='ISO8601')
+    df['updated_at'] = pd.to_datetime(df['updated_at'], utc=True, format='ISO8601')
+    return df
+
+
+def write_csv(chunks, file, on_progress=None):
+    """チャンクを順にCSVとして追記する（Excelで開けるようBOM付きUTF-8）"""
+    file.write('\ufeff'.encode('utf-8'))
+    header = True
+    for rows in chunks:
+        file.write(_chunk_frame(rows).to_csv(index=False, header=header).encode('utf-8'))
+        header = False
+        if on_progress:
+            on_progress(len(rows))
+
+
+def write_parquet(chunks, file, on_progress=None):
+    """チャンクごとに1つのRow Groupとして書き出す"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('training_date', pa.date32()),
+        ('exercise_name', pa.string()),
+        ('weight', pa.float64()),
+        ('reps', pa.int32()),
+        ('sets', pa.int32()),
+        ('notes', pa.string()),
+        ('id', pa.string()),
+        ('created_at', pa.timestamp('us', tz='UTC')),
+        ('updated_at', pa.timestamp('us', tz='UTC')),
+    ])
+    with pq.ParquetWriter(file, schema, compression='zstd') as writer:
+        for rows in chunks:
+            writer.write_table(pa.Table.from_pandas(_chunk_frame(rows), schema=schema, preserve_index=False))
+            if on_progress:
+                on_progress(len(rows))
+
+
+def export_records(client, user_id, export_format, chunk_size=EXPORT_CHUNK_SIZE, on_progress=None):
+    """全履歴を一時ファイルに書き出し、先頭に巻き戻したファイルオブジェクトを返す
+    （st.download_button が受け付けるよう、バッファなしのファイルにする）"""
+    file = tempfile.TemporaryFile(buffering=0)
+    chunks = iter_record_chunks(client, user_id, chunk_size)
+    if export_format == "Parquet":
+        write_parquet(chunks, file, on_progress)
+    else:
+        write_csv(chunks, file, on_progress)
+    file.seek(0)
+    return file
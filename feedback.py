@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+# --- 成長フィードバック用のデータ取得・集計 ---
+# 今日の記録に含まれる全種目の「前回記録」と「自己ベスト」を
+# 種目数に関係なく1回の問い合わせでまとめて取得し、差分はメモリ上で計算する。
+# アプリの成長フィードバックは記録ストア上で summarize_history() を使う。DBから取得する
+# fetch_feedback_baselines() / fetch_exercise_history() は scripts/benchmark_pages.py での比較用にのみ残している。
+import pandas as pd
+
+from query_compat import page_range
+
+# PostgRESTの1レスポンスあたりの既定上限に合わせたページサイズ
+HISTORY_PAGE_SIZE = 1000
+# RPCが未作成であることを示すエラーコード
+# （PostgREST 10以降は PGRST202、それ以前・PostgreSQLへの直接接続では undefined_function の 42883）
+MISSING_FUNCTION_CODES = {"PGRST202", "42883"}
+
+
+def _empty_baseline():
+    return {"prev_date": None, "prev_weight": None, "prev_reps": None,
+            "best_weight": None, "best_reps": None}
+
+
+def _to_number(value):
+    number = pd.to_numeric(value, errors='coerce')
+    return None if pd.isna(number) else number
+
+
+def _is_missing_function(error):
+    code = getattr(error, 'code', None) or getattr(error, 'sqlstate', None)
+    return code in MISSING_FUNCTION_CODES
+
+
+def fetch_feedback_baselines(client, user_id, exercise_names, today):
+    """種目名 -> 前回記録/自己ベストの辞書を返す（today当日の記録は比較対象外）"""
+    names = sorted({name for name in exercise_names if name})
+    if not names:
+        return {}
+    try:
+        # サーバー側RPC（database_schema.sqlのfeedback_baselines）で一括集計
+        response = client.rpc('feedback_baselines', {
+            "p_user_id": user_id,
+            "p_exercises": names,
+            "p_today": today.isoformat(),
+        }).execute()
+    except Exception as e:
+        # RPC未作成の環境だけ in_ フィルタの一括取得にフォールバックする（認証・タイムアウトなどはそのまま送出）
+        if not _is_missing_function(e):
+            raise
+        rows = fetch_exercise_history(client, user_id, names, today)
+        return summarize_history(rows, today)
+    baselines = {}
+    for row in response.data or []:
+        baseline = _empty_baseline()
+        for key in baseline:
+            baseline[key] = row.get(key) if key == "prev_date" else _to_number(row.get(key))
+        baselines[row.get('exercise_name')] = baseline
+    return baselines
+
+
+def fetch_exercise_history(client, user_id, exercise_names, today):
+    """指定種目のtoday以外の記録を in_ フィルタで取得する（必要な列のみ）"""
+    rows = []
+    offset = 0
+    while True:
+        query = client.table('training_records')\
+            .select('exercise_name,training_date,weight,reps')\
+            .eq('user_id', user_id)\
+            .in_('exercise_name', list(exercise_names))\
+            .neq('training_date', today.isoformat())\
+            .order('training_date', desc=True)
+        response = page_range(query, offset, HISTORY_PAGE_SIZE).execute()
+        page = response.data or []
+        rows.extend(page)
+        if len(page) < HISTORY_PAGE_SIZE:
+            return rows
+        offset += HISTORY_PAGE_SIZE
+
+
+def summarize_history(rows, today):
+    """取得済みの履歴行（dictのリストまたはDataFrame）から種目ごとの前回記録と自己ベストを求める"""
+    df = pd.DataFrame(rows, columns=['exercise_name', 'training_date', 'weight', 'reps'])
+    if df.empty:
+        return {}
+    df['training_date'] = pd.to_datetime(df['training_date']).dt.date
+    df['weight'] = pd.to_numeric(df['weight'], errors='coerce')
+    df['reps'] = pd.to_numeric(df['reps'], errors='coerce')
+
+    best = df.groupby('exercise_name', observed=True)[['weight', 'reps']].max()
+    past = df[df['training_date'] < today].sort_values('training_date', kind='stable')
+    previous = past.groupby('exercise_name', observed=True).tail(1).set_index('exercise_name')
+
+    baselines = {}
+    for exercise, best_row in best.iterrows():
+        baseline = _empty_baseline()
+        baseline["best_weight"] = _to_number(best_row['weight'])
+        baseline["best_reps"] = _to_number(best_row['reps'])
+        if exercise in previous.index:
+            prev_row = previous.loc[exercise]
+            baseline["prev_date"] = prev_row['training_date'].isoformat()
+            baseline["prev_weight"] = _to_number(prev_row['weight'])
+            baseline["prev_reps"] = _to_number(prev_row['reps'])
+        baselines[exercise] = baseline
+    return baselines
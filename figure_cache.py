@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+# --- グラフ（Plotly）の図のキャッシュ ---
+# グラフ表示では再実行のたびに px.line で図を作り直し、JSONに変換していた（1枚あたり数十ms）。
+# (ユーザー, 種目, 表示モード, 集計単位, データのバージョン) をキーに図を保持し、
+# データと表示条件が同じ再表示では図の作成を省く。データのバージョンは記録ストアが
+# 記録の追加・同期のたびに種目ごとに進めるため、古い図が表示されることはない。
+# 図は一度JSONの仕様に変換してから作り直したものを保持する（st.plotly_chart での再変換が軽くなる）。
+# 全セッションで共有し、仕様のバイト数の合計が上限を超えたら最後に使われたのが古いものから捨てる。
+import os
+import threading
+from collections import OrderedDict
+
+import streamlit as st
+
+FIGURE_CACHE_MAX_BYTES = int(os.environ.get("FIGURE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+class FigureCache:
+    def __init__(self, max_bytes=FIGURE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # キー -> (図, 仕様のバイト数)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_build(self, key, build):
+        """key の図を返す。無ければ build() で作って保持する
+
+        key の最後の要素はデータのバージョンとし、同じ条件で古いバージョンの図は置き換える。"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        import plotly.io as pio
+
+        spec = pio.to_json(build(), validate=False)
+        figure = pio.from_json(spec)
+        size = len(spec)
+        with self._lock:
+            for stale in [k for k in self._entries if k[:-1] == key[:-1] and k != key]:
+                self._remove(stale)
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (figure, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return figure
+
+    def _remove(self, key):
+        _, size = self._entries.pop(key)
+        self.bytes -= size
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self.bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+@st.cache_resource
+def get_figure_cache():
+    # 全セッションで共有する（キーにユーザーIDを含む）
+    return FigureCache()
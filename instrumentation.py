@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+# --- 外部API呼び出しの計測（Supabase / YouTube） ---
+# 環境変数 QUERY_METRICS=1 のときだけ、クライアントを薄いプロキシで包み、
+# スクリプト実行（rerun）ごとに execute() の問い合わせ形状・行数・レスポンスサイズ・所要時間を記録する。
+# 結果はサイドバーのデバッグ表示と、QUERY_METRICS_FILE（.prom なら Prometheus テキスト形式、
+# それ以外は1実行1行のJSON Lines）に出力する。記録するのは列名・テーブル名だけで、値は含めない。
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+QUERY_METRICS_ENABLED = os.environ.get("QUERY_METRICS", "").lower() in ("1", "true", "yes")
+QUERY_METRICS_FILE = os.environ.get("QUERY_METRICS_FILE", "")
+
+# 形状に含める第1引数（列名・テーブル名）の最大長。select の列リストは長いため省く
+SHAPE_ARG_MAX_LENGTH = 40
+SHAPE_SKIP_ARGS = {"select", "insert", "upsert", "update"}
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+# Prometheus 出力用のプロセス内累計: (page, service, shape) -> [回数, 行数, バイト数, 秒, エラー数]
+_totals = {}
+_totals_lock = threading.Lock()
+
+
+def _records():
+    if not hasattr(_local, "records"):
+        _local.records = []
+    return _local.records
+
+
+def start_queries():
+    """スクリプト実行の開始時に呼び、前回の計測結果を破棄する"""
+    _local.records = []
+    _local.page = None
+
+
+def set_page(page):
+    """今回の実行で表示するページ（機能選択の値）。query_report() で各記録に付ける"""
+    _local.page = page
+
+
+def current_context():
+    """今回の実行の (記録のリスト, ページ)。別スレッドで実行する問い合わせに bind_context() で引き継ぐ"""
+    return _records(), getattr(_local, "page", None)
+
+
+def bind_context(context):
+    _local.records, _local.page = context
+
+
+def _describe(name, args):
+    first = args[0] if args else None
+    if name not in SHAPE_SKIP_ARGS and isinstance(first, str) and len(first) <= SHAPE_ARG_MAX_LENGTH:
+        return f"{name}({first})"
+    return name
+
+
+def _response_size(data):
+    """(行数, JSONに直したときのバイト数)"""
+    if data is None:
+        return 0, 0
+    rows = len(data) if isinstance(data, list) else len(data.get("items", [])) if isinstance(data, dict) else 1
+    return rows, len(json.dumps(data, ensure_ascii=False, default=str).encode("utf-8"))
+
+
+class InstrumentedProxy:
+    """メソッドチェーンを形状として覚え、execute() の呼び出しを計測するプロキシ"""
+
+    def __init__(self, target, service, shape=()):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_service", service)
+        object.__setattr__(self, "_shape", tuple(shape))
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr):
+            return attr
+        if name == "execute":
+            return self._execute
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # postgrest のビルダーは自身を返すため、形状を引き継いだプロキシで包み直す
+            return InstrumentedProxy(result, self._service, self._shape + (_describe(name, args),))
+        return call
+
+    def __setattr__(self, name, value):
+        # query_compat の or / order は params を直接書き換えるため、追加されたキーを形状に加える
+        if name == "params" and hasattr(value, "multi_items") and value.multi_items():
+            object.__setattr__(self, "_shape", self._shape + (value.multi_items()[-1][0],))
+        setattr(self._target, name, value)
+
+    def _execute(self, *args, **kwargs):
+        start = time.perf_counter()
+        error = None
+        response = None
+        try:
+            response = self._target.execute(*args, **kwargs)
+            return response
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            data = getattr(response, "data", response)
+            rows, size = _response_size(data) if error is None else (0, 0)
+            _records().append({
+                "service": self._service, "shape": ".".join(self._shape),
+                "rows": rows, "bytes": size, "ms": round(seconds * 1000, 1), "error": error,
+            })
+
+
+def instrument(client, service):
+    """計測が有効ならクライアントをプロキシで包んで返す（無効ならそのまま返す）"""
+    if not QUERY_METRICS_ENABLED or client is None:
+        return client
+    return InstrumentedProxy(client, service)
+
+
+def query_report():
+    """今回の実行の計測結果（行のリスト）を返し、ログと QUERY_METRICS_FILE に出力する
+
+    各行には同じ形状の問い合わせが今回の実行で何回あったか（N+1の目安）を付ける。"""
+    page = getattr(_local, "page", None)
+    records = [dict(record, page=page) for record in _records()]
+    repeats = Counter((r["service"], r["shape"]) for r in records)
+    for record in records:
+        record["same_shape"] = repeats[(record["service"], record["shape"])]
+    summary = {
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "page": page, "calls": len(records),
+        "rows": sum(r["rows"] for r in records), "bytes": sum(r["bytes"] for r in records),
+        "ms": round(sum(r["ms"] for r in records), 1),
+    }
+    line = json.dumps(dict(summary, queries=records), ensure_ascii=False)
+    logger.info("query metrics %s", line)
+    _accumulate(records)
+    if QUERY_METRICS_FILE:
+        try:
+            if QUERY_METRICS_FILE.endswith(".prom"):
+                _write_prometheus(QUERY_METRICS_FILE)
+            else:
+                with open(QUERY_METRICS_FILE, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning("query metrics could not be written: %s", e)
+    return records, summary
+
+
+def _accumulate(records):
+    with _totals_lock:
+        for r in records:
+            totals = _totals.setdefault((r["page"] or "", r["service"], r["shape"]), [0, 0, 0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += r["rows"]
+            totals[2] += r["bytes"]
+            totals[3] += r["ms"] / 1000
+            totals[4] += r["error"] is not None
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _write_prometheus(path):
+    """プロセス起動からの累計を Prometheus のテキスト形式で書き出す（node_exporter の textfile 用）"""
+    metrics = [
+        ("workout_query_calls_total", "execute() calls", 0),
+        ("workout_query_rows_total", "rows returned", 1),
+        ("workout_query_response_bytes_total", "response size as JSON", 2),
+        ("workout_query_seconds_total", "wall time", 3),
+        ("workout_query_errors_total", "failed calls", 4),
+    ]
+    with _totals_lock:
+        totals = dict(_totals)
+    lines = []
+    for name, description, index in metrics:
+        lines += [f"# HELP {name} {description}", f"# TYPE {name} counter"]
+        for (page, service, shape), values in sorted(totals.items()):
+            labels = f'page="{_label(page)}",service="{_label(service)}",shape="{_label(shape)}"'
+            lines.append(f"{name}{{{labels}}} {values[index]:g}")
+    # 読み取り途中のファイルを見せないよう、一時ファイルに書いてから置き換える
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(tmp_path, path)
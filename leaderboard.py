@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+# --- 参加コード（コホート）ごとのランキング ---
+# ユーザー間の比較は training_records を走査せず、週次ロールアップ（weekly_exercise_rollups）から
+# RPC cohort_leaderboard / cohort_position で上位N件と自分の順位だけを取得する
+# （migrations/0007_weekly_rollups.sql）。ロールアップは scripts/refresh_rollups.py の定期実行で更新されるため、
+# 保存した記録はその実行間隔だけ遅れて反映される。
+# 同じ参加コードを入力したユーザー同士で比較する（他の参加者には表示名だけが見える）。
+# 上位N件は参加コード・種目・週・指標ごとにプロセス内で全セッション共有してキャッシュする。
+import threading
+import time
+import unicodedata
+from datetime import timedelta
+
+import streamlit as st
+
+# 表示名 -> 指標（RPCの p_metric）
+LEADERBOARD_METRICS = {"推定1RM (kg)": "e1rm", "週間ボリューム (kg)": "volume"}
+DEFAULT_LIMIT = 10
+MAX_COHORT_LENGTH = 40
+MAX_DISPLAY_NAME_LENGTH = 20
+# キャッシュの有効期間（秒）。ロールアップの更新間隔より短くする
+LEADERBOARD_TTL_SECONDS = 300
+LEADERBOARD_CACHE_ENTRIES = 1024
+
+
+class CohortError(ValueError):
+    pass
+
+
+def week_start(day):
+    """day を含む週の月曜日（ロールアップの週の区切りと同じ）"""
+    return day - timedelta(days=day.weekday())
+
+
+def recent_weeks(today, count=12):
+    """今週から count 週前までの週の開始日（新しい順）"""
+    start = week_start(today)
+    return [start - timedelta(weeks=i) for i in range(count)]
+
+
+def normalize_cohort(code):
+    """参加コードを正規化する（全角・半角と大文字・小文字の違い、前後の空白を無視する）"""
+    normalized = unicodedata.normalize("NFKC", code or "").strip().lower()
+    if not normalized:
+        raise CohortError("参加コードを入力してください。")
+    if len(normalized) > MAX_COHORT_LENGTH:
+        raise CohortError(f"参加コードは{MAX_COHORT_LENGTH}文字以内で入力してください。")
+    return normalized
+
+
+def fetch_my_cohorts(client, user_id):
+    """参加中の参加コード -> 表示名 の辞書を返す"""
+    response = client.table('cohort_members').select('cohort,display_name').eq('user_id', user_id)\
+        .order('cohort').execute()
+    return {row['cohort']: row['display_name'] for row in response.data or []}
+
+
+def join_cohort(client, user_id, code, display_name):
+    """参加コードに参加し、正規化した参加コードを返す（参加済みなら表示名を更新する）"""
+    cohort = normalize_cohort(code)
+    display_name = (display_name or "").strip()
+    if not display_name:
+        raise CohortError("表示名を入力してください。")
+    if len(display_name) > MAX_DISPLAY_NAME_LENGTH:
+        raise CohortError(f"表示名は{MAX_DISPLAY_NAME_LENGTH}文字以内で入力してください。")
+    client.table('cohort_members').upsert(
+        {"cohort": cohort, "user_id": user_id, "display_name": display_name}, on_conflict='cohort,user_id',
+    ).execute()
+    return cohort
+
+
+def leave_cohort(client, user_id, cohort):
+    client.table('cohort_members').delete().eq('cohort', cohort).eq('user_id', user_id).execute()
+
+
+def fetch_leaderboard(client, cohort, exercise_name, week, metric, user_id=None, limit=DEFAULT_LIMIT):
+    """上位 limit 件の行（rank / display_name / value / training_days / is_self）のリストを返す"""
+    response = client.rpc('cohort_leaderboard', {
+        "p_cohort": cohort,
+        "p_exercise": exercise_name,
+        "p_week_start": str(week),
+        "p_metric": metric,
+        "p_user_id": user_id,
+        "p_limit": limit,
+    }).execute()
+    return response.data or []
+
+
+def fetch_cohort_position(client, cohort, exercise_name, week, metric, user_id):
+    """自分の順位・その週の記録がある参加者数・値の辞書を返す（その週の記録が無ければ rank / value は None）"""
+    response = client.rpc('cohort_position', {
+        "p_cohort": cohort,
+        "p_exercise": exercise_name,
+        "p_week_start": str(week),
+        "p_metric": metric,
+        "p_user_id": user_id,
+    }).execute()
+    rows = response.data or []
+    return rows[0] if rows else {"rank": None, "members": 0, "value": None}
+
+
+class LeaderboardCache:
+    """RPCの結果を引数ごとに有効期間つきで保持する（スレッドプールのタスクからも呼べる）"""
+
+    def __init__(self, ttl_seconds=LEADERBOARD_TTL_SECONDS, max_entries=LEADERBOARD_CACHE_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}  # (関数名, 引数…) -> (読み込み時刻, 結果)
+        self._lock = threading.Lock()
+
+    def _get(self, key, fetch, *args):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self.ttl_seconds:
+                return entry[1]
+        value = fetch(*args)
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # 最も古いものから捨てる（辞書は挿入順）
+                self._entries.pop(next(iter(self._entries)))
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic(), value)
+        return value
+
+    def leaderboard(self, client, cohort, exercise_name, week, metric, limit=DEFAULT_LIMIT):
+        """上位N件（全参加者で共有するため is_self は含めない）"""
+        key = ("leaderboard", cohort, exercise_name, str(week), metric, limit)
+        return self._get(key, fetch_leaderboard, client, cohort, exercise_name, week, metric, None, limit)
+
+    def position(self, client, cohort, exercise_name, week, metric, user_id):
+        key = ("position", cohort, exercise_name, str(week), metric, user_id)
+        return self._get(key, fetch_cohort_position, client, cohort, exercise_name, week, metric, user_id)
+
+    def invalidate(self, cohort=None):
+        with self._lock:
+            if cohort is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[1] == cohort]:
+                    del self._entries[key]
+
+
+def mark_self(rows, position, display_name):
+    """共有の上位N件のうち自分の行（順位・値・表示名が一致する行）に is_self を付ける"""
+    return [dict(row, is_self=(position.get("rank") is not None and row.get("rank") == position["rank"]
+                               and row.get("display_name") == display_name
+                               and float(row.get("value") or 0) == float(position.get("value") or 0)))
+            for row in rows]
+
+
+@st.cache_resource
+def get_leaderboard_cache():
+    # 全セッションで共有する（同じ参加コードの参加者は同じ上位N件を読む）
+    return LeaderboardCache()
@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+# --- ローカルのSQLiteバックエンド（Supabaseクライアント互換） ---
+# 各モジュールは Supabase クライアントの問い合わせビルダー（table().select().eq()…execute()、rpc()）を
+# 通してデータにアクセスするため、その使用範囲だけを実装したクライアントを差し替えればバックエンドを変えられる。
+# SQLiteClient は同じ問い合わせを SQL に変換してローカルの SQLite ファイルで実行する
+# （スキーマは database_schema_sqlite.sql。オフラインでの利用や、通信を含まない計測用）。
+# 問い合わせビルダーは scripts/bench_clients.py のスタブ・PostgreSQL用クライアントと共有する。
+import os
+import re
+import sqlite3
+import threading
+import uuid
+from datetime import date, datetime
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database_schema_sqlite.sql")
+# ローカルモードでは認証を行わず、固定のユーザーIDで記録する
+LOCAL_USER_ID = str(uuid.uuid5(uuid.NAMESPACE_OID, "workout-review-local"))
+LOCAL_USER_EMAIL = "ローカル"
+
+_SQL_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+class FunctionNotFoundError(RuntimeError):
+    """未作成のRPC（PostgRESTの APIError と同じく code で判別できるようにする）"""
+    code = "PGRST202"
+
+    def __init__(self, name):
+        super().__init__(f"function {name} does not exist")
+
+
+class RelationNotFoundError(RuntimeError):
+    """未作成のテーブル・ビュー（PostgRESTの APIError と同じく code で判別できるようにする）"""
+    code = "42P01"
+
+    def __init__(self, name):
+        super().__init__(f'relation "{name}" does not exist')
+
+
+class Response:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class Params:
+    """httpx.QueryParams と同じく add() で新しいインスタンスを返す"""
+
+    def __init__(self, items=()):
+        self.items = list(items)
+
+    def add(self, key, value):
+        return Params(self.items + [(key, value)])
+
+
+def parse_logic_tree(expression):
+    """PostgRESTの or=(…) の中身を (演算, [条件…]) の木にする。条件は (列, 演算子, 値)"""
+    def split_top_level(text):
+        parts, depth, current = [], 0, ""
+        for char in text:
+            if char == "," and depth == 0:
+                parts.append(current)
+                current = ""
+                continue
+            depth += char == "("
+            depth -= char == ")"
+            current += char
+        return parts + [current]
+
+    def parse(part):
+        match = re.fullmatch(r"(and|or)\((.*)\)", part)
+        if match:
+            return (match.group(1), [parse(p) for p in split_top_level(match.group(2))])
+        column, operator, value = part.split(".", 2)
+        return (column, operator, value)
+
+    return ("or", [parse(p) for p in split_top_level(expression.strip()[1:-1])])
+
+
+class QueryBuilder:
+    """アプリが使う範囲の問い合わせビルダー。execute() で client.run(self) を呼ぶ"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.columns = "*"
+        self.count = None
+        self.filters = []  # (列, 演算子, 値)
+        self.params = Params()
+        self.orders = []  # (列, 降順か)
+        self.offset = 0
+        self.limit_rows = None
+        self.operation = "select"
+        self.payload = None
+        self.on_conflict = None
+        self.ignore_duplicates = False
+
+    # --- 問い合わせの組み立て ---
+    def select(self, columns="*", count=None):
+        self.columns = columns
+        self.count = count
+        return self
+
+    def _filter(self, column, operator, value):
+        self.filters.append((column, operator, value))
+        return self
+
+    def eq(self, column, value): return self._filter(column, "eq", value)
+    def neq(self, column, value): return self._filter(column, "neq", value)
+    def gt(self, column, value): return self._filter(column, "gt", value)
+    def gte(self, column, value): return self._filter(column, "gte", value)
+    def lt(self, column, value): return self._filter(column, "lt", value)
+    def lte(self, column, value): return self._filter(column, "lte", value)
+    def in_(self, column, values): return self._filter(column, "in", list(values))
+
+    def order(self, column, desc=False):
+        self.orders.append((column, desc))
+        return self
+
+    def range(self, start, end):
+        # postgrest-py 0.10系と同じく end は含まない（query_compat.page_range を参照）
+        self.offset = start
+        self.limit_rows = end - start
+        return self
+
+    def limit(self, count):
+        self.limit_rows = count
+        return self
+
+    def insert(self, rows):
+        self.operation = "insert"
+        self.payload = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, ignore_duplicates=False, on_conflict="", **_):
+        self.insert(rows)
+        self.operation = "upsert"
+        self.ignore_duplicates = ignore_duplicates
+        self.on_conflict = on_conflict
+        return self
+
+    def _resolved(self):
+        """params に積まれた or / order を filters・orders に反映した (filters, 論理木, orders)"""
+        trees = [parse_logic_tree(value) for key, value in self.params.items if key == "or"]
+        orders = list(self.orders)
+        for key, value in self.params.items:
+            if key == "order":
+                orders = [(part.split(".")[0], part.split(".")[1:2] == ["desc"]) for part in value.split(",")]
+        return self.filters, trees, orders
+
+    def execute(self):
+        return self.client.run(self)
+
+
+class RpcCall:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.rpc_params = client, name, params
+
+    def execute(self):
+        return self.client.run_rpc(self.name, self.rpc_params)
+
+
+# --- SQLiteで実行するクライアント ---
+def _sql_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+class LocalAuth:
+    """ローカルモードでは認証を行わない（ログアウトのみ受け付ける）"""
+
+    def sign_in_with_password(self, credentials):
+        raise RuntimeError("ローカルモードではログインは不要です。")
+
+    def sign_up(self, credentials):
+        raise RuntimeError("ローカルモードではアカウント登録は不要です。")
+
+    def sign_out(self):
+        return None
+
+
+class SQLiteClient:
+    """Supabaseクライアント互換のSQLiteクライアント。
+
+    呼び出しごとに接続を開くため、スレッドプールや書き込みキューのスレッドからも使える。
+    rpc は feedback_baselines と save_workout_session のみ実装し、それ以外は未作成として例外を送出する。"""
+
+    def __init__(self, path):
+        self.path = path
+        self.auth = LocalAuth()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(SCHEMA_PATH, encoding="utf-8") as f:
+            schema = f.read()
+        with self._connect() as conn:
+            conn.executescript(schema)
+        conn.close()
+        self._rpcs = {
+            "feedback_baselines": self._feedback_baselines,
+            "save_workout_session": self._save_workout_session,
+        }
+        self._write_lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    def rpc(self, name, params):
+        return RpcCall(self, name, params)
+
+    # --- 問い合わせの実行 ---
+    def _condition(self, column, operator, value, params):
+        if operator == "in":
+            params.extend(_sql_value(v) for v in value)
+            return f"{column} IN ({', '.join('?' * len(value))})" if value else "0"
+        params.append(_sql_value(value))
+        return f"{column} {_SQL_OPERATORS[operator]} ?"
+
+    def _tree(self, node, params):
+        if node[0] in ("and", "or"):
+            joined = f" {node[0].upper()} ".join(self._tree(child, params) for child in node[1])
+            return f"({joined})"
+        return self._condition(*node, params)
+
+    def run(self, query):
+        if query.operation in ("insert", "upsert"):
+            return self._insert(query)
+        filters, trees, orders = query._resolved()
+        params = []
+        conditions = [self._condition(*f, params) for f in filters] + [self._tree(t, params) for t in trees]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f" ORDER BY {', '.join(c + (' DESC' if d else '') for c, d in orders)}" if orders else ""
+        limit = f" LIMIT {query.limit_rows}" if query.limit_rows is not None else (" LIMIT -1" if query.offset else "")
+        offset = f" OFFSET {query.offset}" if query.offset else ""
+        conn = self._connect()
+        try:
+            data = [dict(row) for row in
+                    conn.execute(f"SELECT {query.columns} FROM {query.table}{where}{order}{limit}{offset}", params)]
+            count = None
+            if query.count:
+                count = conn.execute(f"SELECT count(*) FROM {query.table}{where}", params).fetchone()[0]
+        finally:
+            conn.close()
+        return Response(data, count)
+
+    def _insert(self, query):
+        if not query.payload:
+            return Response([])
+        columns = list(query.payload[0])
+        conflict = ""
+        if query.operation == "upsert" and query.ignore_duplicates:
+            conflict = f" ON CONFLICT ({query.on_conflict}) DO NOTHING" if query.on_conflict else " ON CONFLICT DO NOTHING"
+        sql = (f"INSERT INTO {query.table} ({', '.join(columns)}) "
+               f"VALUES ({', '.join('?' * len(columns))}){conflict} RETURNING *")
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    data = []
+                    for row in query.payload:
+                        data.extend(dict(saved) for saved in
+                                    conn.execute(sql, [_sql_value(row.get(c)) for c in columns]).fetchall())
+            finally:
+                conn.close()
+        return Response(data)
+
+    # --- RPC（database_schema.sql の関数と同じ結果を返す） ---
+    def run_rpc(self, name, params):
+        if name not in self._rpcs:
+            raise FunctionNotFoundError(name)
+        return Response(self._rpcs[name](**params))
+
+    def _feedback_baselines(self, p_user_id, p_exercises, p_today):
+        conn = self._connect()
+        try:
+            rows = []
+            for name in p_exercises:
+                prev = conn.execute(
+                    "SELECT training_date, weight, reps FROM training_records "
+                    "WHERE user_id = ? AND exercise_name = ? AND training_date < ? "
+                    "ORDER BY training_date DESC LIMIT 1", (p_user_id, name, str(p_today))).fetchone()
+                best = conn.execute(
+                    "SELECT MAX(weight), MAX(reps) FROM training_records "
+                    "WHERE user_id = ? AND exercise_name = ? AND training_date <> ?",
+                    (p_user_id, name, str(p_today))).fetchone()
+                rows.append({
+                    "exercise_name": name,
+                    "prev_date": prev["training_date"] if prev else None,
+                    "prev_weight": prev["weight"] if prev else None,
+                    "prev_reps": prev["reps"] if prev else None,
+                    "best_weight": best[0], "best_reps": best[1],
+                })
+            return rows
+        finally:
+            conn.close()
+
+    def _save_workout_session(self, p_session_id, p_user_id, p_training_date, p_notes, p_sets):
+        by_exercise = {}
+        for entry in p_sets:
+            by_exercise.setdefault(entry["exercise_name"], []).append((float(entry["weight"]), int(entry["reps"])))
+        with self._write_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    created = conn.execute(
+                        "INSERT INTO workout_sessions (id, user_id, training_date, notes) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (id) DO NOTHING", (p_session_id, p_user_id, str(p_training_date), p_notes))
+                    if created.rowcount == 0:
+                        # 同じセッションの再送: 登録済みの集計行を返す
+                        return [dict(row) for row in conn.execute(
+                            "SELECT * FROM training_records WHERE session_id = ? AND user_id = ?",
+                            (p_session_id, p_user_id))]
+                    saved = []
+                    for exercise, sets in by_exercise.items():
+                        top_weight, top_reps = max(sets)
+                        record = dict(conn.execute(
+                            "INSERT INTO training_records (user_id, training_date, exercise_name, weight, reps, sets, "
+                            "notes, session_id, volume, e1rm) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) RETURNING *",
+                            (p_user_id, str(p_training_date), exercise, top_weight, top_reps, len(sets), p_notes,
+                             p_session_id, round(sum(w * r for w, r in sets), 2),
+                             max(round(w * (1 + r / 30.0), 2) for w, r in sets))).fetchone())
+                        conn.executemany(
+                            "INSERT INTO workout_sets (id, session_id, record_id, user_id, exercise_name, set_number, "
+                            "weight, reps) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            [(str(uuid.uuid4()), p_session_id, record["id"], p_user_id, exercise, number, w, r)
+                             for number, (w, r) in enumerate(sets, start=1)])
+                        saved.append(record)
+                    return saved
+            finally:
+                conn.close()
@@ -0,0 +1,18 @@
+-- 0001: トレーニング記録テーブル（初期スキーマ）
+CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
+
+CREATE TABLE IF NOT EXISTS training_records (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL,  -- ユーザーIDを追加
+    training_date DATE NOT NULL,
+    exercise_name TEXT NOT NULL,
+    weight DECIMAL(5,2) NOT NULL,
+    reps INTEGER NOT NULL,
+    sets INTEGER NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_training_records_date ON training_records(training_date);
+CREATE INDEX IF NOT EXISTS idx_training_records_exercise ON training_records(exercise_name);
@@ -0,0 +1,34 @@
+-- 0002: 成長フィードバック用RPCと種目カタログビュー
+
+-- 成長フィードバック用: 種目ごとの前回記録と自己ベスト（当日分を除く）を一括取得
+CREATE OR REPLACE FUNCTION feedback_baselines(p_user_id UUID, p_exercises TEXT[], p_today DATE)
+RETURNS TABLE (
+    exercise_name TEXT,
+    prev_date DATE,
+    prev_weight DECIMAL(5,2),
+    prev_reps INTEGER,
+    best_weight DECIMAL(5,2),
+    best_reps INTEGER
+)
+LANGUAGE sql STABLE
+AS $$
+    SELECT e.name, prev.training_date, prev.weight, prev.reps, best.best_weight, best.best_reps
+    FROM unnest(p_exercises) AS e(name)
+    LEFT JOIN LATERAL (
+        SELECT r.training_date, r.weight, r.reps
+        FROM training_records r
+        WHERE r.user_id = p_user_id AND r.exercise_name = e.name AND r.training_date < p_today
+        ORDER BY r.training_date DESC
+        LIMIT 1
+    ) prev ON TRUE
+    LEFT JOIN LATERAL (
+        SELECT MAX(r.weight) AS best_weight, MAX(r.reps) AS best_reps
+        FROM training_records r
+        WHERE r.user_id = p_user_id AND r.exercise_name = e.name AND r.training_date <> p_today
+    ) best ON TRUE;
+$$;
+
+-- 種目カタログ: ユーザーごとの重複なし種目名（種目選択リスト用）
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise ON training_records(user_id, exercise_name);
+CREATE OR REPLACE VIEW user_exercise_catalog WITH (security_invoker = true) AS
+    SELECT DISTINCT user_id, exercise_name FROM training_records;
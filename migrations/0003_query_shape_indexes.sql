@@ -0,0 +1,28 @@
+-- 0003: app.py の問い合わせ形状に合わせた複合インデックス
+-- すべての問い合わせは user_id で絞り込むため、user_id を先頭列にする。
+
+-- 種目別の系列・前回記録・種目カタログ:
+--   WHERE user_id = ? AND exercise_name = ? ORDER BY training_date DESC
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_date
+    ON training_records (user_id, exercise_name, training_date DESC);
+
+-- 期間指定のリスト表示（キーセットページング）・件数:
+--   WHERE user_id = ? AND training_date BETWEEN ? AND ? ORDER BY training_date DESC, id DESC
+CREATE INDEX IF NOT EXISTS idx_training_records_user_date
+    ON training_records (user_id, training_date DESC, id DESC);
+
+-- 自己ベスト（重量・回数）: 当日除外の条件もインデックスだけで判定できるよう training_date を含める
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_weight
+    ON training_records (user_id, exercise_name, weight DESC) INCLUDE (training_date);
+CREATE INDEX IF NOT EXISTS idx_training_records_user_exercise_reps
+    ON training_records (user_id, exercise_name, reps DESC) INCLUDE (training_date);
+
+-- 記録ストアの差分同期:
+--   WHERE user_id = ? AND updated_at >= ? ORDER BY updated_at, id
+CREATE INDEX IF NOT EXISTS idx_training_records_user_updated
+    ON training_records (user_id, updated_at, id);
+
+-- 上記の複合インデックスで代替される単一列・旧インデックスを削除
+DROP INDEX IF EXISTS idx_training_records_date;
+DROP INDEX IF EXISTS idx_training_records_exercise;
+DROP INDEX IF EXISTS idx_training_records_user_exercise;
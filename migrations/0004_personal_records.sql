@@ -0,0 +1,170 @@
+-- 0004: 自己ベストの実体化テーブル（training_records への書き込み時にトリガーで更新）
+-- 指標ごとに「最高値」「最高値を記録した日」「その日より前の最高値」を持つ。
+-- 成長フィードバックでは、最高値の記録日が今日なら「その日より前の最高値」が
+-- 今日を除いた自己ベストになるため、履歴を走査せずに主キー参照だけで判定できる。
+-- 推定1RMはEpley式 weight × (1 + reps / 30)。
+
+CREATE TABLE IF NOT EXISTS personal_records (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    best_weight DECIMAL(5,2),
+    best_weight_date DATE,
+    prev_best_weight DECIMAL(5,2),
+    best_reps INTEGER,
+    best_reps_date DATE,
+    prev_best_reps INTEGER,
+    best_volume DECIMAL(12,2),
+    best_volume_date DATE,
+    prev_best_volume DECIMAL(12,2),
+    best_e1rm DECIMAL(7,2),
+    best_e1rm_date DATE,
+    prev_best_e1rm DECIMAL(7,2),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, exercise_name)
+);
+
+-- 指定ユーザー（NULLなら全ユーザー）・種目（NULLなら全種目）の自己ベストを履歴から再計算する
+CREATE OR REPLACE FUNCTION refresh_personal_records(p_user_id UUID DEFAULT NULL, p_exercise_name TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    DELETE FROM personal_records pr
+    WHERE (p_user_id IS NULL OR pr.user_id = p_user_id)
+      AND (p_exercise_name IS NULL OR pr.exercise_name = p_exercise_name);
+
+    INSERT INTO personal_records (
+        user_id, exercise_name,
+        best_weight, best_weight_date, prev_best_weight,
+        best_reps, best_reps_date, prev_best_reps,
+        best_volume, best_volume_date, prev_best_volume,
+        best_e1rm, best_e1rm_date, prev_best_e1rm
+    )
+    WITH daily AS (
+        SELECT r.user_id, r.exercise_name, r.training_date,
+               MAX(r.weight) AS weight,
+               MAX(r.reps) AS reps,
+               MAX(r.weight * r.reps * r.sets) AS volume,
+               MAX(ROUND(r.weight * (1 + r.reps / 30.0), 2)) AS e1rm
+        FROM training_records r
+        WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+          AND (p_exercise_name IS NULL OR r.exercise_name = p_exercise_name)
+        GROUP BY r.user_id, r.exercise_name, r.training_date
+    ), running AS (
+        -- 各日について「その日より前の最高値」を求める
+        SELECT d.*,
+               MAX(d.weight) OVER earlier AS weight_before,
+               MAX(d.reps) OVER earlier AS reps_before,
+               MAX(d.volume) OVER earlier AS volume_before,
+               MAX(d.e1rm) OVER earlier AS e1rm_before
+        FROM daily d
+        WINDOW earlier AS (PARTITION BY d.user_id, d.exercise_name ORDER BY d.training_date
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+    )
+    SELECT user_id, exercise_name,
+           MAX(weight), (ARRAY_AGG(training_date ORDER BY weight DESC, training_date))[1],
+           (ARRAY_AGG(weight_before ORDER BY weight DESC, training_date))[1],
+           MAX(reps), (ARRAY_AGG(training_date ORDER BY reps DESC, training_date))[1],
+           (ARRAY_AGG(reps_before ORDER BY reps DESC, training_date))[1],
+           MAX(volume), (ARRAY_AGG(training_date ORDER BY volume DESC, training_date))[1],
+           (ARRAY_AGG(volume_before ORDER BY volume DESC, training_date))[1],
+           MAX(e1rm), (ARRAY_AGG(training_date ORDER BY e1rm DESC, training_date))[1],
+           (ARRAY_AGG(e1rm_before ORDER BY e1rm DESC, training_date))[1]
+    FROM running
+    GROUP BY user_id, exercise_name;
+
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+-- 追加された記録を自己ベストに反映する
+-- 通常（記録日が各最高値の記録日以降）は行単位の比較だけで更新し、
+-- 過去日付の追加のように「その日より前の最高値」が変わり得る場合のみ該当種目を再計算する。
+CREATE OR REPLACE FUNCTION personal_records_after_insert()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    pr personal_records%ROWTYPE;
+    new_volume DECIMAL := NEW.weight * NEW.reps * NEW.sets;
+    new_e1rm DECIMAL := ROUND(NEW.weight * (1 + NEW.reps / 30.0), 2);  -- 保存時の精度で比較する
+BEGIN
+    SELECT * INTO pr FROM personal_records
+    WHERE user_id = NEW.user_id AND exercise_name = NEW.exercise_name
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO personal_records (
+            user_id, exercise_name,
+            best_weight, best_weight_date, best_reps, best_reps_date,
+            best_volume, best_volume_date, best_e1rm, best_e1rm_date
+        ) VALUES (
+            NEW.user_id, NEW.exercise_name,
+            NEW.weight, NEW.training_date, NEW.reps, NEW.training_date,
+            new_volume, NEW.training_date, new_e1rm, NEW.training_date
+        )
+        ON CONFLICT (user_id, exercise_name) DO NOTHING;
+        IF NOT FOUND THEN
+            -- 同時に別の記録が最初の行を作成した場合
+            PERFORM refresh_personal_records(NEW.user_id, NEW.exercise_name);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF NEW.training_date < GREATEST(pr.best_weight_date, pr.best_reps_date, pr.best_volume_date, pr.best_e1rm_date) THEN
+        PERFORM refresh_personal_records(NEW.user_id, NEW.exercise_name);
+        RETURN NULL;
+    END IF;
+
+    UPDATE personal_records SET
+        prev_best_weight = CASE WHEN NEW.weight > best_weight AND NEW.training_date > best_weight_date
+                                THEN best_weight ELSE prev_best_weight END,
+        best_weight_date = CASE WHEN NEW.weight > best_weight THEN NEW.training_date ELSE best_weight_date END,
+        best_weight = GREATEST(best_weight, NEW.weight),
+        prev_best_reps = CASE WHEN NEW.reps > best_reps AND NEW.training_date > best_reps_date
+                              THEN best_reps ELSE prev_best_reps END,
+        best_reps_date = CASE WHEN NEW.reps > best_reps THEN NEW.training_date ELSE best_reps_date END,
+        best_reps = GREATEST(best_reps, NEW.reps),
+        prev_best_volume = CASE WHEN new_volume > best_volume AND NEW.training_date > best_volume_date
+                                THEN best_volume ELSE prev_best_volume END,
+        best_volume_date = CASE WHEN new_volume > best_volume THEN NEW.training_date ELSE best_volume_date END,
+        best_volume = GREATEST(best_volume, new_volume),
+        prev_best_e1rm = CASE WHEN new_e1rm > best_e1rm AND NEW.training_date > best_e1rm_date
+                              THEN best_e1rm ELSE prev_best_e1rm END,
+        best_e1rm_date = CASE WHEN new_e1rm > best_e1rm THEN NEW.training_date ELSE best_e1rm_date END,
+        best_e1rm = GREATEST(best_e1rm, new_e1rm),
+        updated_at = NOW()
+    WHERE user_id = NEW.user_id AND exercise_name = NEW.exercise_name;
+    RETURN NULL;
+END;
+$$;
+
+-- 記録の修正・削除時は影響する種目を再計算する
+CREATE OR REPLACE FUNCTION personal_records_after_change()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM refresh_personal_records(OLD.user_id, OLD.exercise_name);
+    IF TG_OP = 'UPDATE' AND (NEW.user_id, NEW.exercise_name) IS DISTINCT FROM (OLD.user_id, OLD.exercise_name) THEN
+        PERFORM refresh_personal_records(NEW.user_id, NEW.exercise_name);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_personal_records_insert ON training_records;
+CREATE TRIGGER trg_personal_records_insert
+    AFTER INSERT ON training_records
+    FOR EACH ROW EXECUTE FUNCTION personal_records_after_insert();
+
+DROP TRIGGER IF EXISTS trg_personal_records_change ON training_records;
+CREATE TRIGGER trg_personal_records_change
+    AFTER UPDATE OF user_id, exercise_name, training_date, weight, reps, sets OR DELETE ON training_records
+    FOR EACH ROW EXECUTE FUNCTION personal_records_after_change();
+
+-- 既存の記録から初期データを作成する
+SELECT refresh_personal_records();
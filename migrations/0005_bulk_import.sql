@@ -0,0 +1,99 @@
+-- 0005: CSV/JSONの一括インポート
+-- import_key はインポート元の行から作る自然キー（日付・種目・重量・回数・セット数・メモと
+-- ファイル内の出現回数のハッシュ）。同じファイルを再インポートしても重複しないよう、
+-- ユーザー単位で一意にする。画面から保存した記録は NULL のため制約の対象外。
+ALTER TABLE training_records ADD COLUMN IF NOT EXISTS import_key TEXT;
+CREATE UNIQUE INDEX IF NOT EXISTS idx_training_records_user_import_key
+    ON training_records (user_id, import_key);
+
+-- 1件の記録を自己ベストに反映する（0004の行トリガーの処理を関数に切り出したもの）
+CREATE OR REPLACE FUNCTION apply_personal_record(r training_records)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    pr personal_records%ROWTYPE;
+    new_volume DECIMAL := r.weight * r.reps * r.sets;
+    new_e1rm DECIMAL := ROUND(r.weight * (1 + r.reps / 30.0), 2);  -- 保存時の精度で比較する
+BEGIN
+    SELECT * INTO pr FROM personal_records
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO personal_records (
+            user_id, exercise_name,
+            best_weight, best_weight_date, best_reps, best_reps_date,
+            best_volume, best_volume_date, best_e1rm, best_e1rm_date
+        ) VALUES (
+            r.user_id, r.exercise_name,
+            r.weight, r.training_date, r.reps, r.training_date,
+            new_volume, r.training_date, new_e1rm, r.training_date
+        )
+        ON CONFLICT (user_id, exercise_name) DO NOTHING;
+        IF NOT FOUND THEN
+            -- 同時に別の記録が最初の行を作成した場合
+            PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        END IF;
+        RETURN;
+    END IF;
+
+    IF r.training_date < GREATEST(pr.best_weight_date, pr.best_reps_date, pr.best_volume_date, pr.best_e1rm_date) THEN
+        PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        RETURN;
+    END IF;
+
+    UPDATE personal_records SET
+        prev_best_weight = CASE WHEN r.weight > best_weight AND r.training_date > best_weight_date
+                                THEN best_weight ELSE prev_best_weight END,
+        best_weight_date = CASE WHEN r.weight > best_weight THEN r.training_date ELSE best_weight_date END,
+        best_weight = GREATEST(best_weight, r.weight),
+        prev_best_reps = CASE WHEN r.reps > best_reps AND r.training_date > best_reps_date
+                              THEN best_reps ELSE prev_best_reps END,
+        best_reps_date = CASE WHEN r.reps > best_reps THEN r.training_date ELSE best_reps_date END,
+        best_reps = GREATEST(best_reps, r.reps),
+        prev_best_volume = CASE WHEN new_volume > best_volume AND r.training_date > best_volume_date
+                                THEN best_volume ELSE prev_best_volume END,
+        best_volume_date = CASE WHEN new_volume > best_volume THEN r.training_date ELSE best_volume_date END,
+        best_volume = GREATEST(best_volume, new_volume),
+        prev_best_e1rm = CASE WHEN new_e1rm > best_e1rm AND r.training_date > best_e1rm_date
+                              THEN best_e1rm ELSE prev_best_e1rm END,
+        best_e1rm_date = CASE WHEN new_e1rm > best_e1rm THEN r.training_date ELSE best_e1rm_date END,
+        best_e1rm = GREATEST(best_e1rm, new_e1rm),
+        updated_at = NOW()
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name;
+END;
+$$;
+
+-- 挿入文ごとに自己ベストを更新する
+-- 1種目1件（画面からの保存）は行単位の比較で更新し、一括インポートのように
+-- 同じ種目の行がまとめて追加された場合は種目ごとに1回だけ再計算する。
+CREATE OR REPLACE FUNCTION personal_records_after_insert_rows()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    target RECORD;
+BEGIN
+    FOR target IN
+        SELECT n.user_id, n.exercise_name, COUNT(*) AS row_count
+        FROM new_records n
+        GROUP BY n.user_id, n.exercise_name
+    LOOP
+        IF target.row_count = 1 THEN
+            PERFORM apply_personal_record(n::training_records) FROM new_records n
+            WHERE n.user_id = target.user_id AND n.exercise_name = target.exercise_name;
+        ELSE
+            PERFORM refresh_personal_records(target.user_id, target.exercise_name);
+        END IF;
+    END LOOP;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_personal_records_insert ON training_records;
+DROP FUNCTION IF EXISTS personal_records_after_insert();
+CREATE TRIGGER trg_personal_records_insert
+    AFTER INSERT ON training_records
+    REFERENCING NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION personal_records_after_insert_rows();
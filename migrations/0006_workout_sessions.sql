@@ -0,0 +1,218 @@
+-- 0006: セット単位の記録（ワークアウトセッション）
+-- workout_sessions は1回のトレーニング、workout_sets はその中の1セット（セットごとの重量・回数）。
+-- training_records は従来どおり「種目ごとの1行」として残し、セッションから保存した行は
+-- セットを集計した値（最大重量・その重量での最大回数・セット数）と、セット単位で計算した
+-- volume（Σ重量×回数）・e1rm（セットごとの推定1RMの最大値）を持つ。
+-- volume / e1rm が NULL の行は全セット同じ重量・回数として weight × reps × sets などで計算する。
+CREATE TABLE IF NOT EXISTS workout_sessions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID NOT NULL,
+    training_date DATE NOT NULL,
+    notes TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+CREATE INDEX IF NOT EXISTS idx_workout_sessions_user_date ON workout_sessions (user_id, training_date DESC);
+
+ALTER TABLE training_records ADD COLUMN IF NOT EXISTS session_id UUID REFERENCES workout_sessions (id) ON DELETE CASCADE;
+ALTER TABLE training_records ADD COLUMN IF NOT EXISTS volume DECIMAL(12,2);
+ALTER TABLE training_records ADD COLUMN IF NOT EXISTS e1rm DECIMAL(7,2);
+CREATE INDEX IF NOT EXISTS idx_training_records_session ON training_records (session_id);
+
+CREATE TABLE IF NOT EXISTS workout_sets (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    session_id UUID NOT NULL REFERENCES workout_sessions (id) ON DELETE CASCADE,
+    record_id UUID NOT NULL REFERENCES training_records (id) ON DELETE CASCADE,  -- 種目ごとの集計行
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    set_number INTEGER NOT NULL,
+    weight DECIMAL(5,2) NOT NULL,
+    reps INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    UNIQUE (record_id, set_number)
+);
+CREATE INDEX IF NOT EXISTS idx_workout_sets_session ON workout_sets (session_id);
+CREATE INDEX IF NOT EXISTS idx_workout_sets_user_exercise ON workout_sets (user_id, exercise_name);
+
+-- 既存の記録を (ユーザー, 日付) ごとのセッションと、sets 回分の同じ重量・回数のセットに展開する
+WITH new_sessions AS (
+    INSERT INTO workout_sessions (user_id, training_date, created_at, updated_at)
+    SELECT user_id, training_date, MIN(created_at), MAX(updated_at)
+    FROM training_records
+    WHERE session_id IS NULL
+    GROUP BY user_id, training_date
+    RETURNING id, user_id, training_date
+)
+UPDATE training_records r SET session_id = s.id
+FROM new_sessions s
+WHERE r.user_id = s.user_id AND r.training_date = s.training_date AND r.session_id IS NULL;
+
+INSERT INTO workout_sets (session_id, record_id, user_id, exercise_name, set_number, weight, reps, created_at)
+SELECT r.session_id, r.id, r.user_id, r.exercise_name, g.n, r.weight, r.reps, r.created_at
+FROM training_records r
+CROSS JOIN LATERAL generate_series(1, r.sets) AS g(n)
+WHERE NOT EXISTS (SELECT 1 FROM workout_sets s WHERE s.record_id = r.id);
+
+-- セッションを1回の呼び出しで保存する（セッション・種目ごとの集計行・セットを1トランザクションで挿入）
+-- p_sets は [{"exercise_name": ..., "weight": ..., "reps": ...}, ...]（配列の順がセットの順）。
+-- p_session_id はクライアントで生成したUUIDで、同じIDで再送した場合は保存済みの集計行を返す。
+CREATE OR REPLACE FUNCTION save_workout_session(
+    p_session_id UUID, p_user_id UUID, p_training_date DATE, p_notes TEXT, p_sets JSONB
+)
+RETURNS SETOF training_records
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO workout_sessions (id, user_id, training_date, notes)
+    VALUES (p_session_id, p_user_id, p_training_date, p_notes)
+    ON CONFLICT (id) DO NOTHING;
+    IF NOT FOUND THEN
+        RETURN QUERY SELECT * FROM training_records WHERE session_id = p_session_id AND user_id = p_user_id;
+        RETURN;
+    END IF;
+
+    RETURN QUERY
+    WITH entered AS (
+        SELECT s.exercise_name, s.weight, s.reps, s.position
+        FROM ROWS FROM (jsonb_to_recordset(p_sets) AS (exercise_name TEXT, weight DECIMAL(5,2), reps INTEGER))
+             WITH ORDINALITY AS s(exercise_name, weight, reps, position)
+    ), inserted AS (
+        INSERT INTO training_records (user_id, training_date, exercise_name, weight, reps, sets, notes,
+                                      session_id, volume, e1rm)
+        SELECT p_user_id, p_training_date, i.exercise_name,
+               MAX(i.weight), (ARRAY_AGG(i.reps ORDER BY i.weight DESC, i.reps DESC))[1], COUNT(*), p_notes,
+               p_session_id, SUM(i.weight * i.reps), MAX(ROUND(i.weight * (1 + i.reps / 30.0), 2))
+        FROM entered i
+        GROUP BY i.exercise_name
+        RETURNING *
+    ), inserted_sets AS (
+        INSERT INTO workout_sets (session_id, record_id, user_id, exercise_name, set_number, weight, reps)
+        SELECT p_session_id, r.id, p_user_id, i.exercise_name,
+               ROW_NUMBER() OVER (PARTITION BY i.exercise_name ORDER BY i.position), i.weight, i.reps
+        FROM entered i
+        JOIN inserted r ON r.exercise_name = i.exercise_name
+    )
+    SELECT * FROM inserted;
+END;
+$$;
+
+-- 自己ベストの計算でセット単位の volume / e1rm を使う（NULLの行は従来どおり計算する）
+CREATE OR REPLACE FUNCTION refresh_personal_records(p_user_id UUID DEFAULT NULL, p_exercise_name TEXT DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    DELETE FROM personal_records pr
+    WHERE (p_user_id IS NULL OR pr.user_id = p_user_id)
+      AND (p_exercise_name IS NULL OR pr.exercise_name = p_exercise_name);
+
+    INSERT INTO personal_records (
+        user_id, exercise_name,
+        best_weight, best_weight_date, prev_best_weight,
+        best_reps, best_reps_date, prev_best_reps,
+        best_volume, best_volume_date, prev_best_volume,
+        best_e1rm, best_e1rm_date, prev_best_e1rm
+    )
+    WITH daily AS (
+        SELECT r.user_id, r.exercise_name, r.training_date,
+               MAX(r.weight) AS weight,
+               MAX(r.reps) AS reps,
+               MAX(COALESCE(r.volume, r.weight * r.reps * r.sets)) AS volume,
+               MAX(COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2))) AS e1rm
+        FROM training_records r
+        WHERE (p_user_id IS NULL OR r.user_id = p_user_id)
+          AND (p_exercise_name IS NULL OR r.exercise_name = p_exercise_name)
+        GROUP BY r.user_id, r.exercise_name, r.training_date
+    ), running AS (
+        -- 各日について「その日より前の最高値」を求める
+        SELECT d.*,
+               MAX(d.weight) OVER earlier AS weight_before,
+               MAX(d.reps) OVER earlier AS reps_before,
+               MAX(d.volume) OVER earlier AS volume_before,
+               MAX(d.e1rm) OVER earlier AS e1rm_before
+        FROM daily d
+        WINDOW earlier AS (PARTITION BY d.user_id, d.exercise_name ORDER BY d.training_date
+                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING)
+    )
+    SELECT user_id, exercise_name,
+           MAX(weight), (ARRAY_AGG(training_date ORDER BY weight DESC, training_date))[1],
+           (ARRAY_AGG(weight_before ORDER BY weight DESC, training_date))[1],
+           MAX(reps), (ARRAY_AGG(training_date ORDER BY reps DESC, training_date))[1],
+           (ARRAY_AGG(reps_before ORDER BY reps DESC, training_date))[1],
+           MAX(volume), (ARRAY_AGG(training_date ORDER BY volume DESC, training_date))[1],
+           (ARRAY_AGG(volume_before ORDER BY volume DESC, training_date))[1],
+           MAX(e1rm), (ARRAY_AGG(training_date ORDER BY e1rm DESC, training_date))[1],
+           (ARRAY_AGG(e1rm_before ORDER BY e1rm DESC, training_date))[1]
+    FROM running
+    GROUP BY user_id, exercise_name;
+
+    GET DIAGNOSTICS affected = ROW_COUNT;
+    RETURN affected;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION apply_personal_record(r training_records)
+RETURNS VOID
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    pr personal_records%ROWTYPE;
+    new_volume DECIMAL := COALESCE(r.volume, r.weight * r.reps * r.sets);
+    new_e1rm DECIMAL := COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2));  -- 保存時の精度で比較する
+BEGIN
+    SELECT * INTO pr FROM personal_records
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO personal_records (
+            user_id, exercise_name,
+            best_weight, best_weight_date, best_reps, best_reps_date,
+            best_volume, best_volume_date, best_e1rm, best_e1rm_date
+        ) VALUES (
+            r.user_id, r.exercise_name,
+            r.weight, r.training_date, r.reps, r.training_date,
+            new_volume, r.training_date, new_e1rm, r.training_date
+        )
+        ON CONFLICT (user_id, exercise_name) DO NOTHING;
+        IF NOT FOUND THEN
+            -- 同時に別の記録が最初の行を作成した場合
+            PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        END IF;
+        RETURN;
+    END IF;
+
+    IF r.training_date < GREATEST(pr.best_weight_date, pr.best_reps_date, pr.best_volume_date, pr.best_e1rm_date) THEN
+        PERFORM refresh_personal_records(r.user_id, r.exercise_name);
+        RETURN;
+    END IF;
+
+    UPDATE personal_records SET
+        prev_best_weight = CASE WHEN r.weight > best_weight AND r.training_date > best_weight_date
+                                THEN best_weight ELSE prev_best_weight END,
+        best_weight_date = CASE WHEN r.weight > best_weight THEN r.training_date ELSE best_weight_date END,
+        best_weight = GREATEST(best_weight, r.weight),
+        prev_best_reps = CASE WHEN r.reps > best_reps AND r.training_date > best_reps_date
+                              THEN best_reps ELSE prev_best_reps END,
+        best_reps_date = CASE WHEN r.reps > best_reps THEN r.training_date ELSE best_reps_date END,
+        best_reps = GREATEST(best_reps, r.reps),
+        prev_best_volume = CASE WHEN new_volume > best_volume AND r.training_date > best_volume_date
+                                THEN best_volume ELSE prev_best_volume END,
+        best_volume_date = CASE WHEN new_volume > best_volume THEN r.training_date ELSE best_volume_date END,
+        best_volume = GREATEST(best_volume, new_volume),
+        prev_best_e1rm = CASE WHEN new_e1rm > best_e1rm AND r.training_date > best_e1rm_date
+                              THEN best_e1rm ELSE prev_best_e1rm END,
+        best_e1rm_date = CASE WHEN new_e1rm > best_e1rm THEN r.training_date ELSE best_e1rm_date END,
+        best_e1rm = GREATEST(best_e1rm, new_e1rm),
+        updated_at = NOW()
+    WHERE user_id = r.user_id AND exercise_name = r.exercise_name;
+END;
+$$;
+
+-- volume / e1rm の修正も自己ベストの再計算の対象にする
+DROP TRIGGER IF EXISTS trg_personal_records_change ON training_records;
+CREATE TRIGGER trg_personal_records_change
+    AFTER UPDATE OF user_id, exercise_name, training_date, weight, reps, sets, volume, e1rm OR DELETE ON training_records
+    FOR EACH ROW EXECUTE FUNCTION personal_records_after_change();
@@ -0,0 +1,191 @@
+-- 0007: ランキング・コホート比較用の週次ロールアップ
+-- weekly_exercise_rollups はユーザー×種目×週（月曜始まり）ごとの推定1RMの最高値とボリューム合計。
+-- training_records への書き込みではトリガーで (ユーザー, 種目, 週) を rollup_dirty_weeks に記録するだけにし、
+-- 定期実行する refresh_weekly_rollups() が記録のあった週だけを集計し直す（全ユーザーの履歴は走査しない）。
+-- ランキングは cohort_members（ジム・チームなどの参加コードごとの参加者）に絞り、
+-- 種目・週・値の降順のインデックスから上位N件を求める（走査量はインデックスの説明を参照）。
+-- 定期実行は scripts/refresh_rollups.py を cron などから呼ぶか、pg_cron が使える場合は
+--   SELECT cron.schedule('refresh-weekly-rollups', '*/10 * * * *', 'SELECT refresh_weekly_rollups()');
+
+CREATE TABLE IF NOT EXISTS weekly_exercise_rollups (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    week_start DATE NOT NULL,
+    best_e1rm DECIMAL(7,2) NOT NULL,
+    total_volume DECIMAL(14,2) NOT NULL,
+    training_days INTEGER NOT NULL,
+    refreshed_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (user_id, exercise_name, week_start)
+);
+-- 上位N件の読み取り用（種目・週ごとに値の降順で並ぶ）。走査が LIMIT で止まるのは、この順に読みながら
+-- cohort_members を1行ずつ引く計画（その週の行に占める参加者の割合が高い参加コード）のときだけ。
+-- 参加者の少ない参加コードでは、種目・週の範囲の行をすべて読んで参加者と結合し、並べ替えてから LIMIT を適用する
+-- （読む行数はその種目・週の行数までで、履歴の長さには依存しない）。
+CREATE INDEX IF NOT EXISTS idx_weekly_rollups_e1rm ON weekly_exercise_rollups (exercise_name, week_start, best_e1rm DESC);
+CREATE INDEX IF NOT EXISTS idx_weekly_rollups_volume ON weekly_exercise_rollups (exercise_name, week_start, total_volume DESC);
+
+-- 集計し直す必要のある (ユーザー, 種目, 週)
+CREATE TABLE IF NOT EXISTS rollup_dirty_weeks (
+    user_id UUID NOT NULL,
+    exercise_name TEXT NOT NULL,
+    week_start DATE NOT NULL,
+    PRIMARY KEY (user_id, exercise_name, week_start)
+);
+
+CREATE TABLE IF NOT EXISTS cohort_members (
+    cohort TEXT NOT NULL,  -- 参加コード（同じコードを入力したユーザー同士で比較する）
+    user_id UUID NOT NULL,
+    display_name TEXT NOT NULL,  -- ランキングに表示する名前
+    joined_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    PRIMARY KEY (cohort, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_cohort_members_user ON cohort_members (user_id);
+
+-- 書き込みのあった週を記録する（文単位。変更前後の週の両方を対象にする）
+CREATE OR REPLACE FUNCTION mark_rollup_weeks_dirty()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO rollup_dirty_weeks (user_id, exercise_name, week_start)
+        SELECT DISTINCT n.user_id, n.exercise_name, date_trunc('week', n.training_date)::date FROM new_records n
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO rollup_dirty_weeks (user_id, exercise_name, week_start)
+        SELECT DISTINCT o.user_id, o.exercise_name, date_trunc('week', o.training_date)::date FROM old_records o
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_insert ON training_records;
+CREATE TRIGGER trg_rollup_weeks_insert
+    AFTER INSERT ON training_records
+    REFERENCING NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_update ON training_records;
+CREATE TRIGGER trg_rollup_weeks_update
+    AFTER UPDATE ON training_records
+    REFERENCING OLD TABLE AS old_records NEW TABLE AS new_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+DROP TRIGGER IF EXISTS trg_rollup_weeks_delete ON training_records;
+CREATE TRIGGER trg_rollup_weeks_delete
+    AFTER DELETE ON training_records
+    REFERENCING OLD TABLE AS old_records
+    FOR EACH STATEMENT EXECUTE FUNCTION mark_rollup_weeks_dirty();
+
+-- 記録のあった週だけを集計し直し、処理した (ユーザー, 種目, 週) の数を返す
+-- 実行中に追加された記録は rollup_dirty_weeks に残り、次回の実行で反映される。
+CREATE OR REPLACE FUNCTION refresh_weekly_rollups()
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    affected INTEGER;
+BEGIN
+    CREATE TEMP TABLE IF NOT EXISTS refresh_rollup_keys (
+        user_id UUID, exercise_name TEXT, week_start DATE
+    ) ON COMMIT DROP;
+    TRUNCATE refresh_rollup_keys;
+
+    WITH taken AS (
+        DELETE FROM rollup_dirty_weeks RETURNING user_id, exercise_name, week_start
+    )
+    INSERT INTO refresh_rollup_keys SELECT * FROM taken;
+    GET DIAGNOSTICS affected = ROW_COUNT;
+
+    DELETE FROM weekly_exercise_rollups w
+    USING refresh_rollup_keys k
+    WHERE w.user_id = k.user_id AND w.exercise_name = k.exercise_name AND w.week_start = k.week_start;
+
+    -- 推定1RM・ボリュームはセット単位の値があればそれを使う（personal_records と同じ計算）
+    INSERT INTO weekly_exercise_rollups (user_id, exercise_name, week_start, best_e1rm, total_volume, training_days)
+    SELECT k.user_id, k.exercise_name, k.week_start,
+           MAX(COALESCE(r.e1rm, ROUND(r.weight * (1 + r.reps / 30.0), 2))),
+           SUM(COALESCE(r.volume, r.weight * r.reps * r.sets)),
+           COUNT(DISTINCT r.training_date)
+    FROM refresh_rollup_keys k
+    JOIN training_records r
+      ON r.user_id = k.user_id AND r.exercise_name = k.exercise_name
+     AND r.training_date >= k.week_start AND r.training_date < k.week_start + 7
+    GROUP BY k.user_id, k.exercise_name, k.week_start;
+
+    RETURN affected;
+END;
+$$;
+
+-- 既存の記録を集計する
+INSERT INTO rollup_dirty_weeks (user_id, exercise_name, week_start)
+SELECT DISTINCT user_id, exercise_name, date_trunc('week', training_date)::date FROM training_records
+ON CONFLICT DO NOTHING;
+SELECT refresh_weekly_rollups();
+
+-- 参加コード・種目・週ごとの上位 p_limit 件（最大100件）。p_metric は 'e1rm' または 'volume'
+-- is_self は p_user_id の行か（他の参加者のユーザーIDは返さない）
+CREATE OR REPLACE FUNCTION cohort_leaderboard(
+    p_cohort TEXT, p_exercise TEXT, p_week_start DATE, p_metric TEXT DEFAULT 'e1rm',
+    p_user_id UUID DEFAULT NULL, p_limit INTEGER DEFAULT 10
+)
+RETURNS TABLE (rank BIGINT, display_name TEXT, value DECIMAL, training_days INTEGER, is_self BOOLEAN)
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+    IF p_metric = 'volume' THEN
+        RETURN QUERY
+        SELECT RANK() OVER (ORDER BY w.total_volume DESC), m.display_name, w.total_volume, w.training_days,
+               COALESCE(w.user_id = p_user_id, FALSE)
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+        ORDER BY w.total_volume DESC
+        LIMIT LEAST(p_limit, 100);
+    ELSE
+        RETURN QUERY
+        SELECT RANK() OVER (ORDER BY w.best_e1rm DESC), m.display_name, w.best_e1rm, w.training_days,
+               COALESCE(w.user_id = p_user_id, FALSE)
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+        ORDER BY w.best_e1rm DESC
+        LIMIT LEAST(p_limit, 100);
+    END IF;
+END;
+$$;
+
+-- p_user_id の順位（自分より値の大きい参加者の数 + 1）と参加者数。その週の記録が無ければ value / rank は NULL
+-- 順位の計算は値の降順のインデックスで自分より上の行だけを数える。
+CREATE OR REPLACE FUNCTION cohort_position(
+    p_cohort TEXT, p_exercise TEXT, p_week_start DATE, p_metric TEXT, p_user_id UUID
+)
+RETURNS TABLE (rank BIGINT, members BIGINT, value DECIMAL)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    own DECIMAL;
+    above BIGINT;
+BEGIN
+    SELECT CASE WHEN p_metric = 'volume' THEN w.total_volume ELSE w.best_e1rm END INTO own
+    FROM weekly_exercise_rollups w
+    WHERE w.user_id = p_user_id AND w.exercise_name = p_exercise AND w.week_start = p_week_start;
+
+    IF own IS NOT NULL AND p_metric = 'volume' THEN
+        SELECT COUNT(*) INTO above
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start AND w.total_volume > own;
+    ELSIF own IS NOT NULL THEN
+        SELECT COUNT(*) INTO above
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start AND w.best_e1rm > own;
+    END IF;
+
+    RETURN QUERY
+    SELECT above + 1, (SELECT COUNT(*) FROM cohort_members m WHERE m.cohort = p_cohort), own;
+END;
+$$;
@@ -0,0 +1,29 @@
+-- 0008: cohort_position の順位と参加者数を、その週の記録がある参加者だけから求める
+-- 参加者数はその週にこの種目の記録がある参加者の数とする（記録の無い参加者は「N人中」に含めない）。
+-- 順位と参加者数は、ランキングと同じ「種目・週で絞った参加者の行」を1回走査して同時に数える
+-- （自分より上の行を別に数えないため、順位が低いユーザーでも走査量は参加者数で決まる）。
+
+CREATE OR REPLACE FUNCTION cohort_position(
+    p_cohort TEXT, p_exercise TEXT, p_week_start DATE, p_metric TEXT, p_user_id UUID
+)
+RETURNS TABLE (rank BIGINT, members BIGINT, value DECIMAL)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+    own DECIMAL;
+BEGIN
+    SELECT CASE WHEN p_metric = 'volume' THEN w.total_volume ELSE w.best_e1rm END INTO own
+    FROM weekly_exercise_rollups w
+    WHERE w.user_id = p_user_id AND w.exercise_name = p_exercise AND w.week_start = p_week_start;
+
+    RETURN QUERY
+    SELECT CASE WHEN own IS NULL THEN NULL ELSE COUNT(*) FILTER (WHERE scoped.value > own) + 1 END,
+           COUNT(*), own
+    FROM (
+        SELECT CASE WHEN p_metric = 'volume' THEN w.total_volume ELSE w.best_e1rm END AS value
+        FROM weekly_exercise_rollups w
+        JOIN cohort_members m ON m.cohort = p_cohort AND m.user_id = w.user_id
+        WHERE w.exercise_name = p_exercise AND w.week_start = p_week_start
+    ) scoped;
+END;
+$$;
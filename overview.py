@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+# --- 全種目の概要（カレンダー・種目ごとの推移・週ごとのボリューム） ---
+# 記録ストアの全履歴を1回の groupby で (記録日, 種目) ごとの集計表にし、
+# 3つの表示はすべてこの集計表の pivot / resample から作る（種目ごとに履歴を集計し直さない）。
+# 種目を並べて表示しても、集計は全種目まとめての1回、図は表示ごとに1枚で済む。
+import numpy as np
+import pandas as pd
+
+from analytics import add_e1rm
+from charts import AGGREGATION_LEVELS, MAX_CHART_POINTS, METRIC_AGGREGATIONS, add_volume, downsample_series
+
+# カレンダーに表示する週数（GitHubの草と同じく約1年分）
+CALENDAR_WEEKS = 53
+# 推移・ボリュームで個別に表示する種目数（記録日数の多い順。ボリュームではそれ以外を「その他」にまとめる）
+MAX_OVERVIEW_EXERCISES = 12
+OTHER_EXERCISES_LABEL = "その他"
+WEEKLY_VOLUME_WEEKS = 26
+WEEKDAY_LABELS = ["月", "火", "水", "木", "金", "土", "日"]
+# 推移の集計単位（集計表は1日1点のため「記録ごと」は「トレーニング日ごと」と同じになり、選択肢から外す）
+OVERVIEW_LEVELS = [label for label, freq in AGGREGATION_LEVELS.items() if freq is not None]
+
+
+def daily_summary(df):
+    """(training_date, exercise_name) ごとの重量・回数・推定1RMの最大値とボリュームの合計"""
+    df = add_e1rm(add_volume(df.dropna(subset=['weight', 'reps', 'sets'])))
+    daily = df.groupby(['training_date', 'exercise_name'], observed=True, sort=True).agg(
+        weight=('weight', 'max'), reps=('reps', 'max'), volume=('volume', 'sum'), e1rm=('e1rm', 'max'))
+    daily = daily.reset_index()
+    daily['exercise_name'] = daily['exercise_name'].astype(str)
+    return daily
+
+
+def top_exercises(daily, limit=MAX_OVERVIEW_EXERCISES):
+    """記録日数の多い順の種目名（同数なら名前順）"""
+    counts = daily['exercise_name'].value_counts()
+    order = sorted(counts.index, key=lambda name: (-counts[name], name))
+    return order[:limit]
+
+
+def calendar_matrix(daily, end_date, weeks=CALENDAR_WEEKS):
+    """(曜日×週のボリューム合計の行列, 各週の開始日) を返す
+
+    記録の無い日は0、end_date より後の日は NaN（描画しない）。"""
+    end = pd.Timestamp(end_date).normalize()
+    start = end - pd.Timedelta(days=end.weekday()) - pd.Timedelta(weeks=weeks - 1)
+    days = pd.date_range(start, periods=weeks * 7, freq='D')
+    totals = daily.groupby('training_date')['volume'].sum().reindex(days, fill_value=0.0)
+    values = totals.to_numpy(dtype=np.float64)
+    values[days > end] = np.nan
+    return values.reshape(weeks, 7).T, days[::7]
+
+
+def exercise_trends(daily, metric, level, exercises, max_points=MAX_CHART_POINTS):
+    """種目ごとの推移（training_date / exercise_name / metric の縦持ち）
+
+    集計表を種目を列にした表へ pivot し、全種目まとめて集計単位ごとに resample する。"""
+    table = daily[daily['exercise_name'].isin(exercises)]\
+        .pivot(index='training_date', columns='exercise_name', values=metric)
+    table = table[[name for name in exercises if name in table.columns]]
+    freq = AGGREGATION_LEVELS.get(level)
+    if freq not in (None, 'D') and not table.empty:
+        resampler = table.resample(freq, label='left', closed='left')
+        # 記録の無い期間は描画しない（合計は0ではなくNaNにする）
+        table = resampler.sum(min_count=1) if METRIC_AGGREGATIONS[metric] == 'sum' else resampler.max()
+    trends = table.reset_index().melt(id_vars='training_date', var_name='exercise_name', value_name=metric)\
+        .dropna(subset=[metric])
+    # 1種目あたりの点数は単独のグラフと同じ上限まで間引く
+    parts = [downsample_series(group.reset_index(drop=True), metric, max_points)
+             for _, group in trends.groupby('exercise_name', sort=False)]
+    if not parts:
+        return trends
+    return pd.concat(parts, ignore_index=True)
+
+
+def weekly_volume(daily, end_date, exercises, weeks=WEEKLY_VOLUME_WEEKS):
+    """直近 weeks 週の週ごと・種目ごとのボリューム（week / exercise_name / volume の縦持ち）
+
+    exercises 以外の種目は「その他」にまとめる。積み上げの順は exercises の順（その他は最後）。"""
+    end = pd.Timestamp(end_date).normalize()
+    start = end - pd.Timedelta(days=end.weekday()) - pd.Timedelta(weeks=weeks - 1)
+    recent = daily[(daily['training_date'] >= start) & (daily['training_date'] <= end)]
+    names = recent['exercise_name'].where(recent['exercise_name'].isin(exercises), OTHER_EXERCISES_LABEL)
+    table = recent.assign(exercise_name=names)\
+        .pivot_table(index='training_date', columns='exercise_name', values='volume', aggfunc='sum')
+    if table.empty:
+        return pd.DataFrame(columns=['week', 'exercise_name', 'volume'])
+    table = table[[name for name in (*exercises, OTHER_EXERCISES_LABEL) if name in table.columns]]
+    table = table.resample('W-MON', label='left', closed='left').sum()
+    table.index.name = 'week'
+    volume = table.reset_index().melt(id_vars='week', var_name='exercise_name', value_name='volume')
+    return volume[volume['volume'] > 0].reset_index(drop=True)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# --- 過去の記録 (リスト表示) のサーバー側ページング ---
+# (training_date, id) の降順によるキーセットページングで1ページ分だけを取得する。
+# OFFSETを使わないため、履歴が長くても後ろのページの取得コストは変わらない。
+from query_compat import or_filter, order_by, page_range
+
+DEFAULT_PAGE_SIZE = 50
+PAGE_SIZE_OPTIONS = [25, 50, 100, 200]
+LIST_COLUMNS = 'id,training_date,exercise_name,weight,reps,sets,notes'
+
+
+def fetch_records_page(client, user_id, start_date, end_date, exercise_name=None,
+                       page_size=DEFAULT_PAGE_SIZE, cursor=None, with_count=False):
+    """1ページ分の記録を取得する。
+
+    cursor は直前のページ末尾の (training_date, id)。戻り値は
+    (行のリスト, 次ページのcursorまたはNone, 総件数またはNone)。
+    """
+    query = client.table('training_records')\
+        .select(LIST_COLUMNS, count='exact' if with_count else None)\
+        .eq('user_id', user_id)\
+        .gte('training_date', str(start_date))\
+        .lte('training_date', str(end_date))
+    if exercise_name:
+        query = query.eq('exercise_name', exercise_name)
+    if cursor:
+        cursor_date, cursor_id = cursor
+        query = or_filter(
+            query,
+            f"training_date.lt.{cursor_date},and(training_date.eq.{cursor_date},id.lt.{cursor_id})"
+        )
+    response = page_range(order_by(query, 'training_date.desc', 'id.desc'), 0, page_size).execute()
+    rows = response.data or []
+    next_cursor = (rows[-1]['training_date'], rows[-1]['id']) if len(rows) == page_size else None
+    return rows, next_cursor, response.count
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+# --- 自己ベスト（personal_records テーブル）の参照 ---
+# personal_records は training_records への書き込み時にトリガーで更新される
+# （migrations/0004_personal_records.sql）。成長フィードバックでは履歴を走査せず、
+# 今日の種目の行を主キーでまとめて1回取得する。
+import pandas as pd
+
+PR_METRICS = ("weight", "reps", "volume", "e1rm")
+
+
+def _to_number(value):
+    number = pd.to_numeric(value, errors='coerce')
+    return None if pd.isna(number) else number
+
+
+def fetch_personal_records(client, user_id, exercise_names=None):
+    """種目名 -> personal_records の行の辞書を返す（テーブル未作成の環境では例外を送出する）
+
+    exercise_names を省略するとユーザーの全種目分を返す（種目数分の行のみ）。"""
+    query = client.table('personal_records').select('*').eq('user_id', user_id)
+    if exercise_names is not None:
+        names = sorted({name for name in exercise_names if name})
+        if not names:
+            return {}
+        query = query.in_('exercise_name', names)
+    response = query.execute()
+    return {row['exercise_name']: row for row in response.data or []}
+
+
+def best_before(record, metric, day):
+    """day当日の記録を除いた自己ベストを返す（最高値の記録日がdayなら、それより前の最高値）"""
+    if not record:
+        return None
+    best_date = record.get(f'best_{metric}_date')
+    if best_date is not None and str(best_date)[:10] == day.isoformat():
+        return _to_number(record.get(f'prev_best_{metric}'))
+    return _to_number(record.get(f'best_{metric}'))
+
+
+def apply_personal_records(baselines, records, day):
+    """前回記録の集計結果の自己ベスト（重量・回数）を personal_records の値で置き換える"""
+    for exercise, record in records.items():
+        baseline = baselines.setdefault(exercise, {"prev_date": None, "prev_weight": None, "prev_reps": None})
+        baseline["best_weight"] = best_before(record, "weight", day)
+        baseline["best_reps"] = best_before(record, "reps", day)
+    return baselines
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# --- 起動時間の計測 ---
+# 環境変数 STARTUP_PROFILE=1 のときだけ、スクリプト実行ごとに
+# import単位・処理単位の所要時間を記録し、ログとサイドバーに出力する。
+# （標準ライブラリのみに依存し、app.py の最初に読み込む）
+import importlib
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STARTUP_PROFILE_ENABLED = os.environ.get("STARTUP_PROFILE", "").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger(__name__)
+_local = threading.local()
+
+
+def _records():
+    if not hasattr(_local, "records"):
+        _local.records = []
+    return _local.records
+
+
+def start_run():
+    """スクリプト実行の開始時に呼び、前回の計測結果を破棄する"""
+    _local.records = []
+    _local.started = time.perf_counter()
+
+
+def _record(label, seconds, cached):
+    _records().append({"処理": label, "時間 (ms)": round(seconds * 1000, 1), "読み込み済み": cached})
+
+
+@contextmanager
+def timed(label):
+    """任意の処理の所要時間を記録する"""
+    if not STARTUP_PROFILE_ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(label, time.perf_counter() - start, False)
+
+
+@contextmanager
+def timed_import(label):
+    """ブロック内の import の所要時間を記録する（依存先の読み込み時間を含む）
+
+    builtins.__import__ は差し替えず、計測する import を明示的に囲む。
+    ブロック内で新たに読み込んだモジュールが無ければ「読み込み済み」とする。"""
+    if not STARTUP_PROFILE_ENABLED:
+        yield
+        return
+    loaded = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(f"import {label}", time.perf_counter() - start, len(sys.modules) == loaded)
+
+
+def lazy_import(module_name):
+    """使用するページで初めてモジュールを読み込む（計測が有効なら所要時間も記録する）"""
+    if not STARTUP_PROFILE_ENABLED:
+        return importlib.import_module(module_name)
+    cached = module_name in sys.modules
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _record(f"import {module_name}", time.perf_counter() - start, cached)
+    return module
+
+
+def report():
+    """今回のスクリプト実行の計測結果（行のリスト）を返し、ログにも出力する"""
+    records = list(_records())
+    total = time.perf_counter() - getattr(_local, "started", time.perf_counter())
+    lines = [f"{r['処理']}: {r['時間 (ms)']} ms{' (読み込み済み)' if r['読み込み済み'] else ''}" for r in records]
+    logger.info("startup profile (total %.1f ms)\n%s", total * 1000, "\n".join(lines))
+    return records, total
@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+# --- postgrest-py 0.10系（supabase==1.0.3）との互換ヘルパー ---
+# 0.10系には or_ が無く、order() を重ねると order パラメータが重複して
+# PostgREST側では1つしか解釈されないため、パラメータを直接組み立てる。
+
+# テーブル・ビューが未作成であることを示すエラーコード
+# （PostgREST 13以降は PGRST205、それ以前・PostgreSQLへの直接接続では undefined_table の 42P01）
+MISSING_RELATION_CODES = {"PGRST205", "42P01"}
+
+
+def or_filter(query, expression):
+    """or=(expression) フィルタを追加する"""
+    if hasattr(query, 'or_'):
+        return query.or_(expression)
+    query.params = query.params.add('or', f"({expression})")
+    return query
+
+
+def order_by(query, *columns):
+    """複数列の並び順を1つの order パラメータとして指定する（例: 'training_date.desc', 'id.desc'）"""
+    query.params = query.params.add('order', ",".join(columns))
+    return query
+
+
+def page_range(query, offset, size):
+    """offset 件目から size 件を取得する（キーセットページングでは offset=0）
+
+    0.10系の range(start, end) は end を含まない（Range: start-(end-1) を送る）ため、
+    range(offset, offset + size - 1) では1件少なく返り、「件数が足りなければ最後のページ」の判定で打ち切られる。"""
+    return query.range(offset, offset + size)
+
+
+def is_missing_relation(error):
+    """未作成のテーブル・ビュー（マイグレーション未適用）を参照したエラーか"""
+    code = getattr(error, 'code', None) or getattr(error, 'sqlstate', None)
+    return code in MISSING_RELATION_CODES
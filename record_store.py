@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+# --- セッション単位のトレーニング記録ストア ---
+# ログインユーザーの履歴を最初に1度だけ取得して列指向のDataFrameとして保持し、
+# 以降は updated_at が取得済みの最大値（ウォーターマーク）以降の行だけを差分取得する。
+# 各ページの絞り込みはこのDataFrameに対して行うため、ページ切り替えで通信は発生しない。
+# グラフ表示用の種目ごとの系列（volume / e1rm 列付き）と、そこから求めた集計結果も保持し、
+# 差分同期で追加された行は系列の末尾に足すだけにする（表示モードの切り替えでは再計算しない）。
+# 種目ごとのデータのバージョンは記録の追加・修正を反映するたびに進め、グラフの図のキャッシュのキーに使う。
+# 同期は ConcurrentQueries のワーカースレッドから呼ばれるため、同期と反映はストアのロックの下で行う
+# （期限切れで結果を待たなくなった同期が残っていても、次の同期はその完了を待ってから判断する）。
+import math
+import threading
+import time
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from analytics import add_e1rm
+from charts import add_volume
+from query_compat import order_by, page_range
+
+RECORD_COLUMNS = ['id', 'training_date', 'exercise_name', 'weight', 'reps', 'sets',
+                  'notes', 'created_at', 'updated_at', 'session_id', 'volume', 'e1rm']
+# 1リクエストあたりの取得件数（PostgRESTの既定上限に合わせる）
+FETCH_PAGE_SIZE = 1000
+# 他端末での追加を取り込むための差分同期の間隔（秒）
+SYNC_INTERVAL_SECONDS = 300
+
+
+def _normalize(df):
+    df = df.reindex(columns=RECORD_COLUMNS)
+    df['training_date'] = pd.to_datetime(df['training_date'])
+    df['exercise_name'] = df['exercise_name'].astype('category')
+    df['weight'] = pd.to_numeric(df['weight'], errors='coerce')
+    df['reps'] = pd.to_numeric(df['reps'], errors='coerce')
+    df['sets'] = pd.to_numeric(df['sets'], errors='coerce')
+    # セット単位で記録した行のみ値を持つ（それ以外はNaN。charts / analytics で weight・reps・sets から補う）
+    df['volume'] = pd.to_numeric(df['volume'], errors='coerce')
+    df['e1rm'] = pd.to_numeric(df['e1rm'], errors='coerce')
+    df['notes'] = df['notes'].fillna("")
+    return df
+
+
+def _with_derived(df):
+    # 重量・回数・セット数が揃った行に、グラフ用の派生列を付ける（行ごとの計算なので追加分だけ計算できる）
+    df = df.dropna(subset=['weight', 'reps', 'sets'])
+    return add_e1rm(add_volume(df)).reset_index(drop=True)
+
+
+class RecordStore:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.frame = _normalize(pd.DataFrame(columns=RECORD_COLUMNS))
+        self.watermark = None  # 取得済みの最大 updated_at（ISO文字列）
+        self._synced_at = None
+        self._series = {}  # 種目名 -> series() の結果
+        self._derived = {}  # 種目名 -> {キー: derived() の結果}
+        # ストアごとに異なる値（同じユーザーの別セッションのストアとバージョンが衝突しないようにする）
+        self._generation = uuid.uuid4().hex
+        self._versions = {}  # 種目名 -> 記録が追加・修正された回数
+        self._derived_all = {}  # キー -> derived_all() の結果（全種目の記録から作るもの）
+        self._merges = 0  # 記録が追加・修正された回数（全種目）
+        self._lock = threading.RLock()
+
+    def sync(self, client, force=False):
+        """前回同期から一定時間経過していれば、ウォーターマーク以降の行だけを取得して反映する
+
+        他のスレッドで同期中の場合はその完了を待ち、その結果が新しければ取得しない。"""
+        with self._lock:
+            if not force and self._synced_at is not None \
+                    and time.monotonic() - self._synced_at < SYNC_INTERVAL_SECONDS:
+                return 0
+            rows = []
+            offset = 0
+            while True:
+                query = client.table('training_records').select('*').eq('user_id', self.user_id)
+                if self.watermark:
+                    # 同一時刻の取りこぼしを防ぐため gte で取得し、idで重複を除く
+                    query = query.gte('updated_at', self.watermark)
+                response = page_range(order_by(query, 'updated_at', 'id'), offset, FETCH_PAGE_SIZE).execute()
+                page = response.data or []
+                rows.extend(page)
+                if len(page) < FETCH_PAGE_SIZE:
+                    break
+                offset += FETCH_PAGE_SIZE
+            self.merge(rows)
+            self._synced_at = time.monotonic()
+            return len(rows)
+
+    @property
+    def sync_timeout(self):
+        """ConcurrentQueries で sync() を実行するときの期限（秒）。None はバッチの既定値
+
+        初回の全件取得は履歴の件数に比例してページ数が増えるため、期限を付けない。"""
+        return math.inf if self.watermark is None else None
+
+    def merge(self, rows, advance_watermark=True):
+        """取得・保存した行をストアに反映する（同じidの行は新しい内容で置き換える）"""
+        if not rows:
+            return
+        incoming = _normalize(pd.DataFrame(rows))
+        with self._lock:
+            if advance_watermark:
+                latest = incoming['updated_at'].dropna().max()
+                if isinstance(latest, str) and (self.watermark is None or latest > self.watermark):
+                    self.watermark = latest
+            self._update_series(incoming)
+            self._derived_all.clear()
+            self._merges += 1
+            frame = pd.concat([self.frame.astype({'exercise_name': object}),
+                               incoming.astype({'exercise_name': object})], ignore_index=True)
+            frame = frame.drop_duplicates(subset='id', keep='last')
+            self.frame = _normalize(frame.reset_index(drop=True))
+
+    def _update_series(self, incoming):
+        """merge() の前に呼び、保持している種目ごとの系列に新しい行を反映する"""
+        replaced = self.frame['id'].isin(incoming['id'])
+        # 既存の行の修正（種目名の変更を含む）は並べ直しが必要なため、修正前後の種目の系列を次回作り直す
+        for exercise in set(self.frame.loc[replaced, 'exercise_name'].dropna()):
+            self._series.pop(exercise, None)
+            self._derived.pop(exercise, None)
+            self._versions[exercise] = self._versions.get(exercise, 0) + 1
+        incoming = incoming.drop_duplicates(subset='id', keep='last')
+        for exercise, rows in incoming.groupby('exercise_name', observed=True):
+            self._derived.pop(exercise, None)
+            self._versions[exercise] = self._versions.get(exercise, 0) + 1
+            cached = self._series.get(exercise)
+            if cached is None:
+                continue
+            if rows['id'].isin(self.frame['id']).any() \
+                    or (len(cached) and rows['training_date'].min() < cached['training_date'].iloc[-1]):
+                del self._series[exercise]
+            else:
+                added = _with_derived(rows.sort_values('training_date', kind='stable'))
+                self._series[exercise] = pd.concat([cached, added], ignore_index=True)
+
+    # --- 各ページ用の絞り込み ---
+    def exercises(self):
+        return sorted(self.frame['exercise_name'].dropna().unique().tolist())
+
+    def between(self, start_date, end_date, exercise_name=None):
+        df = self.frame
+        mask = (df['training_date'] >= pd.Timestamp(start_date)) & (df['training_date'] <= pd.Timestamp(end_date))
+        if exercise_name:
+            mask &= df['exercise_name'] == exercise_name
+        return df[mask].sort_values('training_date', ascending=False, kind='stable')
+
+    def for_exercise(self, exercise_name):
+        df = self.frame
+        return df[df['exercise_name'] == exercise_name].sort_values('training_date', kind='stable')
+
+    def series(self, exercise_name):
+        """種目の有効な記録を日付順に並べ、volume / e1rm 列を付けたDataFrame（グラフ表示用）
+
+        ストアで保持して共有するため、呼び出し側では列の代入などの変更をしないこと。"""
+        cached = self._series.get(exercise_name)
+        if cached is None:
+            cached = _with_derived(self.for_exercise(exercise_name))
+            self._series[exercise_name] = cached
+        return cached
+
+    def derived(self, exercise_name, key, func):
+        """func(series(exercise_name)) の結果を、その種目の記録が追加・修正されるまで保持する"""
+        cache = self._derived.setdefault(exercise_name, {})
+        if key not in cache:
+            cache[key] = func(self.series(exercise_name))
+        return cache[key]
+
+    def derived_all(self, key, func):
+        """func(frame) の結果を、いずれかの記録が追加・修正されるまで保持する（全種目の概要用）"""
+        if key not in self._derived_all:
+            self._derived_all[key] = func(self.frame)
+        return self._derived_all[key]
+
+    def data_version(self, exercise_name=None):
+        """種目の記録が追加・修正されるたびに変わる値（グラフの図のキャッシュのキー用）
+
+        exercise_name を省略すると、いずれかの種目の記録が変わるたびに変わる値を返す。"""
+        if exercise_name is None:
+            return f"{self._generation}:all:{self._merges}"
+        return f"{self._generation}:{self._versions.get(exercise_name, 0)}"
+
+    def on_date(self, day):
+        df = self.frame
+        return df[df['training_date'] == pd.Timestamp(day)]
+
+    def history_for(self, exercise_names, exclude_date):
+        df = self.frame
+        mask = df['exercise_name'].isin(list(exercise_names)) & (df['training_date'] != pd.Timestamp(exclude_date))
+        return df[mask]
+
+    def latest_date(self):
+        latest = self.frame['training_date'].max()
+        return None if pd.isna(latest) else latest.date()
+
+
+def get_record_store(client, user_id, sync=True):
+    """セッションのストアを返す（ユーザーが変わった場合は作り直す）。必要に応じて差分同期する
+
+    sync=False の場合は同期せずに返す（他の読み取りと同時に store.sync を実行する場合）。"""
+    store = st.session_state.get("record_store")
+    if store is None or store.user_id != user_id:
+        store = RecordStore(user_id)
+        st.session_state.record_store = store
+    if sync:
+        store.sync(client)
+    return store
+
+
+def add_saved_records(user_id, rows):
+    """保存に成功した行をセッションのストアへ直接追加する（再取得なし）"""
+    store = st.session_state.get("record_store")
+    if store is not None and store.user_id == user_id:
+        # 他端末の未取得分を取りこぼさないよう、ウォーターマークは進めない
+        store.merge(rows, advance_watermark=False)
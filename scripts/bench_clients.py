@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""ベンチマーク用のSupabaseクライアント互換オブジェクト。
+
+問い合わせビルダー（select / eq / neq / gt / gte / lt / lte / in_ / order / range / limit と
+or・order パラメータ、insert / upsert、rpc）はアプリの local_backend と共有する。
+StubClient はメモリ上の行のリストに対して評価し、PostgresClient は同じ問い合わせを
+SQLに変換してローカルのPostgreSQLで実行する（PostgRESTの通信時間は含まない）。
+SQLiteで実行する場合は local_backend.SQLiteClient を使う。
+"""
+import sys
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+from uuid import UUID
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from local_backend import FunctionNotFoundError, QueryBuilder, RelationNotFoundError, Response, RpcCall  # noqa: E402
+
+_OPERATORS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+}
+_SQL_OPERATORS = {"eq": "=", "neq": "<>", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+# --- メモリ上の行に対して評価するクライアント ---
+def _comparable(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (int, float, Decimal)) and not isinstance(value, bool):
+        return float(value)
+    return value
+
+
+def _matches(row, column, operator, value):
+    actual = _comparable(row.get(column))
+    if operator == "in":
+        return actual in [_comparable(v) for v in value]
+    if actual is None:
+        return False
+    expected = _comparable(value)
+    if isinstance(actual, float) and isinstance(expected, str):
+        expected = float(expected)
+    return _OPERATORS[operator](actual, expected)
+
+
+def _matches_tree(row, node):
+    if node[0] in ("and", "or"):
+        results = (_matches_tree(row, child) for child in node[1])
+        return all(results) if node[0] == "and" else any(results)
+    return _matches(row, *node)
+
+
+class StubClient:
+    """テーブル名 -> 行のリストを持つメモリ上のクライアント。
+
+    存在しないテーブル（ビュー）と rpc は未作成として例外を送出し、アプリ側のフォールバックを通す。
+    user_id の eq 条件はユーザーごとの索引で絞り込む（全行の走査を計測に含めないため）。"""
+
+    def __init__(self, tables=None):
+        self.tables = tables or {}
+        self.requests = 0
+        self._by_user = {}  # テーブル名 -> user_id -> 行のリスト
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    def rpc(self, name, params):
+        return RpcCall(self, name, params)
+
+    def run_rpc(self, name, params):
+        self.requests += 1
+        raise FunctionNotFoundError(name)
+
+    def run(self, query):
+        self.requests += 1
+        if query.operation in ("insert", "upsert"):
+            self.tables.setdefault(query.table, []).extend(dict(row) for row in query.payload)
+            self._by_user.pop(query.table, None)
+            return Response([dict(row) for row in query.payload])
+        if query.table not in self.tables:
+            raise RelationNotFoundError(query.table)
+        rows = self.tables[query.table]
+        filters, trees, orders = query._resolved()
+        user_filter = next((value for column, operator, value in filters
+                            if column == "user_id" and operator == "eq"), None)
+        if user_filter is not None:
+            rows = self._user_rows(query.table).get(str(user_filter), [])
+        selected = [row for row in rows
+                    if all(_matches(row, *f) for f in filters) and all(_matches_tree(row, t) for t in trees)]
+        for column, desc in reversed(orders):
+            selected.sort(key=lambda row: _comparable(row.get(column)), reverse=desc)
+        total = len(selected) if query.count else None
+        end = None if query.limit_rows is None else query.offset + query.limit_rows
+        selected = selected[query.offset:end]
+        if query.columns != "*":
+            columns = query.columns.split(",")
+            selected = [{column: row.get(column) for column in columns} for row in selected]
+        return Response([dict(row) for row in selected], total)
+
+    def _user_rows(self, table):
+        if table not in self._by_user:
+            index = {}
+            for row in self.tables[table]:
+                index.setdefault(str(row.get("user_id")), []).append(row)
+            self._by_user[table] = index
+        return self._by_user[table]
+
+
+# --- PostgreSQLで実行するクライアント ---
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, UUID):
+        return str(value)
+    return value
+
+
+class PostgresClient:
+    """問い合わせをSQLに変換して psycopg の接続で実行する（トランザクションは呼び出し側で管理する）"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.requests = 0
+
+    def table(self, name):
+        return QueryBuilder(self, name)
+
+    def rpc(self, name, params):
+        return RpcCall(self, name, params)
+
+    def run_rpc(self, name, params):
+        self.requests += 1
+        placeholders = ", ".join(f"{key} => %({key})s" for key in params)
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT * FROM {name}({placeholders})", params)
+            columns = [c.name for c in cur.description]
+            return Response([{c: _json_value(v) for c, v in zip(columns, row)} for row in cur.fetchall()])
+
+    def _condition(self, column, operator, value, params):
+        params.append(value)
+        if operator == "in":
+            return f"{column} = ANY(%s)"
+        return f"{column} {_SQL_OPERATORS[operator]} %s"
+
+    def _tree(self, node, params):
+        if node[0] in ("and", "or"):
+            joined = f" {node[0].upper()} ".join(self._tree(child, params) for child in node[1])
+            return f"({joined})"
+        return self._condition(*node, params)
+
+    def run(self, query):
+        self.requests += 1
+        if query.operation in ("insert", "upsert"):
+            return self._insert(query)
+        filters, trees, orders = query._resolved()
+        params = []
+        conditions = [self._condition(*f, params) for f in filters] + [self._tree(t, params) for t in trees]
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        order = f" ORDER BY {', '.join(c + (' DESC' if d else '') for c, d in orders)}" if orders else ""
+        limit = f" LIMIT {query.limit_rows}" if query.limit_rows is not None else ""
+        offset = f" OFFSET {query.offset}" if query.offset else ""
+        with self.conn.cursor() as cur:
+            cur.execute(f"SELECT {query.columns} FROM {query.table}{where}{order}{limit}{offset}", params)
+            columns = [c.name for c in cur.description]
+            data = [{c: _json_value(v) for c, v in zip(columns, row)} for row in cur.fetchall()]
+            count = None
+            if query.count:
+                cur.execute(f"SELECT count(*) FROM {query.table}{where}", params)
+                count = cur.fetchone()[0]
+        return Response(data, count)
+
+    def _insert(self, query):
+        columns = list(query.payload[0])
+        values = ", ".join("(" + ", ".join(["%s"] * len(columns)) + ")" for _ in query.payload)
+        conflict = ""
+        if query.operation == "upsert" and query.ignore_duplicates:
+            conflict = f" ON CONFLICT ({query.on_conflict}) DO NOTHING" if query.on_conflict else " ON CONFLICT DO NOTHING"
+        with self.conn.cursor() as cur:
+            cur.execute(f"INSERT INTO {query.table} ({', '.join(columns)}) VALUES {values}{conflict} RETURNING *",
+                        [row[c] for row in query.payload for c in columns])
+            names = [c.name for c in cur.description]
+            return Response([{c: _json_value(v) for c, v in zip(names, row)} for row in cur.fetchall()])
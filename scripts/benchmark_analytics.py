@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+"""analytics.py の各指標の計算時間を、合成した複数ユーザー分のDataFrameで計測する。
+
+分析指標を追加・変更したときに実行し、グラフ表示ページを遅くしていないか確認する。
+いずれかの指標の中央値が --budget-ms を超えた場合は終了コード1を返す。
+
+使い方:
+    python scripts/benchmark_analytics.py --users 2000 --years 1
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import analytics  # noqa: E402
+from synthetic import generate_history  # noqa: E402
+
+EXERCISES = list(analytics.MUSCLE_GROUPS)[:12] + ["その他の種目"]
+
+
+BENCHMARKS = [
+    ("推定1RM (Epley)", lambda df: analytics.add_e1rm(df, "epley")),
+    ("推定1RM (Brzycki)", lambda df: analytics.add_e1rm(df, "brzycki")),
+    ("部位の付与", analytics.add_muscle_group),
+    ("7日/28日ボリューム (種目別)", lambda df: analytics.rolling_volume(df, "exercise_name")),
+    ("7日/28日ボリューム (部位別)", lambda df: analytics.rolling_volume(df, "muscle_group")),
+    ("ACWR (種目別)", lambda df: analytics.acute_chronic_ratio(df, "exercise_name")),
+    ("伸び率 (推定1RM)", lambda df: analytics.progression_slopes(df, "e1rm")),
+]
+
+
+def measure(func, df, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(df)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analytics.py の計算時間を計測する")
+    parser.add_argument("--users", type=int, default=2000, help="合成データのユーザー数")
+    parser.add_argument("--years", type=float, default=1.0, help="1ユーザーあたりの履歴の年数（2000人×1年で約100万行）")
+    parser.add_argument("--repeat", type=int, default=5, help="各指標の計測回数")
+    parser.add_argument("--budget-ms", type=float, default=1000, help="1指標あたりの許容時間（中央値）")
+    args = parser.parse_args()
+
+    df = generate_history(users=args.users, years=args.years, exercises=EXERCISES, with_ids=False)
+    print(f"{len(df):,} 行 / {args.users:,} ユーザー / 各 {args.repeat} 回")
+    failures = 0
+    for name, func in BENCHMARKS:
+        func(df)  # 初回の読み込み・キャッシュの影響を除く
+        median, worst = measure(func, df, args.repeat)
+        ok = median <= args.budget_ms
+        failures += not ok
+        print(f"{'OK  ' if ok else 'NG  '} {name}: 中央値 {median:.0f} ms / 最大 {worst:.0f} ms")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# --- 合成トレーニング履歴の生成 ---
+# ゲストモードのサンプルデータと、ベンチマーク・負荷試験用の大量データを同じ規則で作る。
+# N人 × M年 × K種目 の記録を乱数シード付きで、行ごとのループを使わずNumPyで生成する。
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+# 種目 -> (基準重量kg, 基準回数)。自重種目は重量0
+EXERCISE_PROFILES = {
+    "ベンチプレス": (60, 8),
+    "スクワット": (80, 8),
+    "デッドリフト": (100, 6),
+    "懸垂": (0, 10),
+    "腕立て伏せ": (0, 15),
+    "ショルダープレス": (35, 10),
+    "バーベルロー": (50, 10),
+    "レッグプレス": (120, 12),
+    "ラットプルダウン": (45, 12),
+    "ダンベルプレス": (22, 10),
+    "アームカール": (12, 12),
+    "ランジ": (20, 12),
+}
+
+# 1日にトレーニングする種目数の上限と、各種目を実施する確率
+MAX_EXERCISES_PER_DAY = 3
+SESSION_RATE = 0.7
+# 期間全体での重量の伸び（期間の最初から最後までで+20%）
+PROGRESS_RATE = 0.2
+
+
+def generate_history(users=1, days=None, years=1.0, exercises=5, seed=0, end_date=None,
+                     user_ids=None, with_ids=True, notes="サンプルデータ"):
+    """合成したトレーニング記録のDataFrameを返す
+
+    days を指定しない場合は years×365 日分。exercises は EXERCISE_PROFILES の先頭から使う種目数か、
+    種目名のリスト。複数ユーザーの場合は user_id 列を付ける（user_ids を省略すると乱数のUUID）。
+    """
+    rng = np.random.default_rng(seed)
+    names = list(EXERCISE_PROFILES)[:exercises] if isinstance(exercises, int) else list(exercises)
+    weight_base = np.array([EXERCISE_PROFILES.get(name, (40, 10))[0] for name in names], dtype=np.float64)
+    reps_base = np.array([EXERCISE_PROFILES.get(name, (40, 10))[1] for name in names], dtype=np.int64)
+    n_days = int(days if days is not None else round(years * 365))
+    end_date = end_date or date.today()
+    per_day = min(MAX_EXERCISES_PER_DAY, len(names))
+
+    # (ユーザー, 何日前, 種目の枠) の全組み合わせを作り、実施した枠だけを残す
+    user_index, days_ago, slot = (grid.ravel() for grid in np.meshgrid(
+        np.arange(users), np.arange(n_days), np.arange(per_day), indexing='ij'))
+    exercises_today = rng.integers(1, per_day + 1, size=(users, n_days))
+    performed = (slot < exercises_today[user_index, days_ago]) & (rng.random(len(slot)) < SESSION_RATE)
+    user_index, days_ago, slot = user_index[performed], days_ago[performed], slot[performed]
+    # 種目は日ごと・ユーザーごとにずらして回す（1種目だけに偏らないように）
+    user_offset = rng.integers(0, len(names), size=users) if users > 1 else np.zeros(1, dtype=np.int64)
+    exercise_index = (slot + days_ago * per_day + user_offset[user_index]) % len(names) \
+        if len(names) > per_day else slot
+
+    n = len(slot)
+    strength = rng.uniform(0.7, 1.3, size=users) if users > 1 else np.ones(1)
+    progress = (n_days - days_ago) / max(n_days, 1) * PROGRESS_RATE
+    weight = weight_base[exercise_index] * strength[user_index] * (1 + progress) + rng.uniform(-2, 2, n)
+    weight = np.round(np.clip(weight, 0, None), 1)
+    reps = np.maximum(reps_base[exercise_index] + rng.integers(-2, 3, n), 1)
+    sets = rng.integers(3, 6, n)
+    training_date = (np.datetime64(end_date, 'D') - days_ago).astype('datetime64[ns]')
+
+    df = pd.DataFrame({
+        'training_date': training_date,
+        'exercise_name': pd.Categorical.from_codes(exercise_index, categories=names),
+        'weight': weight,
+        'reps': reps,
+        'sets': sets,
+        'notes': notes,
+    })
+    if users > 1 or user_ids is not None:
+        if user_ids is None:
+            user_ids = _random_uuids(rng, users)
+        df.insert(0, 'user_id', pd.Categorical.from_codes(user_index, categories=list(user_ids)))
+    if with_ids:
+        df.insert(0, 'id', _random_uuids(rng, n))
+    return df.sort_values(['training_date', 'exercise_name'], ascending=[False, True], kind='stable')\
+        .reset_index(drop=True)
+
+
+def compact_history(df):
+    """省メモリの型に揃える（種目・メモはカテゴリ型、日付はdatetime64、重量float32、回数・セット数int16）"""
+    return df.astype({
+        'exercise_name': 'category',
+        'weight': np.float32,
+        'reps': np.int16,
+        'sets': np.int16,
+        'notes': 'category',
+    }).assign(training_date=pd.to_datetime(df['training_date']))
+
+
+def _random_uuids(rng, count):
+    """乱数シードから決まるUUID（v4形式）の文字列配列"""
+    raw = rng.integers(0, 256, size=(count, 16), dtype=np.uint8)
+    raw[:, 6] = (raw[:, 6] & 0x0F) | 0x40
+    raw[:, 8] = (raw[:, 8] & 0x3F) | 0x80
+    hex_digits = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+    chars = np.empty((count, 32), dtype=np.uint8)
+    chars[:, 0::2] = hex_digits[raw >> 4]
+    chars[:, 1::2] = hex_digits[raw & 0x0F]
+    # 8-4-4-4-12 の位置にハイフンを入れる
+    text = np.full((count, 36), ord('-'), dtype=np.uint8)
+    for source, target in ((slice(0, 8), slice(0, 8)), (slice(8, 12), slice(9, 13)), (slice(12, 16), slice(14, 18)),
+                           (slice(16, 20), slice(19, 23)), (slice(20, 32), slice(24, 36))):
+        text[:, target] = chars[:, source]
+    return text.view('S36').ravel().astype(str).astype(object)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+# --- テスト用のPostgRESTサーバーの代わり ---
+# 実際の postgrest-py（supabase==1.0.3 と同じ 0.10系）のクライアントから送られるHTTPリクエストを
+# httpx.MockTransport で受け、PostgRESTと同じ解釈（Range ヘッダーは終端を含む、limit / offset /
+# order / or パラメータ、1レスポンスあたりの上限件数）で scripts/bench_clients.StubClient の行に対して評価する。
+# クライアント側の range() などの扱いの違いをそのまま再現するため、アプリのモジュールに実際のクライアントを渡して試す。
+import json
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+from postgrest import SyncPostgrestClient
+from postgrest.utils import SyncClient
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "scripts"))
+
+from bench_clients import StubClient  # noqa: E402
+from local_backend import QueryBuilder  # noqa: E402
+
+# Supabaseの既定の max-rows
+MAX_ROWS = 1000
+_RESERVED_PARAMS = {"select", "order", "or", "limit", "offset", "on_conflict", "columns"}
+
+
+def _parse_filter(value):
+    operator, _, operand = value.partition(".")
+    if operator == "in":
+        return operator, [item.strip('"') for item in operand.strip("()").split(",") if item]
+    return operator, operand
+
+
+class MockPostgrest:
+    """テーブル名 -> 行のリストを持ち、PostgRESTと同じ規則で応答する"""
+
+    def __init__(self, tables, max_rows=MAX_ROWS):
+        self.stub = StubClient({name: list(rows) for name, rows in tables.items()})
+        self.max_rows = max_rows
+        self.requests = []  # (メソッド, パス, パラメータ, Rangeヘッダー)
+        self.errors = {}  # テーブル名 -> (ステータス, 応答本文)
+
+    def handle(self, request):
+        name = request.url.path.rsplit("/", 1)[-1]
+        params = list(request.url.params.multi_items())
+        self.requests.append((request.method, request.url.path, params, request.headers.get("range")))
+        if name in self.errors:
+            status, body = self.errors[name]
+            return httpx.Response(status, json=body)
+        if "/rpc/" in request.url.path:
+            return httpx.Response(404, json={"code": "PGRST202", "message": f"function {name} not found"})
+        if request.method != "GET":
+            return httpx.Response(405, json={"code": "PGRST000", "message": "not supported"})
+        query = QueryBuilder(self.stub, name)
+        query.select(dict(params).get("select", "*"), count="exact" if "count=exact" in
+                     request.headers.get("prefer", "") else None)
+        for key, value in params:
+            if key in ("or", "order"):
+                query.params = query.params.add(key, value)
+            elif key not in _RESERVED_PARAMS:
+                query._filter(key, *_parse_filter(value))
+        offset = int(dict(params).get("offset", 0))
+        limit = int(dict(params)["limit"]) if "limit" in dict(params) else None
+        if request.headers.get("range"):
+            start, end = (int(part) for part in request.headers["range"].split("-"))
+            offset, limit = start, end - start + 1
+        query.offset = offset
+        query.limit_rows = self.max_rows if limit is None else min(limit, self.max_rows)
+        try:
+            response = self.stub.run(query)
+        except RuntimeError as e:
+            return httpx.Response(404, json={"code": getattr(e, "code", "42P01"), "message": str(e)})
+        end = offset + len(response.data) - 1
+        content_range = f"{offset}-{end}" if response.data else "*"
+        content_range += f"/{response.count if response.count is not None else '*'}"
+        return httpx.Response(200, content=json.dumps(response.data).encode("utf-8"),
+                              headers={"Content-Type": "application/json", "Content-Range": content_range})
+
+
+class MockPostgrestClient(SyncPostgrestClient):
+    """通信先を MockPostgrest に差し替えた実際の postgrest-py のクライアント"""
+
+    def __init__(self, server):
+        self.server = server
+        super().__init__("http://postgrest.test")
+
+    def create_session(self, base_url, headers, timeout):
+        return SyncClient(base_url=base_url, headers=headers, timeout=timeout,
+                          transport=httpx.MockTransport(self.server.handle))
+
+
+@pytest.fixture
+def postgrest_client():
+    """テーブル名 -> 行のリストから、実際の postgrest-py のクライアントを作る"""
+    def make(tables):
+        return MockPostgrestClient(MockPostgrest(tables))
+    return make
+
+
+def record_rows(user_id, count, exercises=("ベンチプレス",), start="2020-01-01"):
+    """1日1件ずつ並んだ training_records の行"""
+    from datetime import date, timedelta
+
+    first = date.fromisoformat(start)
+    rows = []
+    for i in range(count):
+        day = (first + timedelta(days=i)).isoformat()
+        rows.append({
+            "id": f"00000000-0000-0000-0000-{i:012d}", "user_id": user_id, "training_date": day,
+            "exercise_name": exercises[i % len(exercises)], "weight": 60 + i % 40, "reps": 5 + i % 5,
+            "sets": 3, "notes": "", "created_at": f"{day}T00:00:00+00:00", "updated_at": f"{day}T00:00:00+00:00",
+            "session_id": None, "volume": None, "e1rm": None,
+        })
+    return rows
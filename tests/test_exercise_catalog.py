@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import pytest
+from postgrest.exceptions import APIError
+
+from conftest import record_rows
+from exercise_catalog import fetch_distinct_exercises
+
+USER_ID = "11111111-1111-1111-1111-111111111111"
+NAMES = [f"種目{i:04d}" for i in range(1200)]
+
+
+def test_catalog_view_is_read_past_the_row_cap(postgrest_client):
+    client = postgrest_client({"user_exercise_catalog": [
+        {"user_id": USER_ID, "exercise_name": name} for name in NAMES]})
+    assert fetch_distinct_exercises(client, USER_ID) == set(NAMES)
+    assert len(client.server.requests) == 2
+
+
+@pytest.mark.parametrize("code", ["42P01", "PGRST205"])
+def test_missing_view_falls_back_to_records(postgrest_client, code):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 2500, exercises=NAMES)})
+    client.server.errors["user_exercise_catalog"] = (404, {"code": code, "message": "missing"})
+    assert fetch_distinct_exercises(client, USER_ID) == set(NAMES)
+    assert [path for _, path, _, _ in client.server.requests].count("/training_records") == 3
+
+
+def test_other_errors_are_not_hidden_by_the_fallback(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 10)})
+    client.server.errors["user_exercise_catalog"] = (401, {"code": "42501", "message": "permission denied"})
+    with pytest.raises(APIError):
+        fetch_distinct_exercises(client, USER_ID)
+    assert all(path != "/training_records" for _, path, _, _ in client.server.requests)
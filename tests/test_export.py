@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import io
+
+import pandas as pd
+
+from conftest import record_rows
+from export import export_records, iter_record_chunks
+
+USER_ID = "11111111-1111-1111-1111-111111111111"
+
+
+def test_chunks_cover_the_whole_history(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 2500)})
+    chunks = list(iter_record_chunks(client, USER_ID))
+    assert [len(rows) for rows in chunks] == [1000, 1000, 500]
+    ids = [row["id"] for rows in chunks for row in rows]
+    assert len(set(ids)) == 2500
+
+
+def test_csv_export_writes_every_record(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 2500)})
+    file = export_records(client, USER_ID, "CSV")
+    df = pd.read_csv(io.BytesIO(file.read()), encoding="utf-8-sig")
+    assert len(df) == 2500
+    assert df["training_date"].is_monotonic_increasing
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+from datetime import date
+
+from conftest import record_rows
+from feedback import fetch_exercise_history, fetch_feedback_baselines
+
+USER_ID = "11111111-1111-1111-1111-111111111111"
+EXERCISES = ("ベンチプレス", "スクワット")
+
+
+def test_history_reads_every_page(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 2500, exercises=EXERCISES)})
+    rows = fetch_exercise_history(client, USER_ID, EXERCISES, date(2030, 1, 1))
+    assert len(rows) == 2500
+
+
+def test_missing_rpc_falls_back_to_full_history(postgrest_client):
+    rows = record_rows(USER_ID, 2500, exercises=EXERCISES)
+    # 自己ベストは最も古い（新しい順で最後のページの）記録
+    rows[0]["weight"] = 200
+    client = postgrest_client({"training_records": rows})
+    today = date.fromisoformat(rows[-1]["training_date"])
+    baselines = fetch_feedback_baselines(client, USER_ID, EXERCISES, today)
+    assert baselines["ベンチプレス"]["best_weight"] == 200
+    assert baselines["ベンチプレス"]["prev_date"] == rows[-2]["training_date"]
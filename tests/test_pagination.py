@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+from conftest import record_rows
+from local_backend import QueryBuilder
+from pagination import fetch_records_page
+
+USER_ID = "11111111-1111-1111-1111-111111111111"
+
+
+def test_pages_walk_the_whole_history(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 120)})
+    seen, cursor, pages = [], None, 0
+    while True:
+        rows, cursor, total = fetch_records_page(client, USER_ID, "2000-01-01", "2100-01-01",
+                                                 page_size=50, cursor=cursor, with_count=pages == 0)
+        if pages == 0:
+            assert total == 120
+        pages += 1
+        seen.extend(rows)
+        assert len(rows) == (50 if cursor else 20)
+        if cursor is None:
+            break
+    assert pages == 3
+    assert len({row["id"] for row in seen}) == 120
+    assert [row["training_date"] for row in seen] == sorted((row["training_date"] for row in seen), reverse=True)
+
+
+def test_page_requests_exactly_page_size_rows(postgrest_client):
+    client = postgrest_client({"training_records": record_rows(USER_ID, 10)})
+    fetch_records_page(client, USER_ID, "2000-01-01", "2100-01-01", page_size=50)
+    assert client.server.requests[-1][3] == "0-49"
+
+
+def test_local_range_excludes_end_like_postgrest():
+    query = QueryBuilder(None, "training_records").range(100, 150)
+    assert (query.offset, query.limit_rows) == (100, 50)
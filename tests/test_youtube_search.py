@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from youtube_search import VideoSearchCache, YouTubeSearch
+
+
+class _Request:
+    def __init__(self, response):
+        self.response = response
+
+    def execute(self):
+        return self.response
+
+
+class _FakeYouTube:
+    """search().list() / videos().list() だけを持つクライアント。呼び出し回数を数える"""
+
+    def __init__(self, title):
+        self.title = title
+        self.searches = 0
+
+    def search(self):
+        return self
+
+    def videos(self):
+        return _Videos()
+
+    def list(self, **_):
+        self.searches += 1
+        return _Request({"items": [{
+            "id": {"videoId": "v1"},
+            "snippet": {"title": self.title, "channelTitle": "ch", "thumbnails": {"default": {"url": "t"}}},
+        }]})
+
+
+class _Videos:
+    def list(self, **_):
+        return _Request({"items": []})
+
+
+def make_search(tmp_path, ttl_seconds, title):
+    search = YouTubeSearch("key", cache=VideoSearchCache(str(tmp_path / "cache.sqlite3"), ttl_seconds))
+    search._client = _FakeYouTube(title)
+    return search
+
+
+def test_cached_returns_fresh_results_only(tmp_path):
+    search = make_search(tmp_path, 3600, "新しい結果")
+    assert search.cached("ベンチプレス") is None
+    search.search("ベンチプレス")
+    assert search.cached("ベンチプレス")[0]["title"] == "新しい結果"
+
+
+def test_expired_results_are_searched_again(tmp_path):
+    search = make_search(tmp_path, 0, "古い結果")
+    search.search("ベンチプレス")
+    # 期限切れの結果はページに返さず、検索ボタンから取り直す
+    assert search.cached("ベンチプレス") is None
+    search._client.title = "新しい結果"
+    videos, source = search.search("ベンチプレス")
+    assert (videos[0]["title"], source) == ("新しい結果", "api")
+    assert search._client.searches == 2
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+# --- セット単位のワークアウト記録（workout_sessions / workout_sets） ---
+# 入力画面の表で入力した1回分のセット（種目・重量・回数）を検証し、
+# RPC save_workout_session の1回の呼び出しでセッション・種目ごとの集計行・セットをまとめて登録する
+# （migrations/0006_workout_sessions.sql）。
+# session_id はクライアントで生成し、応答が失われて再送しても同じセッションが二重に登録されないようにする。
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from analytics import estimate_1rm
+from bulk_import import ImportRowError, validate_row
+from exercise_names import name_index
+
+SET_COLUMNS = ['exercise_name', 'weight', 'reps']
+
+
+def new_session_id():
+    return str(uuid.uuid4())
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, float) and np.isnan(value)) or str(value).strip() == ""
+
+
+def validate_sets(rows, training_date, today, known_names=()):
+    """表の行（dictのリスト）を検証し、RPCに渡すセットのリストを返す
+
+    種目名・重量・回数がすべて空の行は無視する。1つ目の不正な行で ImportRowError を送出する
+    （line は表の行番号）。種目名は正規の表記に寄せる（known_names はユーザーの既存の種目名）。"""
+    names = name_index(known_names)
+    sets = []
+    for line, row in enumerate(rows, start=1):
+        if all(_is_blank(row.get(column)) for column in SET_COLUMNS):
+            continue
+        # 一括インポートと同じ規則で検証する（1行＝1セット）
+        record = validate_row(line, dict(row, training_date=training_date, sets=1), today)
+        record["exercise_name"] = names.canonicalize(record["exercise_name"])
+        sets.append({column: record[column] for column in SET_COLUMNS})
+    if not sets:
+        raise ImportRowError(1, "セットを1つ以上入力してください。")
+    return sets
+
+
+def summarize_sets(sets):
+    """種目ごとのセット数・最大重量・ボリューム（Σ重量×回数）・推定1RM（セットごとの最大値）
+
+    保存時にRPCが計算する値と同じもの（保存前の確認表示用）。"""
+    df = pd.DataFrame(sets, columns=SET_COLUMNS)
+    df = df.assign(volume=df['weight'] * df['reps'],
+                   e1rm=np.round(estimate_1rm(df['weight'].to_numpy(), df['reps'].to_numpy()), 2))
+    summary = df.groupby('exercise_name', sort=False).agg(
+        sets=('reps', 'size'), weight=('weight', 'max'), volume=('volume', 'sum'), e1rm=('e1rm', 'max'))
+    return summary.reset_index()
+
+
+def save_workout_session(client, user_id, training_date, sets, notes="", session_id=None):
+    """セッションを1回の呼び出しで保存し、種目ごとの集計行（training_records の行）のリストを返す
+
+    同じ session_id で再度呼び出した場合は、登録済みの集計行を返す（重複して登録しない）。"""
+    response = client.rpc('save_workout_session', {
+        "p_session_id": session_id or new_session_id(),
+        "p_user_id": user_id,
+        "p_training_date": str(training_date),
+        "p_notes": notes,
+        "p_sets": sets,
+    }).execute()
+    return response.data or []
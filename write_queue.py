@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+# --- 記録保存の書き込みキュー（ライトビハインド） ---
+# 「記録を保存」では行をローカルのSQLiteジャーナルに書いてすぐに戻り、
+# バックグラウンドのスレッドがまとめて training_records へ送信する。
+# id はクライアント側で生成したUUIDを使い、送信は ON CONFLICT (id) DO NOTHING の upsert にするため、
+# 応答が失われて再送しても重複しない。失敗した行は指数バックオフで再送し続け、破棄はしない。
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+
+from instrumentation import QUERY_METRICS_ENABLED, query_report, set_page, start_queries
+
+WRITE_QUEUE_PATH = os.environ.get("WRITE_QUEUE_PATH", os.path.join(".cache", "write_queue.sqlite3"))
+# 1回の送信にまとめる最大件数と、続けて保存された行をまとめるための待ち時間（秒）
+WRITE_BATCH_SIZE = 100
+WRITE_LINGER_SECONDS = 0.5
+# 再送間隔: 1秒から倍々に伸ばし、最大5分（±20%のゆらぎを加える）
+RETRY_BASE_SECONDS = 1.0
+RETRY_MAX_SECONDS = 300.0
+
+
+def retry_delay(attempts):
+    delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class WriteBehindQueue:
+    def __init__(self, client, path=WRITE_QUEUE_PATH, batch_size=WRITE_BATCH_SIZE, start=True):
+        self.client = client
+        self.path = path
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS pending_writes ("
+                         "id TEXT PRIMARY KEY, user_id TEXT NOT NULL, payload TEXT NOT NULL, "
+                         "enqueued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+                         "next_attempt_at REAL NOT NULL, last_error TEXT)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_writes_due ON pending_writes (next_attempt_at)")
+        self._thread = None
+        if start:
+            # 前回のプロセスで送信できなかった行も、起動後に送信する
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def enqueue(self, row):
+        """行をジャーナルに追加し、id を付けた行を返す（送信は待たない）"""
+        row = dict(row, id=row.get("id") or str(uuid.uuid4()))
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("INSERT OR IGNORE INTO pending_writes (id, user_id, payload, enqueued_at, next_attempt_at) "
+                         "VALUES (?, ?, ?, ?, ?)",
+                         (row["id"], str(row["user_id"]), json.dumps(row, ensure_ascii=False), now, now))
+        self._wakeup.set()
+        return row
+
+    def pending(self, user_id):
+        """未送信の行のリスト（古い順）。各行に attempts と last_error を付ける"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT payload, attempts, last_error FROM pending_writes "
+                                "WHERE user_id = ? ORDER BY enqueued_at", (str(user_id),)).fetchall()
+        return [dict(json.loads(payload), attempts=attempts, last_error=last_error)
+                for payload, attempts, last_error in rows]
+
+    def retry_now(self, user_id=None):
+        """バックオフ中の行を直ちに再送する"""
+        with self._connect() as conn:
+            if user_id is None:
+                conn.execute("UPDATE pending_writes SET next_attempt_at = ?", (time.time(),))
+            else:
+                conn.execute("UPDATE pending_writes SET next_attempt_at = ? WHERE user_id = ?",
+                             (time.time(), str(user_id)))
+        self._wakeup.set()
+
+    # --- 送信 ---
+    def _send(self, rows):
+        self.client.table('training_records')\
+            .upsert(rows, ignore_duplicates=True, on_conflict='id')\
+            .execute()
+
+    def flush_once(self):
+        """送信時刻に達した行を1バッチ送信する。(送信した件数, 失敗した件数) を返す"""
+        with self._connect() as conn:
+            due = conn.execute("SELECT id, payload, attempts FROM pending_writes WHERE next_attempt_at <= ? "
+                               "ORDER BY enqueued_at LIMIT ?", (time.time(), self.batch_size)).fetchall()
+        if not due:
+            return 0, 0
+        try:
+            self._send([json.loads(payload) for _, payload, _ in due])
+            self._delete([row_id for row_id, _, _ in due])
+            return len(due), 0
+        except Exception as e:
+            if len(due) == 1:
+                self._reschedule(due[0], e)
+                return 0, 1
+        # 一部の行だけが原因の失敗でバッチ全体が止まらないよう、1行ずつ送り直す
+        sent = failed = 0
+        for entry in due:
+            try:
+                self._send([json.loads(entry[1])])
+                self._delete([entry[0]])
+                sent += 1
+            except Exception as e:
+                self._reschedule(entry, e)
+                failed += 1
+        return sent, failed
+
+    def _delete(self, ids):
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM pending_writes WHERE id = ?", [(row_id,) for row_id in ids])
+
+    def _reschedule(self, entry, error):
+        row_id, _, attempts = entry
+        with self._connect() as conn:
+            conn.execute("UPDATE pending_writes SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                         (attempts + 1, time.time() + retry_delay(attempts + 1), str(error)[:500], row_id))
+
+    def _next_due_in(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT MIN(next_attempt_at) FROM pending_writes").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - time.time())
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(timeout=self._next_due_in())
+            self._wakeup.clear()
+            # 続けて保存された行を1回の送信にまとめる
+            time.sleep(WRITE_LINGER_SECONDS)
+            # 送信の計測はどの画面の再実行にも属さないため、独立したページ名で出力する
+            start_queries()
+            set_page("バックグラウンド送信")
+            try:
+                while True:
+                    sent, failed = self.flush_once()
+                    if not sent or failed:
+                        break
+            except Exception:
+                # ジャーナル自体の読み書きに失敗した場合も、スレッドは止めずに次の機会に再試行する
+                time.sleep(RETRY_BASE_SECONDS)
+            if QUERY_METRICS_ENABLED:
+                query_report()
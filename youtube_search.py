@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# --- YouTube動画検索のキャッシュとクォータ計測 ---
+# search().list は1回100ユニットを消費するため、検索結果を
+# プロセス内LRU + ディスク上のSQLiteの2段でキャッシュする。
+# キーは正規化した種目名と max_results。期限切れのエントリも削除せずに残し、
+# APIが quotaExceeded を返した場合はそれを返す。
+# 検索結果の長さ・再生回数・チャンネル名は、全動画IDをまとめた videos().list 1回（1ユニット）で付ける。
+# よく記録する種目は先読み（prefetch_async）でバックグラウンドに検索してキャッシュに入れておき、
+# 入力画面では検索ボタンを押す前からキャッシュの結果を表示する。
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from datetime import date
+
+from instrumentation import bind_context
+
+# search().list / videos().list 1回あたりの消費ユニット
+SEARCH_COST_UNITS = 100
+VIDEOS_COST_UNITS = 1
+CACHE_PATH = os.environ.get("YOUTUBE_CACHE_PATH", os.path.join(".cache", "youtube_cache.sqlite3"))
+CACHE_TTL_SECONDS = int(float(os.environ.get("YOUTUBE_CACHE_TTL_HOURS", "168")) * 3600)
+MEMORY_CACHE_SIZE = 256
+# 先読みで1日に使うユニットの上限（当日の消費がこれを超えていれば先読みしない）
+PREFETCH_DAILY_UNITS = int(os.environ.get("YOUTUBE_PREFETCH_DAILY_UNITS", "500"))
+
+_DURATION_PATTERN = re.compile(r"P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def normalize_query(query):
+    """全角/半角・大文字小文字・空白の違いを吸収したキャッシュキー用の種目名"""
+    return " ".join(unicodedata.normalize("NFKC", query).lower().split())
+
+
+def parse_duration(value):
+    """ISO 8601 の長さ（PT1H2M3S など）を秒数にする。解釈できなければ None"""
+    match = _DURATION_PATTERN.match(value or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return None
+    hours, rest = divmod(int(seconds), 3600)
+    return f"{hours}:{rest // 60:02d}:{rest % 60:02d}" if hours else f"{rest // 60}:{rest % 60:02d}"
+
+
+def format_view_count(count):
+    if count is None:
+        return None
+    if count >= 100_000_000:
+        return f"{count / 100_000_000:.1f}億回視聴"
+    if count >= 10_000:
+        return f"{count / 10_000:.1f}万回視聴"
+    return f"{count:,}回視聴"
+
+
+class YouTubeAPIError(Exception):
+    """YouTube Data APIのエラー（reasonは quotaExceeded など）"""
+
+    def __init__(self, reason, message):
+        super().__init__(f"{reason}: {message}")
+        self.reason = reason
+        self.message = message
+
+    @classmethod
+    def from_http_error(cls, error):
+        try:
+            details = json.loads(error.content.decode('utf-8')).get('error', {}).get('errors', [{}])[0]
+        except (ValueError, AttributeError):
+            details = {}
+        return cls(details.get('reason', '不明な理由'), details.get('message', str(error)))
+
+
+class VideoSearchCache:
+    def __init__(self, path=CACHE_PATH, ttl_seconds=CACHE_TTL_SECONDS, memory_size=MEMORY_CACHE_SIZE):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.memory_size = memory_size
+        self._memory = OrderedDict()  # key -> (取得時刻, 動画リスト)
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS search_cache ("
+                         "query TEXT NOT NULL, max_results INTEGER NOT NULL, "
+                         "fetched_at REAL NOT NULL, videos TEXT NOT NULL, "
+                         "PRIMARY KEY (query, max_results))")
+            conn.execute("CREATE TABLE IF NOT EXISTS quota_usage ("
+                         "day TEXT PRIMARY KEY, spent INTEGER NOT NULL DEFAULT 0, "
+                         "saved INTEGER NOT NULL DEFAULT 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, key):
+        """(動画リスト, 期限切れか) を返す。未キャッシュなら None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+        if entry is None:
+            with self._connect() as conn:
+                row = conn.execute("SELECT fetched_at, videos FROM search_cache "
+                                   "WHERE query = ? AND max_results = ?", key).fetchone()
+            if row is None:
+                return None
+            entry = (row[0], json.loads(row[1]))
+            self._remember(key, entry)
+        fetched_at, videos = entry
+        return videos, time.time() - fetched_at >= self.ttl_seconds
+
+    def put(self, key, videos):
+        entry = (time.time(), videos)
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO search_cache (query, max_results, fetched_at, videos) "
+                         "VALUES (?, ?, ?, ?)", (*key, entry[0], json.dumps(videos, ensure_ascii=False)))
+        self._remember(key, entry)
+
+    def _remember(self, key, entry):
+        with self._lock:
+            self._memory[key] = entry
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    # --- クォータ計測（日ごとの消費/節約ユニット） ---
+    def record_quota(self, spent=0, saved=0):
+        with self._connect() as conn:
+            conn.execute("INSERT INTO quota_usage (day, spent, saved) VALUES (?, ?, ?) "
+                         "ON CONFLICT(day) DO UPDATE SET spent = spent + excluded.spent, "
+                         "saved = saved + excluded.saved", (date.today().isoformat(), spent, saved))
+
+    def quota_today(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT spent, saved FROM quota_usage WHERE day = ?",
+                               (date.today().isoformat(),)).fetchone()
+        return {"spent": row[0], "saved": row[1]} if row else {"spent": 0, "saved": 0}
+
+
+class YouTubeSearch:
+    def __init__(self, api_key, cache=None, client_wrapper=None):
+        self.api_key = api_key
+        self.cache = cache or VideoSearchCache()
+        self.client_wrapper = client_wrapper  # 構築したクライアントを包む関数（計測用）
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._prefetch_thread = None
+        self._prefetch_queue = []  # 先読み待ちの (種目名, max_results)
+        self._prefetch_lock = threading.Lock()
+
+    @property
+    def client(self):
+        # discoveryクライアントの構築は1度だけ行い、以降は使い回す
+        # （googleapiclient の読み込み自体も初回の検索まで遅らせる）
+        with self._client_lock:
+            if self._client is None:
+                from googleapiclient.discovery import build
+                self._client = build('youtube', 'v3', developerKey=self.api_key, cache_discovery=False)
+                if self.client_wrapper:
+                    self._client = self.client_wrapper(self._client)
+            return self._client
+
+    def search(self, query, max_results=3):
+        """(動画リスト, 取得元) を返す。取得元は 'cache' / 'api' / 'stale'（クォータ超過時の期限切れキャッシュ）"""
+        key = (normalize_query(query), int(max_results))
+        cached = self.cache.get(key)
+        if cached is not None and not cached[1]:
+            self.cache.record_quota(saved=SEARCH_COST_UNITS)
+            return cached[0], 'cache'
+        from googleapiclient.errors import HttpError
+        try:
+            search_response = self.client.search().list(
+                q=f"{query} フォーム やり方 解説", # より具体的な検索クエリ
+                part='snippet',
+                maxResults=max_results,
+                type='video',
+                videoEmbeddable='true', # 埋め込み可能な動画を優先
+                order='relevance' # 関連性の高い順
+            ).execute()
+        except HttpError as e:
+            api_error = YouTubeAPIError.from_http_error(e)
+            if cached is not None and api_error.reason == 'quotaExceeded':
+                self.cache.record_quota(saved=SEARCH_COST_UNITS)
+                return cached[0], 'stale'
+            raise api_error from e
+        self.cache.record_quota(spent=SEARCH_COST_UNITS)
+
+        videos = []
+        for search_result in search_response.get('items', []):
+            # サムネイルURLが存在するか確認
+            thumbnail_url = search_result['snippet']['thumbnails'].get('default', {}).get('url')
+            if thumbnail_url: # サムネイルがあるものだけ追加（任意）
+                videos.append({
+                    'title': search_result['snippet']['title'],
+                    'videoId': search_result['id']['videoId'],
+                    'thumbnail': thumbnail_url,
+                    'channel': search_result['snippet'].get('channelTitle'),
+                })
+        self._add_details(videos)
+        self.cache.put(key, videos)
+        return videos, 'api'
+
+    def _add_details(self, videos):
+        """動画の長さ（秒）と再生回数を videos().list 1回でまとめて取得して付ける
+
+        取得に失敗しても検索結果はそのまま返す（長さ・再生回数が None になるだけ）。"""
+        for video in videos:
+            video.setdefault('duration', None)
+            video.setdefault('viewCount', None)
+        if not videos:
+            return
+        from googleapiclient.errors import HttpError
+        try:
+            response = self.client.videos().list(
+                part='contentDetails,statistics',
+                id=",".join(video['videoId'] for video in videos),
+                maxResults=len(videos),
+            ).execute()
+        except HttpError:
+            return
+        self.cache.record_quota(spent=VIDEOS_COST_UNITS)
+        details = {item['id']: item for item in response.get('items', [])}
+        for video in videos:
+            item = details.get(video['videoId'])
+            if item is None:
+                continue
+            video['duration'] = parse_duration(item.get('contentDetails', {}).get('duration'))
+            views = item.get('statistics', {}).get('viewCount')
+            video['viewCount'] = int(views) if views is not None else None
+
+    def cached(self, query, max_results=3):
+        """期限内のキャッシュ済みの検索結果を返す。未キャッシュ・期限切れなら None（APIは呼ばない）
+
+        期限切れの結果は search() で取り直す（クォータ超過時は search() が期限切れの結果を返す）。"""
+        cached = self.cache.get((normalize_query(query), int(max_results)))
+        return None if cached is None or cached[1] else cached[0]
+
+    # --- よく記録する種目の先読み ---
+    def prefetch(self, queries, max_results=3, daily_units=PREFETCH_DAILY_UNITS):
+        """未キャッシュ・期限切れの種目だけを検索してキャッシュに入れる。検索した種目名のリストを返す
+
+        当日の消費ユニットが daily_units に達したら、またはクォータ超過になったら打ち切る。"""
+        searched = []
+        for query in queries:
+            cached = self.cache.get((normalize_query(query), int(max_results)))
+            if cached is not None and not cached[1]:
+                continue
+            if self.cache.quota_today()["spent"] + SEARCH_COST_UNITS + VIDEOS_COST_UNITS > daily_units:
+                break
+            try:
+                self.search(query, max_results)
+            except YouTubeAPIError as e:
+                if e.reason == 'quotaExceeded':
+                    break
+                continue
+            searched.append(query)
+        return searched
+
+    def prefetch_async(self, queries, max_results=3):
+        """prefetch() をバックグラウンドのスレッドで実行する（先読み中の種目は重ねて依頼しない）"""
+        with self._prefetch_lock:
+            pending = {normalize_query(q) for q, _ in self._prefetch_queue}
+            for query in queries:
+                if normalize_query(query) not in pending:
+                    pending.add(normalize_query(query))
+                    self._prefetch_queue.append((query, max_results))
+            if self._prefetch_thread is not None and self._prefetch_thread.is_alive():
+                return
+            self._prefetch_thread = threading.Thread(target=self._run_prefetch, name="youtube-prefetch",
+                                                     daemon=True)
+            self._prefetch_thread.start()
+
+    def _run_prefetch(self):
+        # 計測の記録はどのページの再実行にも含めない
+        bind_context(([], None))
+        while True:
+            with self._prefetch_lock:
+                if not self._prefetch_queue:
+                    self._prefetch_thread = None
+                    return
+                query, max_results = self._prefetch_queue[0]
+            try:
+                self.prefetch([query], max_results)
+            except Exception:
+                pass  # 先読みの失敗は検索ボタンからの検索で改めて表示される
+            finally:
+                with self._prefetch_lock:
+                    self._prefetch_queue.pop(0)